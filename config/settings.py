@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,7 +59,7 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.perf.DjangoTemplates',  # stock backend plus render timing
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -82,6 +83,23 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Wait for the write lock instead of failing, and take it at the
+            # start of each transaction so concurrent checkouts queue cleanly.
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'TEST': {
+            # A file (not shared-cache memory) so threaded tests can use the busy timeout
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.perf.InstrumentedLocMemCache',
     }
 }
 
@@ -130,6 +148,51 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Served in front of Django by core.serving.FileServer (see config/wsgi.py)
+SERVE_FILES = True
+STATIC_MAX_AGE = 60 * 60  # fingerprinted names get a year and immutable
+MEDIA_MAX_AGE = 60 * 60 * 24
+FILE_STAT_CACHE_TTL = 10  # seconds a stat result (or a miss) is reused
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+
+# Background tasks (core.queue) and notifications
+NOTIFICATION_BACKEND = 'core.notifications.LoggingBackend'
+STAFF_NOTIFICATION_RECIPIENT = 'staff'
+LOW_STOCK_THRESHOLD = 3
+
+# Order archival (store.archive, manage.py archive_orders)
+ORDER_ARCHIVE_AFTER_DAYS = 90
+ORDER_ARCHIVE_BATCH_SIZE = 500
+
+# Pre-rendered catalogue pages (store.export, manage.py export_static_site)
+STATIC_EXPORT_ROOT = BASE_DIR / 'public'
+
+# Stale-while-revalidate catalogue reads (core.stale)
+CATALOG_FRESH_FOR = 60  # seconds a cached read is served without recomputing, unless the catalogue changes
+CATALOG_READ_BUDGET = 0.5  # seconds a recompute may spend in the database before the last good copy is served
+CATALOG_STALE_FOR = 60 * 60 * 24  # how long the last good copy is kept as a fallback
+
+# Ordered result ids per shop filter combination, per process for up to CATALOG_FRESH_FOR (store.listing.ResultIds)
+LISTING_IDS_CACHE_ENTRIES = 512
+LISTING_IDS_CACHE_MAX_IDS = 2_000_000  # about 16 MB of ids
+
+# Single-writer queue for cart and order writes (core.writes)
+WRITE_COALESCING = False  # batch them through one writer thread per process; pays off with threaded workers
+WRITE_BATCH_WINDOW = 0.002  # seconds the writer waits for more writes before it commits
+WRITE_BATCH_SIZE = 64
+
+# Worker warm-up (core.warmup) and the readiness endpoint
+WARMUP_TEMPLATES = [
+    'base.html', 'index.html', 'shop.html', 'shop_results.html', 'product_detail.html', 'cart.html', 'checkout.html',
+]
+WARMUP_ON_READINESS = True  # a cold worker retries its warm-up when the readiness probe asks
+RATE_LIMIT_EXEMPT_PATHS = ['/ready/']
+
+# Request instrumentation (core.middleware.PerformanceMiddleware)
+PERF_SERVER_TIMING = True
+PERF_SLOW_REQUEST_MS = 500
+PERF_SLOW_SAMPLE_RATE = 1.0  # fraction of slow requests that get logged
+PERF_FLUSH_INTERVAL = 30  # seconds between histogram flushes to the database
@@ -9,8 +9,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core import views as core_views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Load balancer readiness probe (see core.warmup)
+    path('ready/', core_views.readiness, name='readiness'),
     path('', include('store.urls')),
 ]
 
@@ -14,3 +14,17 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Static and media files are answered before Django when SERVE_FILES is on.
+from django.conf import settings  # noqa: E402
+
+from core.serving import FileServer  # noqa: E402
+
+if settings.SERVE_FILES:
+    application = FileServer.from_settings(application)
+
+# Warm this worker up (connections, URL patterns, templates, caches and the
+# in-memory search index) before the first request arrives; see core.warmup.
+from core import warmup  # noqa: E402
+
+warmup.warm_up()
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import HomeSettings, Feature
+from django.utils import timezone
+from .models import HomeSettings, Feature, Task
 
 @admin.register(HomeSettings)
 class HomeSettingsAdmin(admin.ModelAdmin):
@@ -13,3 +14,18 @@ class HomeSettingsAdmin(admin.ModelAdmin):
 class FeatureAdmin(admin.ModelAdmin):
     list_display = ['title', 'icon', 'order']
     list_editable = ['order']
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'updated_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name']
+    readonly_fields = ['attempts', 'locked_until', 'last_error', 'created_at', 'updated_at']
+    actions = ['retry_now']
+
+    @admin.action(description="Retry selected tasks now")
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='running').update(
+            status='queued', attempts=0, run_at=timezone.now(), locked_until=None,
+        )
+        self.message_user(request, f"Re-queued {updated} task(s).")
@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'core'
+
+    def ready(self):
+        from django.utils.module_loading import autodiscover_modules
+
+        from . import signals  # noqa: F401
+
+        # Register @task functions declared in each app's tasks.py,
+        # and warm-up steps from each warmup.py
+        autodiscover_modules('tasks')
+        autodiscover_modules('warmup')
@@ -0,0 +1,119 @@
+import gzip
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from io import BytesIO
+from wsgiref.util import FileWrapper, setup_testing_defaults
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management.base import BaseCommand, CommandError
+from django.http import Http404, HttpResponseNotFound
+from django.views.static import serve
+
+from core.serving import FileServer, Mount
+
+PREFIX = '/static/'
+SIZES = {'1k': 1024, '64k': 64 * 1024, '1m': 1024 * 1024}
+
+
+def not_found(environ, start_response):
+    start_response('404 Not Found', [('Content-Type', 'text/plain')])
+    return [b'not found']
+
+
+def django_static(root):
+    """django.views.static.serve as a bare WSGI app, handed file_wrapper the way WSGIHandler does"""
+    def application(environ, start_response):
+        request = WSGIRequest(environ)
+        try:
+            response = serve(request, environ['PATH_INFO'][len(PREFIX):], document_root=root)
+        except Http404:
+            response = HttpResponseNotFound()
+        start_response(f'{response.status_code} {response.reason_phrase}', list(response.items()))
+        if getattr(response, 'file_to_stream', None) is not None:
+            return environ['wsgi.file_wrapper'](response.file_to_stream, response.block_size)
+        return response
+    return application
+
+
+def write_files(root, sizes):
+    line = b'.shop-card { color: var(--text); padding: 12px; } /* filler for the static benchmark */\n'
+    for label in sizes:
+        data = (line * (SIZES[label] // len(line) + 1))[:SIZES[label]]
+        path = os.path.join(root, f'bench-{label}.css')
+        with open(path, 'wb') as file:
+            file.write(data)
+        with open(path + '.gz', 'wb') as file:
+            file.write(gzip.compress(data, mtime=0))
+
+
+def call(application, path, headers):
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', 'wsgi.input': BytesIO(), 'wsgi.file_wrapper': FileWrapper}
+    environ.update(headers)
+    setup_testing_defaults(environ)
+    status = []
+    body = application(environ, lambda code, response_headers, exc_info=None: status.append(code))
+    sent = 0
+    try:
+        for chunk in body:
+            sent += len(chunk)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return status[0], sent
+
+
+class Command(BaseCommand):
+    help = 'Compare in-process throughput of core.serving.FileServer with django.views.static.serve'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per scenario')
+        parser.add_argument('--sizes', default='1k,64k,1m', help=f'Comma-separated file sizes from {", ".join(SIZES)}')
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        unknown = [size for size in sizes if size not in SIZES]
+        if unknown:
+            raise CommandError(f'Unknown sizes: {", ".join(unknown)}')
+        root = tempfile.mkdtemp(prefix='bench-static-')
+        try:
+            write_files(root, sizes)
+            servers = {
+                'FileServer': FileServer(not_found, [Mount(PREFIX, root, 3600)]),
+                'static.serve': django_static(root),
+            }
+            self.stdout.write(
+                f"{'scenario':<22}  {'server':<12}  {'req/s':>9}  {'MB/s':>8}  {'p50 ms':>7}  {'p95 ms':>7}  status"
+            )
+            for label in sizes:
+                path = f'{PREFIX}bench-{label}.css'
+                scenarios = {
+                    f'{label} full': {},
+                    f'{label} gzip': {'HTTP_ACCEPT_ENCODING': 'gzip, deflate, br'},
+                    f'{label} 304': {'HTTP_IF_MODIFIED_SINCE': 'Fri, 01 Jan 2100 00:00:00 GMT'},
+                    f'{label} range': {'HTTP_RANGE': 'bytes=0-511'},
+                }
+                for scenario, headers in scenarios.items():
+                    for name, application in servers.items():
+                        self.run_scenario(scenario, name, application, path, headers, options['requests'])
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    def run_scenario(self, scenario, name, application, path, headers, count):
+        call(application, path, headers)  # warm the stat cache and the OS page cache
+        timings = []
+        total_bytes = 0
+        started = time.perf_counter()
+        for _ in range(count):
+            began = time.perf_counter()
+            status, sent = call(application, path, headers)
+            timings.append((time.perf_counter() - began) * 1000)
+            total_bytes += sent
+        elapsed = time.perf_counter() - started
+        quantiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+        self.stdout.write(
+            f'{scenario:<22}  {name:<12}  {count / elapsed:>9.0f}  {total_bytes / elapsed / 1e6:>8.1f}  '
+            f'{quantiles[49]:>7.3f}  {quantiles[94]:>7.3f}  {status}'
+        )
@@ -0,0 +1,57 @@
+import gzip
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import brotli
+except ImportError:  # optional: .br siblings are skipped without it
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot')
+MIN_SIZE = 1024
+
+
+class Command(BaseCommand):
+    help = 'Write .gz (and .br when brotli is installed) siblings next to compressible files in STATIC_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Recompress files whose siblings are up to date')
+
+    def handle(self, *args, **options):
+        root = settings.STATIC_ROOT
+        if not root or not os.path.isdir(root):
+            raise CommandError('STATIC_ROOT does not exist; run collectstatic first')
+        encoders = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            encoders.append(('.br', lambda data: brotli.compress(data, quality=11)))
+        else:
+            self.stdout.write('brotli is not installed; writing .gz only')
+
+        written = skipped = 0
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if not name.endswith(COMPRESSIBLE):
+                    continue
+                path = os.path.join(directory, name)
+                source = os.stat(path)
+                if source.st_size < MIN_SIZE:
+                    continue
+                with open(path, 'rb') as file:
+                    data = file.read()
+                for suffix, compress in encoders:
+                    target = path + suffix
+                    if not options['force'] and os.path.exists(target) and os.stat(target).st_mtime >= source.st_mtime:
+                        skipped += 1
+                        continue
+                    compressed = compress(data)
+                    if len(compressed) >= len(data):
+                        # Not worth a sibling; FileServer falls back to the original
+                        if os.path.exists(target):
+                            os.remove(target)
+                        continue
+                    with open(target, 'wb') as file:
+                        file.write(compressed)
+                    written += 1
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} compressed files ({skipped} already up to date)'))
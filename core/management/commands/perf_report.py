@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.models import RouteTiming
+from core.perf import percentile
+
+
+class Command(BaseCommand):
+    help = 'Show per-URL-name response-time percentiles collected by PerformanceMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Clear the collected histograms afterwards')
+
+    def handle(self, *args, **options):
+        rows = list(RouteTiming.objects.all())
+        if not rows:
+            self.stdout.write('No timings recorded yet.')
+        else:
+            width = max(len(row.url_name) for row in rows)
+            self.stdout.write(f"{'route':<{width}}  {'count':>8}  {'mean':>8}  {'p50':>8}  {'p95':>8}  {'p99':>8}  {'stale':>6}  (ms)")
+            for row in sorted(rows, key=lambda row: row.total_ms, reverse=True):
+                self.stdout.write(
+                    f'{row.url_name:<{width}}  {row.count:>8}  {row.total_ms / max(row.count, 1):>8.1f}  '
+                    f'{percentile(row.buckets, 0.50):>8.1f}  {percentile(row.buckets, 0.95):>8.1f}  '
+                    f'{percentile(row.buckets, 0.99):>8.1f}  {row.stale_serves:>6}'
+                )
+        if options['reset']:
+            RouteTiming.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS('Histograms cleared'))
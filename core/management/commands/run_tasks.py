@@ -0,0 +1,60 @@
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core import queue
+
+
+class Command(BaseCommand):
+    help = 'Run background tasks from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Tasks run in parallel (threads)')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument(
+            '--visibility-timeout', type=int, default=queue.DEFAULT_VISIBILITY_TIMEOUT,
+            help='Seconds before a task claimed by a dead worker is handed out again',
+        )
+        parser.add_argument('--once', action='store_true', help='Exit once no task is due')
+
+    def handle(self, *args, **options):
+        concurrency = max(options['concurrency'], 1)
+        stopping = threading.Event()
+        slots = threading.Semaphore(concurrency)
+
+        def stop(signum, frame):
+            self.stdout.write('Stopping after running tasks finish...')
+            stopping.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        def run(task_row):
+            close_old_connections()
+            try:
+                ok = queue.execute(task_row)
+                self.stdout.write(f"{'done' if ok else 'failed'}: {task_row.name} #{task_row.pk} (attempt {task_row.attempts})")
+            finally:
+                connection.close()
+                slots.release()
+
+        self.stdout.write(f'Task worker started with concurrency {concurrency}')
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while not stopping.is_set():
+                free = 0
+                while slots.acquire(blocking=False):
+                    free += 1
+                claimed = queue.claim(free, options['visibility_timeout']) if free else []
+                for _ in range(free - len(claimed)):
+                    slots.release()
+                for task_row in claimed:
+                    pool.submit(run, task_row)
+                if claimed:
+                    continue
+                if options['once'] and free == concurrency:
+                    break
+                stopping.wait(options['poll_interval'])
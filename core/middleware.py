@@ -1,14 +1,25 @@
+import logging
+import random
 import time
+from contextlib import ExitStack
+
+from django.conf import settings
 from django.core.cache import cache
+from django.db import connections
 from django.http import HttpResponseForbidden
 
+from . import perf
+
+logger = logging.getLogger(__name__)
+
 class RateLimitMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        self.exempt_paths = set(getattr(settings, 'RATE_LIMIT_EXEMPT_PATHS', ()))
 
     def __call__(self, request):
         ip = self.get_client_ip(request)
-        if ip:
+        if ip and request.path not in self.exempt_paths:
             # Key for cache
             key = f"rate_limit_{ip}"
             
@@ -34,3 +45,53 @@ class RateLimitMiddleware:
         else:
             ip = request.META.get('REMOTE_ADDR')
         return ip
+
+
+class PerformanceMiddleware:
+    """
+    Records SQL, template, cache and total time per request, adds them as a
+    Server-Timing header, logs a sample of slow requests with their top
+    queries and feeds the per-URL-name latency histograms.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'PERF_SERVER_TIMING', True)
+        self.slow_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', 500)
+        self.slow_sample_rate = getattr(settings, 'PERF_SLOW_SAMPLE_RATE', 1.0)
+        self.flush_interval = getattr(settings, 'PERF_FLUSH_INTERVAL', 30)
+
+    def __call__(self, request):
+        metrics, token = perf.start()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(perf.sql_recorder))
+                response = self.get_response(request)
+        finally:
+            perf.finish(token)
+
+        total_ms = metrics.elapsed() * 1000
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else '<unresolved>'
+        perf.histograms.record(route, total_ms, metrics.stale_serves)
+
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.sql_count} queries"',
+                f'tpl;dur={metrics.template_time * 1000:.1f}',
+                f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses, {metrics.stale_serves} stale"',
+                f'total;dur={total_ms:.1f}',
+            ])
+
+        if total_ms >= self.slow_ms and random.random() < self.slow_sample_rate:
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, templates %.0f ms\n%s',
+                request.method, request.path, route, total_ms, metrics.sql_count,
+                metrics.sql_time * 1000, metrics.template_time * 1000,
+                '\n'.join(f'  {duration * 1000:.1f} ms  {sql[:300]}' for sql, duration in metrics.top_queries()),
+            )
+
+        if perf.histograms.flush_due(self.flush_interval):
+            perf.histograms.flush()
+        return response
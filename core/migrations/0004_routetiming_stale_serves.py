@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_routetiming'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routetiming',
+            name='stale_serves',
+            field=models.PositiveBigIntegerField(default=0, help_text='Requests answered with a stale cached read (see core.stale)'),
+        ),
+    ]
@@ -1,4 +1,10 @@
+from django.core.cache import cache
 from django.db import models
+from django.utils import timezone
+
+HOME_SETTINGS_CACHE_KEY = 'core:home_settings'
+HOME_SETTINGS_TIMEOUT = 60 * 5  # bounds staleness in processes that missed the invalidation
+_MISSING = object()
 
 class HomeSettings(models.Model):
     """Singleton model for Homepage settings"""
@@ -36,6 +42,15 @@ class HomeSettings(models.Model):
             return
         return super(HomeSettings, self).save(*args, **kwargs)
 
+    @classmethod
+    def load(cls):
+        """The settings row, or None, cached until it is saved or deleted (see core.signals)"""
+        settings = cache.get(HOME_SETTINGS_CACHE_KEY, _MISSING)
+        if settings is _MISSING:
+            settings = cls.objects.first()
+            cache.set(HOME_SETTINGS_CACHE_KEY, settings, HOME_SETTINGS_TIMEOUT)
+        return settings
+
 
 class Feature(models.Model):
     """Features/Benefits listed on Homepage"""
@@ -49,3 +64,49 @@ class Feature(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class Task(models.Model):
+    """Background job stored in the database and run by `manage.py run_tasks`"""
+    STATUS = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now, help_text="Earliest time the task may run (pushed back between retries)")
+    locked_until = models.DateTimeField(null=True, blank=True, help_text="Visibility timeout of the worker running it")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='core_task_status_run_at'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class RouteTiming(models.Model):
+    """Response-time histogram for one URL name, merged from every worker"""
+    url_name = models.CharField(max_length=200, unique=True)
+    buckets = models.JSONField(default=list, help_text="Request counts per bucket of core.perf.BUCKETS")
+    count = models.PositiveBigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    stale_serves = models.PositiveBigIntegerField(default=0, help_text="Requests answered with a stale cached read (see core.stale)")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['url_name']
+
+    def __str__(self):
+        return self.url_name
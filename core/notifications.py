@@ -0,0 +1,32 @@
+"""
+Pluggable notification backends, selected by settings.NOTIFICATION_BACKEND.
+
+`LoggingBackend` is the default until a real SMS/e-mail provider is wired
+in; tests use `LocMemBackend`, which keeps sent messages in `outbox`.
+"""
+import logging
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+outbox = []
+
+
+class LoggingBackend:
+    def send(self, recipient, subject, message):
+        logger.info('Notification to %s: %s\n%s', recipient, subject, message)
+
+
+class LocMemBackend:
+    def send(self, recipient, subject, message):
+        outbox.append({'recipient': recipient, 'subject': subject, 'message': message})
+
+
+def get_backend():
+    return import_string(getattr(settings, 'NOTIFICATION_BACKEND', 'core.notifications.LoggingBackend'))()
+
+
+def notify(recipient, subject, message):
+    get_backend().send(recipient, subject, message)
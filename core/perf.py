@@ -0,0 +1,199 @@
+"""
+Per-request performance instrumentation.
+
+`PerformanceMiddleware` (in core.middleware) opens a `RequestMetrics` for
+each request; SQL is timed through a connection execute wrapper, template
+rendering through the `DjangoTemplates` backend below, and cache lookups
+through `InstrumentedCacheMixin`. Durations are folded into per-URL-name
+log-scale histograms which are flushed to `RouteTiming` rows periodically,
+so `manage.py perf_report` can read percentiles from every worker.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DatabaseError, transaction
+from django.template.backends import django as django_backend
+
+_current = ContextVar('request_metrics', default=None)
+
+MAX_RECORDED_QUERIES = 200
+
+# Histogram bucket upper bounds in ms: 0.5 ms to ~2 min, 15% apart.
+BUCKETS = [round(0.5 * 1.15 ** i, 3) for i in range(90)]
+
+
+class RequestMetrics:
+    __slots__ = (
+        'started', 'sql_count', 'sql_time', 'queries', 'template_time',
+        'cache_hits', 'cache_misses', 'stale_serves',
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.queries = []
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.stale_serves = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def top_queries(self, limit=5):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:limit]
+
+
+def current():
+    """Metrics of the request being handled in this context, if instrumented"""
+    return _current.get()
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def sql_recorder(execute, sql, params, many, context):
+    """Connection execute wrapper that times each query"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics.sql_count += 1
+        metrics.sql_time += duration
+        if len(metrics.queries) < MAX_RECORDED_QUERIES:
+            metrics.queries.append((sql, duration))
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The standard backend, with render time added to the request metrics"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class InstrumentedCacheMixin:
+    """Counts hits and misses of get/get_many against the current request"""
+
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = super().get(key, sentinel, version)
+        metrics = _current.get()
+        if metrics is not None:
+            if value is sentinel:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is sentinel else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.cache_hits += len(found)
+            metrics.cache_misses += len(keys) - len(found)
+        return found
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class RouteHistograms:
+    """In-process latency histograms per URL name, periodically merged into the database"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def record(self, route, duration_ms, stale_serves=0):
+        index = min(bisect.bisect_left(BUCKETS, duration_ms), len(BUCKETS) - 1)
+        with self._lock:
+            counts, total, stale = self._pending.get(route, ([0] * len(BUCKETS), 0.0, 0))
+            counts[index] += 1
+            self._pending[route] = (counts, total + duration_ms, stale + stale_serves)
+
+    def flush_due(self, interval):
+        return time.monotonic() - self._flushed_at >= interval
+
+    def flush(self):
+        from .models import RouteTiming
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+        try:
+            with transaction.atomic():
+                existing = {row.url_name: row for row in RouteTiming.objects.filter(url_name__in=pending)}
+                for route, (counts, total, stale) in pending.items():
+                    row = existing.get(route) or RouteTiming(url_name=route, buckets=[0] * len(BUCKETS))
+                    row.buckets = [old + new for old, new in zip(row.buckets, counts)]
+                    row.count += sum(counts)
+                    row.total_ms += total
+                    row.stale_serves += stale
+                    row.save()
+        except DatabaseError:
+            # Put the samples back and try again on the next flush
+            with self._lock:
+                for route, (counts, total, stale) in pending.items():
+                    current_counts, current_total, current_stale = self._pending.get(
+                        route, ([0] * len(BUCKETS), 0.0, 0),
+                    )
+                    self._pending[route] = (
+                        [a + b for a, b in zip(current_counts, counts)], current_total + total, current_stale + stale,
+                    )
+
+
+histograms = RouteHistograms()
+
+
+def percentile(buckets, fraction):
+    """Upper bound (ms) of the bucket holding the given fraction of samples"""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    threshold = fraction * total
+    seen = 0
+    for bound, count in zip(BUCKETS, buckets):
+        seen += count
+        if seen >= threshold:
+            return bound
+    return BUCKETS[-1]
@@ -0,0 +1,134 @@
+"""
+Durable background task queue stored in the default database.
+
+Declare work with the `@task` decorator in an app's ``tasks.py`` and call
+``my_task.enqueue(**kwargs)``. Enqueueing inside a transaction commits
+the task together with the rows it refers to. ``manage.py run_tasks``
+claims due tasks with a conditional UPDATE (so several workers never
+run the same task), hides them behind a visibility timeout while they
+run, and retries failures with exponential backoff.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_VISIBILITY_TIMEOUT = 300  # seconds a claimed task stays hidden from other workers
+RETRY_BASE_DELAY = 10  # seconds; doubles with every failed attempt
+RETRY_MAX_DELAY = 60 * 60
+
+registry = {}
+
+
+class TaskFunction:
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, delay=0, **kwargs):
+        return enqueue(self.name, delay=delay, **kwargs)
+
+
+def task(name=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Register a function as a background task; arguments must be JSON-serialisable keywords"""
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registry[task_name] = TaskFunction(func, task_name, max_attempts)
+        return registry[task_name]
+    return decorator
+
+
+def enqueue(name, delay=0, **kwargs):
+    if name not in registry:
+        raise KeyError(f'Unknown task {name!r}')
+    return Task.objects.create(
+        name=name,
+        payload=kwargs,
+        max_attempts=registry[name].max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY)
+
+
+def due_tasks():
+    """Queued tasks whose time has come, plus running ones whose worker went silent"""
+    now = timezone.now()
+    return Task.objects.filter(
+        Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lte=now)
+    ).order_by('run_at', 'pk')
+
+
+def claim(limit, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT):
+    """Atomically take up to `limit` due tasks for this worker"""
+    claimed = []
+    for candidate in due_tasks()[:limit * 2]:
+        if candidate.attempts >= candidate.max_attempts:
+            # Its worker died on the final attempt
+            Task.objects.filter(pk=candidate.pk, status='running', attempts=candidate.attempts).update(
+                status='failed', locked_until=None, last_error='Visibility timeout expired on the final attempt',
+            )
+            continue
+        locked_until = timezone.now() + timedelta(seconds=visibility_timeout)
+        won = Task.objects.filter(
+            pk=candidate.pk, status=candidate.status, attempts=candidate.attempts,
+        ).update(status='running', locked_until=locked_until, attempts=F('attempts') + 1)
+        if won:
+            candidate.status, candidate.locked_until = 'running', locked_until
+            candidate.attempts += 1
+            claimed.append(candidate)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+def execute(task_row):
+    """Run one claimed task and record the outcome"""
+    try:
+        function = registry.get(task_row.name)
+        if function is None:
+            raise LookupError(f'No task registered as {task_row.name!r}')
+        function(**task_row.payload)
+    except Exception:
+        error = traceback.format_exc()
+        final = task_row.attempts >= task_row.max_attempts
+        logger.warning('Task %s failed (attempt %d/%d)', task_row, task_row.attempts, task_row.max_attempts)
+        # Filtering on attempts leaves the row alone if another worker re-claimed it after a timeout
+        Task.objects.filter(pk=task_row.pk, attempts=task_row.attempts).update(
+            status='failed' if final else 'queued',
+            run_at=timezone.now() + timedelta(seconds=retry_delay(task_row.attempts)),
+            locked_until=None,
+            last_error=error,
+            updated_at=timezone.now(),
+        )
+        return False
+    else:
+        Task.objects.filter(pk=task_row.pk, attempts=task_row.attempts).update(
+            status='done', locked_until=None, last_error='', updated_at=timezone.now(),
+        )
+        return True
+
+
+def run_pending(limit=100):
+    """Run due tasks in the current thread; handy for tests and one-off draining"""
+    results = []
+    while len(results) < limit:
+        batch = claim(min(10, limit - len(results)))
+        if not batch:
+            break
+        results.extend(execute(task_row) for task_row in batch)
+    return results
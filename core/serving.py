@@ -0,0 +1,305 @@
+"""
+Static and media files served in front of Django.
+
+`FileServer` wraps the WSGI application and answers GET/HEAD requests under
+STATIC_URL and MEDIA_URL straight from STATIC_ROOT and MEDIA_ROOT, so no
+separate web server is needed with DEBUG off. Per hit it does no filesystem
+calls beyond open(): stat results, content types, ETags and the .br/.gz
+siblings written by ``manage.py compress_static`` are kept in a small TTL
+cache (fingerprinted names never change, so theirs never expire). Bodies go
+out through the server's ``wsgi.file_wrapper``, which gunicorn turns into
+os.sendfile(); single byte ranges and conditional requests are honoured.
+Paths that match no file fall through to Django.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from django.conf import settings
+
+# ManifestStaticFilesStorage names: style.0123456789ab.css
+FINGERPRINTED = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+# Preferred first when the client accepts several
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CHUNK_SIZE = 64 * 1024
+MAX_CACHED_PATHS = 10000
+
+
+class FileEntry:
+    """What one cached lookup knows about a file and its precompressed siblings"""
+    __slots__ = ('path', 'size', 'etag', 'last_modified', 'mtime', 'content_type', 'cache_control', 'immutable', 'variants')
+
+    def __init__(self, path, result, content_type, cache_control, immutable, variants):
+        self.path = path
+        self.size = result.st_size
+        self.mtime = int(result.st_mtime)
+        self.etag = _etag(result)
+        self.last_modified = formatdate(result.st_mtime, usegmt=True)
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.immutable = immutable
+        # encoding -> (path, size, etag)
+        self.variants = variants
+
+
+def _etag(result, suffix=''):
+    return f'"{result.st_size:x}-{result.st_mtime_ns:x}{suffix}"'
+
+
+def _regular_file(path):
+    try:
+        result = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    return result if stat.S_ISREG(result.st_mode) else None
+
+
+def _url_prefix(url):
+    return '/' + str(url).strip('/') + '/'
+
+
+class Mount:
+    """One URL prefix served from one directory"""
+
+    def __init__(self, prefix, root, max_age, fingerprints=False):
+        self.prefix = _url_prefix(prefix)
+        self.root = os.path.realpath(root)
+        self.max_age = max_age
+        self.fingerprints = fingerprints
+
+    def lookup(self, relative):
+        """Stat `relative` under the root; None for anything that is not a regular file inside it"""
+        if '\x00' in relative or '\\' in relative:
+            return None
+        relative = posixpath.normpath(relative)
+        if relative.startswith(('/', '..')) or relative == '.':
+            return None
+        path = os.path.join(self.root, *relative.split('/'))
+        result = _regular_file(path)
+        if result is None or not os.path.realpath(path).startswith(self.root + os.sep):
+            return None
+        variants = {}
+        for encoding, suffix in ENCODINGS:
+            compressed = _regular_file(path + suffix)
+            if compressed is not None and compressed.st_mtime >= result.st_mtime:
+                variants[encoding] = (path + suffix, compressed.st_size, _etag(compressed, '-' + encoding))
+        content_type, _ = mimetypes.guess_type(path)
+        if content_type is None:
+            content_type = 'application/octet-stream'
+        elif content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        immutable = self.fingerprints and bool(FINGERPRINTED.search(relative))
+        if immutable:
+            cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            cache_control = f'public, max-age={self.max_age}'
+        return FileEntry(path, result, content_type, cache_control, immutable, variants)
+
+
+class StatCache:
+    """Lookups (misses included) by URL path, each kept for `ttl` seconds; fingerprinted files forever"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+
+    def get(self, key, load):
+        now = time.monotonic()
+        cached = self._entries.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        entry = load()
+        if len(self._entries) >= MAX_CACHED_PATHS:
+            self._entries = {}
+        expires = float('inf') if entry is not None and entry.immutable else now + self.ttl
+        self._entries[key] = (entry, expires)
+        return entry
+
+    def clear(self):
+        self._entries = {}
+
+
+class FileRange:
+    """Iterates `length` bytes of an open file in chunks, for servers without sendfile or for mid-file ranges"""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def __iter__(self):
+        while self.remaining > 0:
+            chunk = self.file.read(min(CHUNK_SIZE, self.remaining))
+            if not chunk:
+                break
+            self.remaining -= len(chunk)
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+
+def accepted_encodings(header):
+    """Content codings the Accept-Encoding header allows (q=0 excluded)"""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        quality = params.strip().replace(' ', '')
+        if coding and quality not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding)
+    return accepted
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single 'bytes=' range; None to ignore it, ValueError when unsatisfiable"""
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        # Multiple ranges are allowed to be answered with the whole file
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError('empty suffix range')
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise ValueError('range starts past the end of the file')
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _not_modified(environ, etag, mtime):
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return '*' in tags or etag in tags
+    if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since:
+        try:
+            return mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError, OverflowError):
+            return False
+    return False
+
+
+def _range_applies(environ, entry):
+    if_range = environ.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == entry.etag
+    try:
+        return entry.mtime <= parsedate_to_datetime(if_range).timestamp()
+    except (TypeError, ValueError, OverflowError):
+        return False
+
+
+class FileServer:
+    """WSGI middleware serving the configured mounts and passing everything else to `application`"""
+
+    def __init__(self, application, mounts, stat_ttl=10):
+        self.application = application
+        self.mounts = list(mounts)
+        self.cache = StatCache(stat_ttl)
+
+    @classmethod
+    def from_settings(cls, application):
+        mounts = []
+        if settings.STATIC_ROOT:
+            mounts.append(Mount(settings.STATIC_URL, settings.STATIC_ROOT, settings.STATIC_MAX_AGE, fingerprints=True))
+        if settings.MEDIA_ROOT:
+            mounts.append(Mount(settings.MEDIA_URL, settings.MEDIA_ROOT, settings.MEDIA_MAX_AGE))
+        return cls(application, mounts, stat_ttl=settings.FILE_STAT_CACHE_TTL)
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        for mount in self.mounts:
+            if path.startswith(mount.prefix):
+                entry = self.cache.get(path, lambda: mount.lookup(self._decode(path[len(mount.prefix):])))
+                if entry is not None:
+                    return self.serve(entry, environ, start_response)
+                break
+        return self.application(environ, start_response)
+
+    @staticmethod
+    def _decode(path):
+        # PATH_INFO carries the raw UTF-8 bytes as latin-1
+        try:
+            return path.encode('latin-1').decode('utf-8')
+        except UnicodeError:
+            return '\x00'
+
+    def serve(self, entry, environ, start_response):
+        method = environ.get('REQUEST_METHOD', 'GET')
+        if method not in ('GET', 'HEAD'):
+            start_response('405 Method Not Allowed', [('Allow', 'GET, HEAD'), ('Content-Length', '0')])
+            return []
+
+        path, size, etag, encoding = entry.path, entry.size, entry.etag, None
+        if entry.variants:
+            accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+            encoding = next((name for name, _ in ENCODINGS if name in entry.variants and name in accepted), None)
+            if encoding is not None:
+                path, size, etag = entry.variants[encoding]
+
+        headers = [
+            ('Content-Type', entry.content_type),
+            ('Last-Modified', entry.last_modified),
+            ('ETag', etag),
+            ('Cache-Control', entry.cache_control),
+        ]
+        if entry.variants:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if encoding is not None:
+            headers.append(('Content-Encoding', encoding))
+        else:
+            headers.append(('Accept-Ranges', 'bytes'))
+
+        if _not_modified(environ, etag, entry.mtime):
+            start_response('304 Not Modified', headers)
+            return []
+
+        status, start, length = '200 OK', 0, size
+        range_header = environ.get('HTTP_RANGE')
+        if range_header and encoding is None and _range_applies(environ, entry):
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                start_response('416 Range Not Satisfiable', [('Content-Range', f'bytes */{size}'), ('Content-Length', '0')])
+                return []
+            if byte_range is not None:
+                start, end = byte_range
+                status, length = '206 Partial Content', end - start + 1
+                headers.append(('Content-Range', f'bytes {start}-{end}/{size}'))
+
+        headers.append(('Content-Length', str(length)))
+        if method == 'HEAD':
+            start_response(status, headers)
+            return []
+        try:
+            file = open(path, 'rb')
+        except OSError:
+            # Removed since it was cached
+            self.cache.clear()
+            return self.application(environ, start_response)
+        start_response(status, headers)
+        if start:
+            file.seek(start)
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None and start + length == size:
+            # Sends from the current offset to the end of the file, zero-copy under gunicorn
+            return file_wrapper(file, CHUNK_SIZE)
+        return FileRange(file, length)
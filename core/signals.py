@@ -0,0 +1,10 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import HOME_SETTINGS_CACHE_KEY, HomeSettings
+
+
+@receiver([post_save, post_delete], sender=HomeSettings)
+def expire_home_settings(sender, **kwargs):
+    cache.delete(HOME_SETTINGS_CACHE_KEY)
@@ -0,0 +1,129 @@
+"""
+Stale-while-revalidate reads.
+
+`fetch(key, compute, version)` caches what `compute()` returns together
+with the `version` it was computed for. A value for the current version
+that is younger than CATALOG_FRESH_FOR is returned straight away. Older
+values are kept for CATALOG_STALE_FOR as a fallback: one request at a time
+recomputes the key (a cache.add() lock is the single-flight guard) while
+the others get the last good value, and if the recompute spends more than
+CATALOG_READ_BUDGET in the database or the database is locked, the
+request gets the last good value too and the recompute moves to a
+background thread. Every stale serve is counted per reason and against
+the current request (see core.perf), so they show up in Server-Timing and
+`manage.py perf_report`.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connection, connections
+
+from . import perf
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_STEPS = 1000  # SQLite VM instructions between budget checks
+LOCK_TIMEOUT = 30
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+_refreshing = set()
+
+
+def counts():
+    """Stale serves in this process by reason: 'refreshing', 'slow', 'locked' or 'error'"""
+    with _counts_lock:
+        return dict(_counts)
+
+
+def reset_counts():
+    with _counts_lock:
+        _counts.clear()
+
+
+def _serve_stale(key, entry, reason):
+    with _counts_lock:
+        _counts[reason] += 1
+    metrics = perf.current()
+    if metrics is not None:
+        metrics.stale_serves += 1
+    if reason != 'refreshing':
+        logger.warning('Serving stale %s (%s, %.0f s old)', key, reason, time.time() - entry[1])
+    return entry[2]
+
+
+@contextmanager
+def database_budget(seconds):
+    """Make SQLite give up on statements and lock waits that run past `seconds`"""
+    if seconds is None or connection.vendor != 'sqlite':
+        yield
+        return
+    connection.ensure_connection()
+    raw = connection.connection
+    deadline = time.perf_counter() + seconds
+    raw.set_progress_handler(lambda: time.perf_counter() > deadline, PROGRESS_STEPS)
+    raw.execute(f'PRAGMA busy_timeout = {int(seconds * 1000)}')
+    try:
+        yield
+    finally:
+        raw.set_progress_handler(None, PROGRESS_STEPS)
+        timeout = connection.settings_dict['OPTIONS'].get('timeout', 5)
+        raw.execute(f'PRAGMA busy_timeout = {int(timeout * 1000)}')
+
+
+def _store(key, version, value):
+    cache.set(key, (version, time.time(), value), settings.CATALOG_STALE_FOR)
+
+
+def _refresh_in_background(key, compute, version):
+    """Recompute without a budget on a thread; holds the key's lock until done"""
+    if key in _refreshing:
+        return
+    _refreshing.add(key)
+
+    def run():
+        try:
+            _store(key, version, compute())
+        except Exception:
+            logger.exception('Background refresh of %s failed', key)
+        finally:
+            _refreshing.discard(key)
+            cache.delete(f'{key}:refreshing')
+            connections.close_all()
+    threading.Thread(target=run, name=f'refresh {key}', daemon=True).start()
+
+
+def fetch(key, compute, version, budget=None):
+    """The value of `compute()` for `version`, or the last good one while the database is slow or locked"""
+    budget = settings.CATALOG_READ_BUDGET if budget is None else budget
+    entry = cache.get(key)
+    if entry is not None and entry[0] == version and time.time() - entry[1] < settings.CATALOG_FRESH_FOR:
+        return entry[2]
+    if entry is None:
+        # Nothing to fall back on: wait for the database however long it takes
+        value = compute()
+        _store(key, version, value)
+        return value
+
+    lock = f'{key}:refreshing'
+    if not cache.add(lock, True, LOCK_TIMEOUT):
+        return _serve_stale(key, entry, 'refreshing')
+    try:
+        with database_budget(budget):
+            value = compute()
+    except OperationalError as error:
+        _refresh_in_background(key, compute, version)
+        message = str(error)
+        reason = 'locked' if 'locked' in message else 'slow' if 'interrupted' in message else 'error'
+        return _serve_stale(key, entry, reason)
+    except BaseException:
+        cache.delete(lock)
+        raise
+    _store(key, version, value)
+    cache.delete(lock)
+    return value
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import add_never_cache_headers
+
+from . import warmup
+
+
+def readiness(request):
+    """200 once this worker has warmed up, 503 while it is cold"""
+    state = warmup.status()
+    if state['status'] == 'cold' and settings.WARMUP_ON_READINESS:
+        warmup.warm_up_in_background()
+    response = JsonResponse(state, status=200 if state['status'] == 'warm' else 503)
+    add_never_cache_headers(response)
+    return response
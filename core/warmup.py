@@ -0,0 +1,108 @@
+"""
+Per-process warm-up before the first request.
+
+Functions registered with `@step` run in order from `warm_up()`, which
+config/wsgi.py calls once the application is loaded: they open database
+connections, compile the URL resolver, parse the hot templates and fill
+the caches the busiest views read, so the first visitors to a fresh
+worker do not pay for it. Apps add their own steps in a ``warmup.py``
+module, imported by CoreConfig.ready(). `status()` backs the readiness
+endpoint, which keeps a load balancer away from workers that are cold.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+_steps = []
+_lock = threading.Lock()
+_state = {}
+
+
+def step(order=100):
+    """Register a warm-up function; lower `order` runs first"""
+    def register(func):
+        _steps.append((order, len(_steps), func))
+        return func
+    return register
+
+
+def reset():
+    """Forget this process's warm-up (tests, or to force another run)"""
+    _state.clear()
+    _state.update(warm=False, running=False, started_at=None, finished_at=None, timings={}, errors={})
+
+
+def status():
+    return {
+        'status': 'warm' if _state['warm'] else 'cold',
+        'pid': os.getpid(),
+        'started_at': _state['started_at'],
+        'finished_at': _state['finished_at'],
+        'timings_ms': dict(_state['timings']),
+        'errors': dict(_state['errors']),
+    }
+
+
+def warm_up():
+    """Run every registered step once; a failed step leaves the process cold so it can be retried"""
+    with _lock:
+        if _state['warm']:
+            return status()
+        _state.update(running=True, started_at=time.time(), timings={}, errors={})
+        try:
+            for _order, _index, func in sorted(_steps, key=lambda entry: entry[:2]):
+                name = f'{func.__module__}.{func.__name__}'
+                started = time.perf_counter()
+                try:
+                    func()
+                except Exception as error:
+                    logger.exception('Warm-up step %s failed', name)
+                    _state['errors'][name] = str(error)
+                _state['timings'][name] = round((time.perf_counter() - started) * 1000, 1)
+        finally:
+            _state.update(running=False, finished_at=time.time(), warm=not _state['errors'])
+        logger.info('Warm-up finished in %.0f ms (%s)', sum(_state['timings'].values()), status()['status'])
+        return status()
+
+
+def warm_up_in_background():
+    """Start warm_up() on a thread unless one is already running"""
+    if _state['warm'] or _state['running']:
+        return
+    _state['running'] = True
+
+    def run():
+        try:
+            warm_up()
+        finally:
+            connections.close_all()
+    threading.Thread(target=run, name='warm-up', daemon=True).start()
+
+
+@step(order=0)
+def open_database_connections():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+@step(order=10)
+def compile_url_patterns():
+    # Building the reverse lookup compiles every pattern of every included URLconf
+    get_resolver().reverse_dict
+
+
+@step(order=20)
+def load_templates():
+    for name in settings.WARMUP_TEMPLATES:
+        get_template(name)
+
+
+reset()
@@ -0,0 +1,110 @@
+"""
+Single-writer queue for SQLite.
+
+SQLite lets one connection write at a time, so requests that each open a
+write transaction queue on its lock. With WRITE_COALESCING on, `run(func,
+*args)` hands the write to this process's writer thread instead: it waits
+up to WRITE_BATCH_WINDOW for more writes, runs up to WRITE_BATCH_SIZE of
+them in one transaction, each inside its own savepoint so a failing write
+rolls back alone, and commits once. The request blocks on a Future and
+gets its own result, or exception, after the commit. With coalescing off,
+or when the caller is already inside a transaction, `run` simply calls
+`func`.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+WRITE_TIMEOUT = 60  # seconds a request waits for its batch before giving up
+
+
+class Writer:
+    """One thread that commits queued write functions in batches"""
+
+    def __init__(self, window, batch_size):
+        self.window = window
+        self.batch_size = batch_size
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self._queue.put((future, func, args, kwargs))
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._loop, name='db-writer', daemon=True)
+                    self._thread.start()
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = [job for job in self._collect() if job[0].set_running_or_notify_cancel()]
+            if batch:
+                self._commit(batch)
+
+    def _commit(self, batch):
+        outcomes = []
+        try:
+            with transaction.atomic():
+                for future, func, args, kwargs in batch:
+                    try:
+                        with transaction.atomic():
+                            outcomes.append((future, func(*args, **kwargs), None))
+                    except Exception as error:
+                        outcomes.append((future, None, error))
+        except Exception as error:
+            # Nothing in the batch was written
+            logger.exception('Write batch of %d failed to commit', len(batch))
+            connection.close_if_unusable_or_obsolete()
+            outcomes = [(future, None, error) for future, *_job in batch]
+        else:
+            self.batches += 1
+            self.writes += len(batch)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = Writer(settings.WRITE_BATCH_WINDOW, settings.WRITE_BATCH_SIZE)
+    return _writer
+
+
+def run(func, *args, **kwargs):
+    """Call a write function, through the batching writer thread when WRITE_COALESCING is on"""
+    # Inside a transaction the writer's connection could not see this one's uncommitted rows
+    if not settings.WRITE_COALESCING or connection.in_atomic_block:
+        return func(*args, **kwargs)
+    return writer().submit(func, *args, **kwargs).result(timeout=WRITE_TIMEOUT)
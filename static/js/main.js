@@ -83,8 +83,9 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         function fillColor() {
-            const percent1 = (slider1.value / slider1.max) * 100;
-            const percent2 = (slider2.value / slider2.max) * 100;
+            const span = (slider1.max - slider1.min) || 1;
+            const percent1 = ((slider1.value - slider1.min) / span) * 100;
+            const percent2 = ((slider2.value - slider2.min) / span) * 100;
             // Fallback colors if vars not readable (though they should be)
             const trackColor = '#2a2a2e'; 
             const accentColor = '#00f0ff';
@@ -96,6 +97,93 @@ document.addEventListener('DOMContentLoaded', () => {
         slideOne();
         slideTwo();
     }
+
+    // --- Shop Results Fragments ---
+    // Filter, sort and page changes fetch only the product grid and pagination
+    const shopResults = document.getElementById('shop-results');
+
+    if (shopResults) {
+        function applyResultsState() {
+            const toolbar = shopResults.querySelector('.toolbar');
+            if (!toolbar) return;
+            const category = toolbar.dataset.category;
+            document.getElementById('shop-heading').textContent = toolbar.dataset.heading;
+            document.getElementById('shop-description').textContent = toolbar.dataset.description;
+            document.getElementById('breadcrumb-current').textContent = category ? toolbar.dataset.heading : 'Shop';
+            document.getElementById('breadcrumb-shop').hidden = !category;
+            document.querySelectorAll('.shop-sidebar .filter-link').forEach(link => {
+                link.classList.toggle('active', (link.dataset.category || '') === category);
+            });
+        }
+
+        function loadResults(url, push = true) {
+            shopResults.style.opacity = 0.5;
+            fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                .then(response => {
+                    if (!response.ok) throw new Error(response.statusText);
+                    return response.text();
+                })
+                .then(html => {
+                    shopResults.innerHTML = html;
+                    shopResults.style.opacity = 1;
+                    applyResultsState();
+                    feather.replace();
+                    if (push) history.pushState({ shopResults: true }, '', url);
+                })
+                .catch(() => {
+                    window.location.href = url;
+                });
+        }
+
+        function urlWith(changes) {
+            const url = new URL(window.location.href);
+            Object.entries(changes).forEach(([key, value]) => {
+                if (value === null || value === '') url.searchParams.delete(key);
+                else url.searchParams.set(key, value);
+            });
+            url.searchParams.delete('page');
+            return url.toString();
+        }
+
+        window.changeSort = function(sort) {
+            loadResults(urlWith({ sort: sort }));
+        }
+
+        if (slider1 && slider2) {
+            const applyPrice = () => loadResults(urlWith({
+                min_price: parseInt(slider1.value) > parseInt(slider1.min) ? slider1.value : null,
+                max_price: parseInt(slider2.value) < parseInt(slider2.max) ? slider2.value : null,
+            }));
+            slider1.addEventListener('change', applyPrice);
+            slider2.addEventListener('change', applyPrice);
+        }
+
+        shopResults.addEventListener('click', (e) => {
+            const link = e.target.closest('.shop-pagination a');
+            if (!link) return;
+            e.preventDefault();
+            loadResults(link.href);
+            shopResults.scrollIntoView({ behavior: 'smooth' });
+        });
+
+        document.querySelectorAll('.shop-sidebar .filter-link').forEach(link => {
+            link.addEventListener('click', (e) => {
+                e.preventDefault();
+                // Keep the price range the sliders show
+                const url = new URL(link.href);
+                const current = new URLSearchParams(window.location.search);
+                ['min_price', 'max_price'].forEach(key => {
+                    if (current.get(key)) url.searchParams.set(key, current.get(key));
+                });
+                loadResults(url.toString());
+            });
+        });
+
+        history.replaceState({ shopResults: true }, '', window.location.href);
+        window.addEventListener('popstate', (e) => {
+            if (e.state && e.state.shopResults) loadResults(window.location.href, false);
+        });
+    }
     // --- Product Carousel Logic ---
     window.moveCarousel = function(carouselId, direction) {
         const container = document.getElementById(carouselId);
@@ -154,6 +242,199 @@ document.addEventListener('DOMContentLoaded', () => {
         document.getElementById(tabId).classList.remove('hidden');
     }
 
+    // --- Lazy Reviews ---
+    // The Reviews tab fetches its first page when opened, then one page per "Load more"
+    const reviewsList = document.getElementById('reviews-list');
+
+    if (reviewsList) {
+        let reviewsRequested = false;
+
+        function loadReviews(url, placeholder) {
+            return fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                .then(response => {
+                    if (!response.ok) throw new Error(response.statusText);
+                    return response.text();
+                })
+                .then(html => {
+                    placeholder.insertAdjacentHTML('beforebegin', html);
+                    placeholder.remove();
+                    feather.replace();
+                });
+        }
+
+        const reviewsTabBtn = document.querySelector('button[onclick="switchTab(\'reviews\')"]');
+        if (reviewsTabBtn) {
+            reviewsTabBtn.addEventListener('click', () => {
+                if (reviewsRequested) return;
+                reviewsRequested = true;
+                const placeholder = reviewsList.querySelector('.reviews-loading');
+                loadReviews(reviewsList.dataset.url, placeholder).catch(() => {
+                    placeholder.textContent = 'Could not load reviews. Open the tab again to retry.';
+                    reviewsRequested = false;
+                });
+            });
+        }
+
+        reviewsList.addEventListener('click', (e) => {
+            const button = e.target.closest('.reviews-more');
+            if (!button) return;
+            button.disabled = true;
+            loadReviews(button.dataset.next, button).catch(() => {
+                button.disabled = false;
+                showToast('Failed to load more reviews', 'error');
+            });
+        });
+    }
+
+    // --- Cart Batching ---
+    // Cart clicks are queued per product and sent together as one POST, so a burst of
+    // "+" presses becomes a single request and a single transaction on the server
+    const cartUpdateUrl = document.querySelector('meta[name="cart-update-url"]')?.content;
+    const cartStateUrl = document.querySelector('meta[name="cart-state-url"]')?.content;
+    const csrfMeta = document.querySelector('meta[name="csrf-token"]');
+    // Pages pre-rendered by store.export carry no CSRF token and an empty cart badge
+    const isExportedPage = !csrfMeta;
+    let csrfToken = csrfMeta?.content;
+    const CART_FLUSH_DELAY = 250;
+    let pendingCartOps = new Map();
+    let cartFlushTimer = null;
+    let cartRequest = null;
+    let cartToast = null;
+
+    function queueCartOp(op, productId, quantity) {
+        const current = pendingCartOps.get(productId);
+        if (op === 'add' && current && current.op === 'remove') {
+            pendingCartOps.set(productId, { op: 'set', quantity: Math.max(quantity, 0) });
+        } else if (op === 'add' && current) {
+            current.quantity += quantity;
+        } else {
+            pendingCartOps.set(productId, { op, quantity });
+        }
+        clearTimeout(cartFlushTimer);
+        cartFlushTimer = setTimeout(flushCart, CART_FLUSH_DELAY);
+    }
+
+    function readCsrfCookie() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : null;
+    }
+
+    function ensureCsrfToken() {
+        csrfToken = csrfToken || readCsrfCookie();
+        if (csrfToken) return Promise.resolve(csrfToken);
+        // The cart state endpoint sets the cookie
+        return fetch(cartStateUrl).then(() => (csrfToken = readCsrfCookie()));
+    }
+
+    function flushCart() {
+        // One request in flight at a time; clicks made meanwhile go out when it returns
+        if (cartRequest || pendingCartOps.size === 0) return;
+        const operations = Array.from(pendingCartOps, ([product, entry]) => ({ op: entry.op, product, quantity: entry.quantity }));
+        const message = cartToast;
+        pendingCartOps = new Map();
+        cartToast = null;
+        cartRequest = ensureCsrfToken().then(token => fetch(cartUpdateUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': token,
+                'X-Requested-With': 'XMLHttpRequest'
+            },
+            body: JSON.stringify({ operations })
+        }))
+            .then(response => response.json().then(data => {
+                if (!response.ok) throw new Error(data.error || response.statusText);
+                return data;
+            }))
+            .then(data => {
+                renderCart(data);
+                if (message) showToast(message);
+            })
+            .catch(error => {
+                console.error('Error updating cart:', error);
+                showToast('Failed to update cart', 'error');
+            })
+            .finally(() => {
+                cartRequest = null;
+                flushCart();
+            });
+    }
+
+    function renderCart(data) {
+        const badge = document.querySelector('.header-actions .btn-primary span');
+        if (badge) {
+            badge.textContent = data.cart_count;
+            badge.style.display = data.cart_count > 0 ? 'flex' : 'none';
+        } else if (data.cart_count > 0) {
+            const cartBtn = document.querySelector('.header-actions .btn-primary');
+            const newBadge = document.createElement('span');
+            newBadge.style.cssText = 'position: absolute; top: -5px; right: -5px; background: #ff4444; color: white; border-radius: 50%; width: 18px; height: 18px; display: flex; align-items: center; justify-content: center; font-size: 0.7rem; font-weight: 700;';
+            newBadge.textContent = data.cart_count;
+            cartBtn.appendChild(newBadge);
+        }
+
+        // Cart page: patch the changed rows and the summary in place
+        const cartRows = document.querySelectorAll('[data-cart-line]');
+        if (cartRows.length === 0) return;
+        if (data.cart_count === 0) {
+            window.location.reload();
+            return;
+        }
+        Object.entries(data.lines).forEach(([productId, line]) => {
+            const row = document.querySelector(`[data-cart-line="${productId}"]`);
+            if (!row) return;
+            if (line.quantity === 0) {
+                row.remove();
+                return;
+            }
+            row.querySelector('.cart-line-qty').textContent = line.quantity;
+            row.querySelector('.cart-line-subtotal').textContent = `$${line.subtotal}`;
+        });
+        document.querySelectorAll('.cart-total').forEach(el => el.textContent = `$${data.total}`);
+    }
+
+    // Product cards call this directly
+    window.addToCart = function(productId) {
+        if (!cartUpdateUrl) return;
+        cartToast = 'Added to cart successfully!';
+        queueCartOp('add', productId, 1);
+    }
+
+    if (isExportedPage && cartStateUrl && readCsrfCookie()) {
+        // Only a visitor who has been on a rendered page can have a cart; fill in the badge
+        fetch(cartStateUrl)
+            .then(response => response.json())
+            .then(renderCart)
+            .catch(error => console.error('Error loading cart:', error));
+    }
+
+    // The product page form posts normally, except on exported pages where it has no token
+    document.querySelectorAll('form[data-add-to-cart]').forEach(form => {
+        form.addEventListener('submit', (e) => {
+            if (!isExportedPage || !cartUpdateUrl) return;
+            e.preventDefault();
+            const quantity = parseInt(form.querySelector('[name="quantity"]').value, 10) || 1;
+            cartToast = 'Added to cart successfully!';
+            queueCartOp('add', parseInt(form.dataset.addToCart, 10), quantity);
+        });
+    });
+
+    document.querySelectorAll('form[data-cart-op]').forEach(form => {
+        form.addEventListener('submit', (e) => {
+            if (!cartUpdateUrl) return;
+            e.preventDefault();
+            const productId = parseInt(form.dataset.product, 10);
+            const quantity = parseInt(form.dataset.quantity || '0', 10);
+            queueCartOp(form.dataset.cartOp, productId, quantity);
+
+            // Show the quantity straight away; the response confirms it
+            const qty = form.closest('[data-cart-line]')?.querySelector('.cart-line-qty');
+            if (qty && form.dataset.cartOp === 'add') {
+                qty.textContent = Math.max(parseInt(qty.textContent, 10) + quantity, 0);
+            }
+        });
+    });
+
     // --- Mobile Filter Logic ---
     window.toggleFilters = function() {
         const content = document.getElementById('sidebar-content');
@@ -167,6 +448,85 @@ document.addEventListener('DOMContentLoaded', () => {
         document.body.style.overflow = menu.classList.contains('active') ? 'hidden' : '';
     }
 
+    // --- Header Search Typeahead ---
+    const searchInput = document.getElementById('header-search-input');
+    const suggestionBox = document.getElementById('search-suggestions');
+
+    if (searchInput && suggestionBox) {
+        let debounceTimer = null;
+        let lastQuery = '';
+        let activeIndex = -1;
+
+        function escapeHtml(text) {
+            const div = document.createElement('div');
+            div.textContent = text;
+            return div.innerHTML;
+        }
+
+        function renderSuggestions(results) {
+            activeIndex = -1;
+            if (!results.length) {
+                suggestionBox.classList.remove('active');
+                suggestionBox.innerHTML = '';
+                return;
+            }
+            suggestionBox.innerHTML = results.map(result => `
+                <a href="${result.url}" class="search-suggestion">
+                    <span>${escapeHtml(result.name)}</span>
+                    <span class="text-mono">${result.type === 'category' ? 'Category' : escapeHtml(result.sku)}</span>
+                </a>
+            `).join('');
+            suggestionBox.classList.add('active');
+        }
+
+        function fetchSuggestions() {
+            const query = searchInput.value.trim();
+            if (query === lastQuery) return;
+            lastQuery = query;
+            if (!query) {
+                renderSuggestions([]);
+                return;
+            }
+            fetch(`${searchInput.dataset.suggestUrl}?q=${encodeURIComponent(query)}`)
+                .then(response => response.json())
+                .then(data => {
+                    // Ignore responses that arrive after the user kept typing
+                    if (data.query.trim() === searchInput.value.trim()) {
+                        renderSuggestions(data.results);
+                    }
+                })
+                .catch(error => console.error('Search error:', error));
+        }
+
+        searchInput.addEventListener('input', () => {
+            clearTimeout(debounceTimer);
+            debounceTimer = setTimeout(fetchSuggestions, 120);
+        });
+
+        searchInput.addEventListener('keydown', (e) => {
+            const links = suggestionBox.querySelectorAll('.search-suggestion');
+            if (!links.length) return;
+            if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+                e.preventDefault();
+                activeIndex += e.key === 'ArrowDown' ? 1 : -1;
+                if (activeIndex >= links.length) activeIndex = 0;
+                if (activeIndex < 0) activeIndex = links.length - 1;
+                links.forEach((link, index) => link.classList.toggle('active', index === activeIndex));
+            } else if (e.key === 'Enter' && activeIndex >= 0) {
+                e.preventDefault();
+                window.location.href = links[activeIndex].href;
+            } else if (e.key === 'Escape') {
+                renderSuggestions([]);
+            }
+        });
+
+        document.addEventListener('click', (e) => {
+            if (!e.target.closest('.header-search')) {
+                suggestionBox.classList.remove('active');
+            }
+        });
+    }
+
     // --- Description Tab Scroll Spy ---
     const descNavLinks = document.querySelectorAll('.desc-nav-link');
     const descSections = document.querySelectorAll('.desc-section');
@@ -22,18 +22,31 @@ class ReviewInline(admin.TabularInline):
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'icon']
+    list_display = ['name', 'slug', 'icon', 'product_count', 'price_range']
+    list_select_related = ['stats']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name']
 
+    @admin.display(description='Products')
+    def product_count(self, obj):
+        stats = getattr(obj, 'stats', None)
+        return f"{stats.product_count} ({stats.in_stock_count} in stock)" if stats else '-'
+
+    @admin.display(description='Price range')
+    def price_range(self, obj):
+        stats = getattr(obj, 'stats', None)
+        if not stats or stats.min_price is None:
+            return '-'
+        return f"${stats.min_price} - ${stats.max_price}"
+
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'sku', 'category', 'price', 'stock_status', 'is_featured', 'is_new', 'is_bestseller']
+    list_display = ['name', 'sku', 'category', 'price', 'stock', 'stock_status', 'is_featured', 'is_new', 'is_bestseller']
     list_filter = ['category', 'stock_status', 'is_featured', 'is_new', 'is_bestseller']
     search_fields = ['name', 'sku', 'short_description']
     prepopulated_fields = {'slug': ('name',)}
-    list_editable = ['price', 'stock_status', 'is_featured', 'is_new', 'is_bestseller']
+    list_editable = ['price', 'stock', 'stock_status', 'is_featured', 'is_new', 'is_bestseller']
     inlines = [ProductImageInline, DescriptionSectionInline, ReviewInline]
     
     fieldsets = (
@@ -47,7 +60,7 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('short_description', 'specs')
         }),
         ('Status', {
-            'fields': ('stock_status', 'is_featured', 'is_new', 'is_bestseller')
+            'fields': ('stock', 'stock_status', 'is_featured', 'is_new', 'is_bestseller')
         }),
     )
 
@@ -72,7 +85,9 @@ class ReviewAdmin(admin.ModelAdmin):
     search_fields = ['author', 'content']
 
 
-from .models import Order, OrderItem
+from . import order_search
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .tasks import send_order_confirmation
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -84,7 +99,52 @@ class OrderItemInline(admin.TabularInline):
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'full_name', 'phone_number', 'status', 'total_price', 'created_at']
     list_filter = ['status', 'created_at']
-    search_fields = ['full_name', 'phone_number', 'address', 'id']
+    # Searched through the index in store.order_search, not with LIKE on these columns
+    search_fields = ['=id', 'phone_number', 'full_name', 'address']
+    search_help_text = 'Order number, phone number (any format, matches the last digits) or words from the name or address'
     list_editable = ['status']
     inlines = [OrderItemInline]
+    actions = ['resend_confirmation']
+    # Skip the unfiltered COUNT(*) over the whole orders table on every search
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        return order_search.search(queryset, search_term), False
+
+    @admin.action(description="Re-send order confirmation")
+    def resend_confirmation(self, request, queryset):
+        for order in queryset:
+            send_order_confirmation.enqueue(order_id=order.pk)
+        self.message_user(request, f"Queued {queryset.count()} confirmation(s).")
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    fields = ['product_name', 'sku', 'price', 'quantity']
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Read-only view of orders moved out by store.archive"""
+    list_display = ['id', 'full_name', 'phone_number', 'status', 'total', 'created_at', 'archived_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['=id', 'full_name', 'phone_number', 'address']
+    date_hierarchy = 'created_at'
+    inlines = [ArchivedOrderItemInline]
+    # The archive only grows; skip the unfiltered COUNT(*) on every changelist page
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,218 @@
+"""
+Read-only JSON catalogue API.
+
+Listings accept the same filters as the shop page plus `fields` (sparse
+fieldsets), `limit` and an opaque keyset `cursor`. Serialised products are
+cached under a key that includes `updated_at` and the category slug, so
+edits and category renames never need an explicit invalidation, and every
+response carries an `ETag`.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Avg, Count
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_GET
+
+from .listing import SORT_ORDERS, decode_cursor, encode_cursor, filter_products, keyset_after
+from .models import Category, Product
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+PAYLOAD_TIMEOUT = 60 * 60 * 24
+# Columns of the rows `cached_payloads` takes; the category slug is in the payload but not in `updated_at`
+PAYLOAD_STAMP = ('pk', 'updated_at', 'category__slug')
+
+LIST_FIELDS = (
+    'id', 'name', 'slug', 'sku', 'url', 'category', 'price', 'original_price', 'discount_percentage',
+    'short_description', 'image', 'stock_status', 'is_featured', 'is_new', 'is_bestseller', 'updated_at',
+)
+DETAIL_FIELDS = LIST_FIELDS + ('specs', 'images', 'description_sections', 'rating_average', 'review_count')
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _json_response(request, data, status=200):
+    """JSON response with an ETag, or a 304 when the client already has it"""
+    body = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    etag = '"%s"' % hashlib.md5(body, usedforsecurity=False).hexdigest()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, status=status, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _requested_fields(request, allowed):
+    raw = request.GET.get('fields')
+    if not raw:
+        return None
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = sorted(set(fields) - set(allowed))
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def _sparse(payload, fields):
+    if fields is None:
+        return payload
+    return {field: payload[field] for field in fields}
+
+
+def _image_url(image):
+    return image.image.url if image.image else None
+
+
+def serialize_product(product, detail=False):
+    """Plain-dict representation of a product (expects images prefetched)"""
+    images = list(product.images.all())
+    primary = next((image for image in images if image.is_primary), images[0] if images else None)
+    payload = {
+        'id': product.pk,
+        'name': product.name,
+        'slug': product.slug,
+        'sku': product.sku,
+        'url': product.get_absolute_url(),
+        'category': product.category.slug,
+        'price': product.price,
+        'original_price': product.original_price,
+        'discount_percentage': product.discount_percentage,
+        'short_description': product.short_description,
+        'image': _image_url(primary) if primary else None,
+        'stock_status': product.stock_status,
+        'is_featured': product.is_featured,
+        'is_new': product.is_new,
+        'is_bestseller': product.is_bestseller,
+        'updated_at': product.updated_at,
+    }
+    if detail:
+        rating = product.reviews.aggregate(average=Avg('rating'), count=Count('pk'))
+        payload.update({
+            'specs': product.specs,
+            'images': [
+                {'url': _image_url(image), 'alt_text': image.alt_text, 'is_primary': image.is_primary}
+                for image in images
+            ],
+            'description_sections': [
+                {
+                    'title': section.title,
+                    'slug': section.slug,
+                    'content': section.content,
+                    'image': section.image.url if section.image else None,
+                }
+                for section in product.description_sections.all()
+            ],
+            'rating_average': rating['average'] or 0,
+            'review_count': rating['count'],
+        })
+    # Round-trip through JSON so cached payloads hold only plain values.
+    return json.loads(json.dumps(payload, cls=DjangoJSONEncoder))
+
+
+def _payload_key(pk, updated_at, category_slug, detail):
+    stamp = updated_at.timestamp() if updated_at else 0
+    return f"api:product:{'detail' if detail else 'list'}:{pk}:{stamp}:{category_slug}"
+
+
+def cached_payloads(rows, detail=False):
+    """
+    Serialised products for `PAYLOAD_STAMP` rows, in order. Only cache
+    misses are loaded from the database, in one batch.
+    """
+    keys = {pk: _payload_key(pk, updated_at, category_slug, detail) for pk, updated_at, category_slug in rows}
+    found = cache.get_many(keys.values())
+    missing = [pk for pk, key in keys.items() if key not in found]
+    if missing:
+        products = Product.objects.filter(pk__in=missing).select_related('category').prefetch_related('images')
+        if detail:
+            products = products.prefetch_related('description_sections')
+        fresh = {keys[product.pk]: serialize_product(product, detail) for product in products}
+        cache.set_many(fresh, PAYLOAD_TIMEOUT)
+        found.update(fresh)
+    return [found[keys[pk]] for pk, *_stamp in rows if keys[pk] in found]
+
+
+def _decode_cursor(cursor, ordering):
+    try:
+        return decode_cursor(cursor, ordering)
+    except ValueError as error:
+        raise BadRequest(str(error))
+
+
+@require_GET
+def category_list(request):
+    """All categories"""
+    categories = [
+        {
+            'id': category.pk,
+            'name': category.name,
+            'slug': category.slug,
+            'icon': category.icon,
+            'description': category.description,
+            'url': category.get_absolute_url(),
+        }
+        for category in Category.objects.all()
+    ]
+    return _json_response(request, {'results': categories})
+
+
+@require_GET
+def product_list(request):
+    """Filtered product listing with keyset pagination"""
+    try:
+        fields = _requested_fields(request, LIST_FIELDS)
+        try:
+            limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            raise BadRequest('limit must be an integer')
+
+        products, _category, _query, sort = filter_products(request.GET)
+        ordering = SORT_ORDERS[sort]
+        cursor = request.GET.get('cursor')
+        if cursor:
+            products = products.filter(keyset_after(ordering, _decode_cursor(cursor, ordering)))
+    except BadRequest as error:
+        return _error(str(error))
+    except Http404:
+        return _error('Unknown category', status=404)
+
+    names = [field.lstrip('-') for field in ordering]
+    rows = list(products.values_list(*PAYLOAD_STAMP, *names)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_url = None
+    if has_more:
+        params = request.GET.copy()
+        params['cursor'] = encode_cursor(list(rows[-1][len(PAYLOAD_STAMP):]))
+        next_url = f'{request.path}?{params.urlencode()}'
+
+    results = cached_payloads([row[:len(PAYLOAD_STAMP)] for row in rows])
+    return _json_response(request, {
+        'results': [_sparse(payload, fields) for payload in results],
+        'next': next_url,
+    })
+
+
+@require_GET
+def product_detail(request, slug):
+    """One product with specs, images and description sections"""
+    try:
+        fields = _requested_fields(request, DETAIL_FIELDS)
+    except BadRequest as error:
+        return _error(str(error))
+    row = get_object_or_404(Product.objects.values_list(*PAYLOAD_STAMP), slug=slug)
+    payload = cached_payloads([row], detail=True)[0]
+    return _json_response(request, _sparse(payload, fields))
@@ -0,0 +1,76 @@
+"""
+Archival of finished orders.
+
+Completed and cancelled orders that have not changed for
+ORDER_ARCHIVE_AFTER_DAYS are copied, with their lines, into
+`ArchivedOrder`/`ArchivedOrderItem` and deleted from the live tables. Each
+batch is its own short transaction over at most `batch_size` orders, so a
+large backlog never holds locks for long and an interrupted run loses
+nothing. Archived orders keep their original ids.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+ARCHIVED_STATUSES = ('Completed', 'Cancelled')
+
+
+def archivable(older_than_days=None):
+    """Live orders due for archival"""
+    if older_than_days is None:
+        older_than_days = settings.ORDER_ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Order.objects.filter(status__in=ARCHIVED_STATUSES, updated_at__lt=cutoff)
+
+
+def _archive_batch(orders, batch_size):
+    with transaction.atomic():
+        batch = list(orders.select_for_update().order_by('pk')[:batch_size])
+        if not batch:
+            return 0
+        ids = [order.pk for order in batch]
+        lines = list(
+            OrderItem.objects.filter(order_id__in=ids).order_by('pk')
+            .values_list('order_id', 'product_id', 'product__name', 'product__sku', 'price', 'quantity')
+        )
+        totals = dict.fromkeys(ids, 0)
+        for order_id, _product_id, _name, _sku, price, quantity in lines:
+            totals[order_id] += price * quantity
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=order.pk, full_name=order.full_name, phone_number=order.phone_number, address=order.address,
+                location=order.location, status=order.status, total=totals[order.pk],
+                created_at=order.created_at, updated_at=order.updated_at,
+            )
+            for order in batch
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(
+                order_id=order_id, product_id=product_id, product_name=name, sku=sku, price=price, quantity=quantity,
+            )
+            for order_id, product_id, name, sku, price, quantity in lines
+        ])
+        # Removes the order lines too, with one DELETE per table
+        Order.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def archive_orders(older_than_days=None, batch_size=None, max_batches=None, pause=0):
+    """Move due orders into the archive batch by batch; returns the number archived"""
+    batch_size = batch_size or settings.ORDER_ARCHIVE_BATCH_SIZE
+    orders = archivable(older_than_days)
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = _archive_batch(orders, batch_size)
+        archived += moved
+        batches += 1
+        if moved < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return archived
@@ -0,0 +1,126 @@
+"""
+Batched cart mutations.
+
+`apply` takes a list of add/set/remove operations, folds them into one
+final change per product and writes them in a single transaction: set
+quantities are upserted, additions are one F() increment across the
+existing lines followed by an INSERT-or-ignore only when some were new,
+and emptied lines are deleted together.
+`summary` returns the changed lines plus the cart's item count and total
+from one aggregate query, so callers never loop over cart rows in Python.
+"""
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Greatest, Least
+
+from .models import Cart, CartItem, Product
+
+OPERATIONS = ('add', 'set', 'remove')
+MAX_OPERATIONS = 100
+MAX_QUANTITY = 999
+
+
+class CartError(ValueError):
+    pass
+
+
+def parse_operations(payload):
+    """Validated (op, product_id, quantity) tuples from a decoded JSON body"""
+    operations = payload.get('operations') if isinstance(payload, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise CartError('Expected a non-empty "operations" list')
+    if len(operations) > MAX_OPERATIONS:
+        raise CartError(f'At most {MAX_OPERATIONS} operations per request')
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            raise CartError(f'Each operation needs "op" set to one of: {", ".join(OPERATIONS)}')
+        product_id = operation.get('product')
+        quantity = operation.get('quantity', 1 if operation['op'] == 'add' else 0)
+        if type(product_id) is not int or type(quantity) is not int:
+            raise CartError('"product" and "quantity" must be integers')
+        if abs(quantity) > MAX_QUANTITY or (operation['op'] == 'set' and quantity < 0):
+            raise CartError(f'Quantities must be between 0 and {MAX_QUANTITY}')
+        parsed.append((operation['op'], product_id, quantity))
+    return parsed
+
+
+def _fold(operations):
+    """One ('add', delta) or ('set', quantity) per product, in the order they were sent"""
+    changes = {}
+    for op, product_id, quantity in operations:
+        kind, value = changes.get(product_id, ('add', 0))
+        if op == 'remove':
+            changes[product_id] = ('set', 0)
+        elif op == 'set':
+            changes[product_id] = ('set', quantity)
+        elif kind == 'set':
+            changes[product_id] = ('set', min(max(value + quantity, 0), MAX_QUANTITY))
+        else:
+            changes[product_id] = ('add', value + quantity)
+    return changes
+
+
+def get_cart(cart_id, create=True):
+    cart = Cart.objects.filter(cart_id=cart_id).order_by('pk').first() if cart_id else None
+    return cart or (Cart.objects.create(cart_id=cart_id) if create else None)
+
+
+def apply(cart, operations):
+    """Apply parsed operations atomically; returns the ids of the products they touched"""
+    changes = _fold(operations)
+    sets = {pk: value for pk, (kind, value) in changes.items() if kind == 'set' and value > 0}
+    adds = {pk: value for pk, (kind, value) in changes.items() if kind == 'add' and value}
+    removals = [pk for pk, (kind, value) in changes.items() if kind == 'set' and not value]
+    lines = CartItem.objects.filter(cart=cart)
+    with transaction.atomic():
+        known = set(Product.objects.filter(pk__in=changes).order_by().values_list('pk', flat=True))
+        unknown = sorted(set(changes) - known)
+        if unknown:
+            raise CartError(f'Unknown product ids: {", ".join(map(str, unknown))}')
+        if sets:
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, product_id=pk, quantity=quantity) for pk, quantity in sets.items()],
+                update_conflicts=True, unique_fields=['cart', 'product'], update_fields=['quantity', 'is_active'],
+            )
+        if adds:
+            delta = Case(*[When(product_id=pk, then=Value(value)) for pk, value in adds.items()], output_field=IntegerField())
+            updated = lines.filter(product_id__in=adds).update(
+                quantity=Least(Greatest(F('quantity') + delta, Value(0)), Value(MAX_QUANTITY)),
+                is_active=True,
+            )
+            additions = {pk: value for pk, value in adds.items() if value > 0}
+            if additions and updated < len(adds):
+                # Lines that were not in the cart yet; the ones just incremented conflict and are skipped
+                CartItem.objects.bulk_create(
+                    [CartItem(cart=cart, product_id=pk, quantity=min(value, MAX_QUANTITY)) for pk, value in additions.items()],
+                    ignore_conflicts=True,
+                )
+        if removals or any(value < 0 for value in adds.values()):
+            lines.filter(Q(product_id__in=removals) | Q(quantity=0)).delete()
+    return list(changes)
+
+
+def update(cart_id, operations):
+    """Find or create the cart and apply operations to it; one unit of work for core.writes"""
+    cart = get_cart(cart_id)
+    return cart, apply(cart, operations)
+
+
+def summary(cart, product_ids=()):
+    """Quantities and subtotals of `product_ids` (0 once removed) plus the cart's count and total"""
+    lines = {pk: {'quantity': 0, 'subtotal': '0.00'} for pk in product_ids}
+    rows = CartItem.objects.filter(cart=cart, is_active=True, product_id__in=product_ids).values_list(
+        'product_id', 'quantity', 'product__price',
+    )
+    for product_id, quantity, price in rows:
+        lines[product_id] = {'quantity': quantity, 'subtotal': f'{price * quantity:.2f}'}
+    totals = CartItem.objects.filter(cart=cart, is_active=True).aggregate(
+        count=Sum('quantity'),
+        total=Sum(F('quantity') * F('product__price'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+    )
+    return {
+        'lines': {str(pk): line for pk, line in lines.items()},
+        'cart_count': totals['count'] or 0,
+        'total': f"{totals['total'] or 0:.2f}",
+    }
@@ -1,20 +1,15 @@
-from .models import Cart, CartItem
-from .views import _cart_id
+from django.db.models import Sum
+
+from .models import CartItem
 
 def counter(request):
-    cart_count = 0
     if 'admin' in request.path:
         return {}
-    else:
-        try:
-            cart = Cart.objects.filter(cart_id=_cart_id(request))
-            if request.user.is_authenticated:
-                cart_items = CartItem.objects.all().filter(cart=cart[:1])
-            else:
-                cart_items = CartItem.objects.all().filter(cart=cart[:1])
-
-            for cart_item in cart_items:
-                cart_count += cart_item.quantity
-        except Cart.DoesNotExist:
-            cart_count = 0
+    # No session yet means no cart; don't create one just to render a zero
+    cart_id = request.session.session_key
+    if not cart_id:
+        return dict(cart_count=0)
+    cart_count = CartItem.objects.filter(
+        cart__cart_id=cart_id, is_active=True
+    ).aggregate(count=Sum('quantity'))['count'] or 0
     return dict(cart_count=cart_count)
@@ -0,0 +1,150 @@
+"""
+Pre-rendered product descriptions.
+
+A product's description sections are sanitised and rendered, table of
+contents included, into `Product.description_html` whenever a section is
+saved or deleted, so the detail page prints one stored string instead of
+cleaning and walking the sections twice per request. Run
+``manage.py rebuild_descriptions`` after changing the template, the
+allow-lists below or MEDIA_URL.
+"""
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.template.loader import render_to_string
+from django.utils.text import slugify
+
+from .models import DescriptionSection, Product
+
+ALLOWED_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'code', 'div', 'em', 'h3', 'h4', 'h5', 'hr', 'i', 'img', 'li', 'ol', 'p', 'pre',
+    'span', 'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'th', 'thead', 'tr', 'u', 'ul',
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+# Dropped together with everything inside them
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'svg', 'math'}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan'},
+}
+GLOBAL_ATTRIBUTES = {'class'}
+URL_ATTRIBUTES = {'href', 'src'}
+SAFE_SCHEMES = {'', 'http', 'https', 'mailto'}
+
+
+def _safe_url(value):
+    cleaned = re.sub(r'[\x00-\x20]', '', value)
+    try:
+        return urlsplit(cleaned).scheme.lower() in SAFE_SCHEMES
+    except ValueError:
+        return False
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def _attributes(self, tag, attrs):
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set()) | GLOBAL_ATTRIBUTES
+        kept = []
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES and not _safe_url(value):
+                continue
+            kept.append(f' {name}="{escape(value)}"')
+        return ''.join(kept)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+        self.parts.append(f'<{tag}{self._attributes(tag, attrs)}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and tag in self.open_tags:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping or tag not in self.open_tags:
+            return
+        # Close anything left open inside it so the output stays well formed
+        while self.open_tags:
+            current = self.open_tags.pop()
+            self.parts.append(f'</{current}>')
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.parts.append(escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        return ''.join(self.parts) + ''.join(f'</{tag}>' for tag in reversed(self.open_tags))
+
+
+def sanitize(html):
+    """Allow-list clean-up of admin-entered section HTML"""
+    parser = _Sanitizer()
+    parser.feed(html or '')
+    return parser.result()
+
+
+def render_sections(sections):
+    """Final description HTML (contents nav and body) for ordered sections; '' when there are none"""
+    entries = []
+    anchors = set()
+    for section in sections:
+        anchor = base = slugify(section.slug or section.title) or 'section'
+        suffix = 2
+        while anchor in anchors:
+            anchor = f'{base}-{suffix}'
+            suffix += 1
+        anchors.add(anchor)
+        entries.append({
+            'title': section.title,
+            'anchor': anchor,
+            'html': sanitize(section.content),
+            'image_url': section.image.url if section.image else None,
+        })
+    if not entries:
+        return ''
+    return render_to_string('product_description.html', {'sections': entries}).strip()
+
+
+def refresh(product_id):
+    sections = DescriptionSection.objects.filter(product_id=product_id).order_by('order', 'pk')
+    Product.objects.filter(pk=product_id).update(description_html=render_sections(sections))
+
+
+def rebuild_all(batch_size=500):
+    """Re-render every product's description; returns the number of products"""
+    products = Product.objects.order_by('pk').only('pk', 'description_html')
+    count = 0
+    last_pk = 0
+    while True:
+        batch = list(products.filter(pk__gt=last_pk).prefetch_related('description_sections')[:batch_size])
+        if not batch:
+            return count
+        for product in batch:
+            sections = sorted(product.description_sections.all(), key=lambda section: (section.order, section.pk))
+            product.description_html = render_sections(sections)
+        Product.objects.bulk_update(batch, ['description_html'])
+        count += len(batch)
+        last_pk = batch[-1].pk
@@ -0,0 +1,209 @@
+"""
+Incremental static export of the catalogue pages.
+
+`export_site` renders the homepage, the shop, the first page of every
+category and every product page to ``<root>/<url path>/index.html``, so a
+web server can answer them without Python (nginx: ``try_files
+$uri/index.html @django`` for requests without a query string). Each page
+gets a fingerprint of what it shows: the `updated_at` of its products,
+which touch_product also bumps for images, descriptions and reviews, and
+the values of the small tables that have no timestamp (categories and
+their stats, HomeSettings, Features). manifest.json keeps the fingerprints
+of the last run, so an export re-renders only pages whose fingerprint
+moved and deletes the pages of products and categories that are gone.
+Stale pages are rendered by a process pool.
+"""
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from importlib import import_module
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.http import HttpRequest, QueryDict
+from django.urls import resolve, reverse
+
+from core.models import Feature, HomeSettings
+
+from . import listing
+from .models import Product, ProductNeighbours
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+RELATED_LIMIT = 3
+# The related-products filler skips the product and up to two related ones before taking three
+CATEGORY_HEAD = RELATED_LIMIT * 2
+CHUNK_SIZE = 100
+
+
+def _digest(*parts):
+    return hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def _row(instance):
+    return [getattr(instance, field.attname) for field in instance._meta.concrete_fields] if instance else None
+
+
+def _templates_digest():
+    """Changes when any project template does, so a redesign re-renders everything"""
+    digest = hashlib.md5(usedforsecurity=False)
+    for directory in settings.TEMPLATES[0]['DIRS']:
+        for path in sorted(Path(directory).rglob('*.html')):
+            digest.update(path.read_bytes())
+    return _digest(FORMAT_VERSION, settings.STATIC_URL, digest.hexdigest())
+
+
+def _stamps(queryset):
+    return list(queryset.values_list('pk', 'updated_at'))
+
+
+def plan():
+    """{url path: fingerprint} for every page the export covers"""
+    from .views import SHOP_PAGE_SIZE
+
+    site = _templates_digest()
+    categories = listing.category_list()
+    category_rows = {category.pk: _row(category) for category in categories}
+    # The shop sidebar, price slider and homepage all show every category with its stats
+    sidebar = _digest(site, [(_row(category), _row(getattr(category, 'stats', None))) for category in categories])
+    no_filters = QueryDict()
+
+    pages = {
+        reverse('home'): _digest(
+            sidebar, _row(HomeSettings.load()), [_row(feature) for feature in Feature.objects.all()],
+            _stamps(Product.objects.filter(is_featured=True)[:3]), _stamps(Product.objects.filter(is_new=True)[:6]),
+        ),
+        reverse('shop'): _digest(sidebar, _stamps(listing.filter_products(no_filters)[0][:SHOP_PAGE_SIZE])),
+    }
+    heads = {}
+    for category in categories:
+        first_page = listing.filter_products(no_filters, category=category)[0][:SHOP_PAGE_SIZE]
+        pages[category.get_absolute_url()] = _digest(sidebar, _stamps(first_page))
+        heads[category.pk] = list(Product.objects.filter(category=category).values_list('pk', flat=True)[:CATEGORY_HEAD])
+
+    neighbours = {}
+    for product_id, kind, ids in ProductNeighbours.objects.values_list('product_id', 'kind', 'neighbour_ids').iterator():
+        neighbours[product_id, kind] = ids[:RELATED_LIMIT]
+    products = list(Product.objects.order_by('pk').values_list('pk', 'slug', 'category_id', 'updated_at').iterator())
+    stamps = {pk: updated_at for pk, _slug, _category_id, updated_at in products}
+    prefix, _, suffix = reverse('product_detail', kwargs={'slug': 'slug'}).rpartition('slug')
+    for pk, slug, category_id, updated_at in products:
+        bought = neighbours.get((pk, ProductNeighbours.BOUGHT_TOGETHER), [])
+        similar = neighbours.get((pk, ProductNeighbours.SIMILAR_SPECS), [])
+        # Fewer than three bought-together products are topped up from the newest in the category
+        filler = heads.get(category_id, []) if len(bought) < RELATED_LIMIT else []
+        pages[f'{prefix}{slug}{suffix}'] = _digest(
+            site, category_rows.get(category_id), updated_at,
+            [(other, stamps.get(other)) for other in [*bought, *similar, *filler]],
+        )
+    return pages
+
+
+def page_file(root, path):
+    return Path(root, path.strip('/'), 'index.html')
+
+
+def _page_request(path):
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.GET = QueryDict()
+    request.META = {'SERVER_NAME': 'localhost', 'SERVER_PORT': '80'}
+    # A fresh session has no key, so the cart badge renders empty and no session is created
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    request.user = AnonymousUser()
+    # Templates leave out the CSRF token; main.js fetches one when the visitor first uses the cart
+    request.static_export = True
+    return request
+
+
+def _write(target, content):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temporary = target.with_name(f'.{target.name}.{os.getpid()}.tmp')
+    temporary.write_bytes(content)
+    # The web server sees the old page or the new one, never half of one
+    os.replace(temporary, target)
+
+
+def render_pages(root, paths):
+    """Render `paths` into `root`; returns {path: error} for the pages that failed"""
+    failed = {}
+    for path in paths:
+        try:
+            match = resolve(path)
+            response = match.func(_page_request(path), *match.args, **match.kwargs)
+            if response.status_code != 200:
+                raise ValueError(f'status {response.status_code}')
+            _write(page_file(root, path), response.content)
+        except Exception as error:
+            logger.exception('Static export of %s failed', path)
+            failed[path] = str(error)
+    return failed
+
+
+def _init_worker():
+    django.setup()
+
+
+def _render_in_pool(root, paths, workers):
+    chunks = [paths[start:start + CHUNK_SIZE] for start in range(0, len(paths), CHUNK_SIZE)]
+    # Children must open their own database connections
+    connections.close_all()
+    failed = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for result in pool.map(render_pages, [root] * len(chunks), chunks):
+            failed.update(result)
+    return failed
+
+
+def read_manifest(root):
+    try:
+        with open(Path(root, MANIFEST)) as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return {}
+    return manifest.get('pages', {}) if manifest.get('format') == FORMAT_VERSION else {}
+
+
+def _remove(root, path):
+    target = page_file(root, path)
+    target.unlink(missing_ok=True)
+    for directory in target.parents:
+        if directory == Path(root) or any(directory.iterdir()):
+            break
+        directory.rmdir()
+
+
+def export_site(root=None, workers=1, force=False, dry_run=False):
+    """Bring the export in `root` up to date; returns the paths rendered, unchanged, removed and failed"""
+    root = Path(root or settings.STATIC_EXPORT_ROOT)
+    previous = read_manifest(root)
+    pages = plan()
+    stale = sorted(
+        path for path, fingerprint in pages.items()
+        if force or previous.get(path) != fingerprint or not page_file(root, path).exists()
+    )
+    gone = sorted(set(previous) - set(pages))
+    result = {'rendered': stale, 'unchanged': len(pages) - len(stale), 'removed': gone, 'failed': {}}
+    if dry_run:
+        return result
+
+    if workers > 1 and len(stale) > CHUNK_SIZE:
+        failed = _render_in_pool(root, stale, workers)
+    else:
+        failed = render_pages(root, stale)
+    for path in gone:
+        _remove(root, path)
+
+    # Failed pages stay out of the manifest so the next run retries them
+    done = {path: fingerprint for path, fingerprint in pages.items() if path not in failed}
+    _write(root / MANIFEST, json.dumps({'format': FORMAT_VERSION, 'pages': done}, indent=0).encode())
+    result.update(rendered=[path for path in stale if path not in failed], failed=failed)
+    return result
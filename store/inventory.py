@@ -0,0 +1,49 @@
+"""
+Stock reservation for checkout.
+
+Each line is decremented by one conditional UPDATE, so the check and the
+write happen atomically in the database and concurrent checkouts cannot
+oversell. Call `reserve_stock` inside `transaction.atomic()`: a shortage
+raises `OutOfStock` and rolls back every line reserved before it.
+"""
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Now
+
+from . import stats
+from .listing import bump_catalog_version
+from .models import Product
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id, requested):
+        self.product_id = product_id
+        self.requested = requested
+        super().__init__(f'Not enough stock for product {product_id} (requested {requested})')
+
+
+def reserve_stock(lines):
+    """Decrement stock for (product_id, quantity) lines; products without tracked stock always succeed"""
+    # A consistent order keeps concurrent transactions from deadlocking on row locks.
+    for product_id, quantity in sorted(lines):
+        sells_out = Q(stock=quantity)
+        updated = Product.objects.filter(
+            Q(stock__isnull=True) | Q(stock__gte=quantity), pk=product_id,
+        ).update(
+            stock=F('stock') - quantity,
+            stock_status=Case(
+                When(sells_out & Q(stock_status='in_stock'), then=Value('out_of_stock')),
+                default=F('stock_status'),
+            ),
+            updated_at=Case(When(sells_out, then=Now()), default=F('updated_at')),
+        )
+        if not updated:
+            raise OutOfStock(product_id, quantity)
+
+    # Stock can only reach zero here on a line that just sold it out
+    sold_out = Product.objects.filter(pk__in=[product_id for product_id, _ in lines], stock=0, stock_status='out_of_stock')
+    category_ids = list(sold_out.values_list('category_id', flat=True))
+    if category_ids:
+        stats.products_sold_out(category_ids)
+        # The UPDATE skipped the signals; cached pages still show these products in stock
+        transaction.on_commit(bump_catalog_version)
@@ -0,0 +1,287 @@
+"""
+Product listing filters shared by the shop pages and the JSON API.
+
+Rendered listings are cached under the catalogue version, a counter that
+signals bump whenever a product, category or product image changes, so a
+single increment retires every cached page at once. The category list
+and the shop pages keep their last good copy as well (see core.stale), so
+they are still served while the database is locked. Underneath, the
+ordered ids a filter combination matches are kept in a per-process LRU,
+so every page of a listing is a slice of one list and only that slice's
+products are loaded.
+"""
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from core import stale
+
+from .models import Category, Product
+
+# Every ordering ends on the primary key so pages and cursors are stable.
+SORT_ORDERS = {
+    'featured': ('-is_featured', '-is_bestseller', '-created_at', '-pk'),
+    'price_low': ('price', 'pk'),
+    'price_high': ('-price', '-pk'),
+    'newest': ('-created_at', '-pk'),
+}
+DEFAULT_SORT = 'featured'
+
+FILTER_PARAMS = ('category', 'min_price', 'max_price', 'q', 'sort', 'page')
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def _price(value):
+    try:
+        price = Decimal(value) if value else None
+    except InvalidOperation:
+        return None
+    # NaN and infinity parse but cannot be compared with prices
+    return price if price is None or price.is_finite() else None
+
+
+def sort_name(params):
+    sort = params.get('sort', DEFAULT_SORT)
+    return sort if sort in SORT_ORDERS else DEFAULT_SORT
+
+
+def filter_products(params, category=None):
+    """
+    Apply the shop's `category`, `min_price`, `max_price`, `q` and `sort`
+    parameters. Returns (products, selected_category, search_query, sort).
+    """
+    products = Product.objects.all()
+
+    category_slug = params.get('category')
+    if category is None and category_slug:
+        category = get_object_or_404(Category, slug=category_slug)
+    if category is not None:
+        products = products.filter(category=category)
+
+    min_price = _price(params.get('min_price'))
+    max_price = _price(params.get('max_price'))
+    if min_price is not None:
+        products = products.filter(price__gte=min_price)
+    if max_price is not None:
+        products = products.filter(price__lte=max_price)
+
+    search_query = (params.get('q') or '').strip()
+    if search_query:
+        products = products.filter(
+            Q(name__icontains=search_query) |
+            Q(short_description__icontains=search_query) |
+            Q(sku__icontains=search_query)
+        )
+
+    sort = sort_name(params)
+    products = products.order_by(*SORT_ORDERS[sort])
+
+    return products, category, search_query, sort
+
+
+def listing_key(params, category=None):
+    """
+    Normalised filters of a listing, shared by all of its pages: the
+    category, prices as numbers, the trimmed search and a valid sort.
+    """
+    prices = [_price(params.get(name)) for name in ('min_price', 'max_price')]
+    return (
+        category.pk if category is not None else params.get('category') or None,
+        *[price.normalize() if price is not None else None for price in prices],
+        (params.get('q') or '').strip(),
+        sort_name(params),
+    )
+
+
+class ResultIds:
+    """
+    Bounded LRU of ordered result ids per `listing_key`, in this process.
+    Entries belong to one catalogue version; the first lookup under a new
+    version empties the cache. The version only moves in the worker that
+    saved, and stock updates do not move it at all, so entries also expire
+    after `max_age` seconds.
+    """
+
+    def __init__(self, max_entries, max_ids, max_age):
+        self.max_entries = max_entries
+        self.max_ids = max_ids
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._version = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get(self, key, version, compute):
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._size = 0
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.max_age:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self._size -= len(entry[1])
+            self.misses += 1
+        # 8 bytes an id instead of a list's object per id
+        ids = array('q', compute())
+        with self._lock:
+            if version == self._version and key not in self._entries and len(ids) <= self.max_ids:
+                self._entries[key] = (time.monotonic(), ids)
+                self._size += len(ids)
+                while len(self._entries) > self.max_entries or self._size > self.max_ids:
+                    _key, (_stored_at, evicted) = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return ids
+
+
+result_ids = ResultIds(
+    settings.LISTING_IDS_CACHE_ENTRIES, settings.LISTING_IDS_CACHE_MAX_IDS, settings.CATALOG_FRESH_FOR,
+)
+
+
+def matching_ids(params, category=None):
+    """Ordered ids of every product the filters match, cached per `listing_key`, catalogue version and CATALOG_FRESH_FOR"""
+    return result_ids.get(
+        listing_key(params, category), catalog_version(),
+        lambda: filter_products(params, category=category)[0].values_list('pk', flat=True),
+    )
+
+
+def hydrate(ids):
+    """Products for a slice of result ids, with their images, in one query plus the prefetch"""
+    products = Product.objects.prefetch_related('images').in_bulk(list(ids))
+    return [products[pk] for pk in ids if pk in products]
+
+
+def catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Start from the clock so a lost counter never reuses an old version
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY, 0)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def category_list():
+    """Every category with its stats row, per catalogue version, falling back to the last good list"""
+    return stale.fetch('categories', lambda: list(Category.objects.select_related('stats')), catalog_version())
+
+
+def category_by_slug(slug):
+    """One category from `category_list`, without a query of its own"""
+    for category in category_list():
+        if category.slug == slug:
+            return category
+    raise Http404('No such category')
+
+
+def listing_digest(path, params):
+    """Digest of the listing at `path` and its filter parameters"""
+    relevant = sorted((name, params.get(name, '')) for name in FILTER_PARAMS if params.get(name))
+    return hashlib.md5(repr((path, relevant)).encode(), usedforsecurity=False).hexdigest()
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder cuts datetimes to milliseconds, which would skip rows on a keyset boundary
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    """Opaque keyset cursor for the sort values of the last row on a page"""
+    raw = json.dumps(values, cls=CursorEncoder, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _cursor_value(field, value):
+    """`value` as the Python type of `field`, or ValueError"""
+    if isinstance(field, models.BooleanField):
+        if isinstance(value, bool):
+            return value
+    elif isinstance(field, models.DecimalField):
+        if isinstance(value, str):
+            try:
+                number = Decimal(value)
+            except InvalidOperation:
+                raise ValueError('Invalid cursor')
+            if number.is_finite():
+                return number
+    elif isinstance(field, models.DateTimeField):
+        if isinstance(value, str):
+            try:
+                moment = datetime.datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError('Invalid cursor')
+            if moment.tzinfo is not None or not settings.USE_TZ:
+                return moment
+    elif isinstance(field, (models.IntegerField, models.AutoField)):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    elif isinstance(field, models.CharField):
+        if isinstance(value, str):
+            return value
+    raise ValueError('Invalid cursor')
+
+
+def decode_cursor(cursor, ordering, model=Product):
+    """Sort values from `encode_cursor` for `ordering` on `model`; raises ValueError for anything else"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise ValueError('Invalid cursor')
+    names = [field.lstrip('-') for field in ordering]
+    fields = [model._meta.pk if name == 'pk' else model._meta.get_field(name) for name in names]
+    return [_cursor_value(field, value) for field, value in zip(fields, values)]
+
+
+def keyset_after(ordering, values):
+    """Condition for rows that sort strictly after `values` under `ordering`"""
+    condition = Q()
+    for position, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[position]})
+        for previous, value in zip(ordering[:position], values):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+    return condition
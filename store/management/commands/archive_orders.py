@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import archive
+
+
+class Command(BaseCommand):
+    help = 'Move completed and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+                            help='Archive orders unchanged for at least this many days')
+        parser.add_argument('--batch-size', type=int, default=settings.ORDER_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many orders are due')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            due = archive.archivable(options['days']).count()
+            self.stdout.write(f'{due} orders are due for archival')
+            return
+        count = archive.archive_orders(
+            older_than_days=options['days'], batch_size=options['batch_size'],
+            max_batches=options['max_batches'], pause=options['pause'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {count} orders'))
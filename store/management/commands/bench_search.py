@@ -0,0 +1,59 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.search import PrefixIndex
+
+WORDS = [
+    'magnum', 'vector', 'titan', 'brushless', 'motor', 'esc', 'wedge', 'armor', 'lipo', 'battery',
+    'frame', 'servo', 'gearbox', 'spinner', 'drum', 'flipper', 'hammer', 'plate', 'hub', 'shaft',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the typeahead prefix index against a synthetic catalogue (no database needed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=20_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        products = [
+            (pk, f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} X-{rng.randint(100, 9999)}",
+             f"SKU-{pk:07d}", f"product-{pk}", '99.00')
+            for pk in range(1, options['products'] + 1)
+        ]
+        categories = [(pk, word.title(), word) for pk, word in enumerate(WORDS, start=1)]
+
+        index = PrefixIndex()
+        started = time.perf_counter()
+        index.build(products, categories)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        queries = []
+        for _ in range(options['queries']):
+            word = rng.choice(WORDS + [name.split()[-1].lower() for _, name, *_ in rng.sample(products, 1)])
+            queries.append(word[:rng.randint(1, len(word))])
+
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            index.lookup(query)
+            timings.append((time.perf_counter() - started) * 1_000_000)
+        timings.sort()
+
+        started = time.perf_counter()
+        index.update_product(1, 'Renamed Product', 'SKU-0000001', 'product-1', '99.00')
+        update_us = (time.perf_counter() - started) * 1_000_000
+
+        self.stdout.write(f"Catalogue: {options['products']} products, {len(index)} terms, built in {build_ms:.0f} ms")
+        self.stdout.write(f"Single-product update: {update_us:.0f} us")
+        self.stdout.write(
+            f"Lookup over {len(timings)} queries: mean {statistics.fmean(timings):.1f} us, "
+            f"p50 {timings[len(timings) // 2]:.1f} us, p99 {timings[int(len(timings) * 0.99)]:.1f} us, "
+            f"max {timings[-1]:.1f} us"
+        )
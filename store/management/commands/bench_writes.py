@@ -0,0 +1,72 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.writes import Writer
+from store import cart as cart_ops
+from store.management.commands.run_benchmark import summarise
+from store.models import Cart, Product
+
+CART_PREFIX = 'bench-writes-'
+
+
+class Command(BaseCommand):
+    help = 'Compare cart write throughput and latency, direct transactions against the core.writes batching writer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent writers (request threads)')
+        parser.add_argument('--writes', type=int, default=200, help='Cart updates per thread')
+        parser.add_argument('--window', type=float, default=0.002, help='Batching window in seconds')
+        parser.add_argument('--batch-size', type=int, default=64)
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:50])
+        if not product_ids:
+            raise CommandError('No products; run generate_catalog first')
+        writer = Writer(options['window'], options['batch_size'])
+        modes = [
+            ('direct', lambda func, *args: func(*args)),
+            ('coalesced', lambda func, *args: writer.submit(func, *args).result()),
+        ]
+        try:
+            for name, run in modes:
+                result = self.run_mode(run, product_ids, options['threads'], options['writes'])
+                batches = f', {writer.writes / max(writer.batches, 1):.1f} writes per commit' if name == 'coalesced' else ''
+                self.stdout.write(
+                    f"{name:<10} {result['throughput_rps']:>8.0f} writes/s  p50 {result['p50_ms']:>7.2f} ms  "
+                    f"p99 {result['p99_ms']:>7.2f} ms  max {result['max_ms']:>8.2f} ms  "
+                    f"errors {result['errors']}{batches}"
+                )
+        finally:
+            Cart.objects.filter(cart_id__startswith=CART_PREFIX).delete()
+
+    def run_mode(self, run, product_ids, threads, writes):
+        Cart.objects.filter(cart_id__startswith=CART_PREFIX).delete()
+        durations, errors = [], []
+        barrier = threading.Barrier(threads)
+
+        def client(number):
+            cart_id = f'{CART_PREFIX}{number}'
+            try:
+                barrier.wait()
+                for index in range(writes):
+                    product_id = product_ids[(number + index) % len(product_ids)]
+                    started = time.perf_counter()
+                    try:
+                        run(cart_ops.update, cart_id, [('add', product_id, 1)])
+                    except Exception as error:
+                        errors.append(error)
+                        continue
+                    durations.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=client, args=(number,)) for number in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return summarise(durations, len(errors), time.perf_counter() - started)
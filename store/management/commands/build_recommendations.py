@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from store.recommendations import TOP_K, update_bought_together
+
+
+class Command(BaseCommand):
+    help = 'Fold orders placed since the last run into the "frequently bought together" table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Discard existing counts and rebuild from every order')
+        parser.add_argument('--top-k', type=int, default=TOP_K, help='Neighbours kept per product')
+
+    def handle(self, *args, **options):
+        orders, products = update_bought_together(full=options['full'], top_k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {orders} orders, refreshed {products} products'))
@@ -0,0 +1,31 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import export
+
+
+class Command(BaseCommand):
+    help = 'Render the homepage, listings and product pages to STATIC_EXPORT_ROOT, re-rendering only changed pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.STATIC_EXPORT_ROOT, help='Directory to export into')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Rendering processes')
+        parser.add_argument('--force', action='store_true', help='Re-render every page')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = export.export_site(
+            options['output'], workers=options['workers'], force=options['force'], dry_run=options['dry_run'],
+        )
+        for path, error in result['failed'].items():
+            self.stderr.write(f'{path}: {error}')
+        verb = 'Would render' if options['dry_run'] else 'Rendered'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(result['rendered'])} pages, {result['unchanged']} unchanged, "
+            f"{len(result['removed'])} removed, {len(result['failed'])} failed "
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
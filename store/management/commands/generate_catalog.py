@@ -0,0 +1,181 @@
+import itertools
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from store import descriptions, order_search, stats
+from store.models import Category, DescriptionSection, Order, OrderItem, Product, ProductImage, Review
+
+PREFIX = 'bench'
+
+WORDS = [
+    'magnum', 'vector', 'titan', 'brushless', 'motor', 'esc', 'wedge', 'armor', 'lipo', 'battery',
+    'frame', 'servo', 'gearbox', 'spinner', 'drum', 'flipper', 'hammer', 'plate', 'hub', 'shaft',
+]
+AUTHORS = ['Alex', 'Sam', 'Jordan', 'Robin', 'Kai', 'Morgan', 'Casey', 'Riley']
+REVIEW_TEXT = [
+    'Survived three tournaments without a scratch.', 'Runs hot under full load.',
+    'Exactly as described, quick shipping.', 'Good value for the price.', 'Mounting holes did not line up.',
+]
+ORDER_STATUSES = ['New', 'Accepted', 'Completed', 'Completed', 'Completed', 'Cancelled']
+
+
+def _batches(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+class Command(BaseCommand):
+    help = 'Bulk-insert a reproducible synthetic catalogue (products, images, reviews, orders) for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--images', type=int, default=500_000, help='Image rows, spread over the products')
+        parser.add_argument('--reviews', type=int, default=1_000_000, help='Reviews, spread over the products')
+        parser.add_argument('--sections', type=int, default=2, help='Description sections per product')
+        parser.add_argument('--orders', type=int, default=200_000)
+        parser.add_argument('--days', type=int, default=365, help='Orders are spread over this many past days')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated rows first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        if options['clear']:
+            self.clear()
+        elif Product.objects.filter(slug__startswith=f'{PREFIX}-').exists():
+            self.stderr.write('Generated rows already exist; pass --clear to replace them.')
+            return
+
+        categories = self.create_categories(options['categories'])
+        product_ids = self.create_products(categories, options['products'])
+        self.spread(ProductImage, product_ids, options['images'], self.image)
+        self.spread(Review, product_ids, options['reviews'], self.review)
+        self.spread(DescriptionSection, product_ids, len(product_ids) * options['sections'], self.section)
+        self.create_orders(product_ids, options['orders'], options['days'])
+        stats.rebuild_all()
+        descriptions.rebuild_all()
+
+        self.stdout.write(self.style.SUCCESS(f'Catalogue generated in {time.perf_counter() - started:.1f} s'))
+        self.stdout.write(
+            'Bulk inserts skip signals: run rebuild_similarity and build_recommendations --full '
+            'to populate recommendations for the new rows.'
+        )
+
+    def clear(self):
+        with transaction.atomic():
+            Order.objects.filter(full_name__startswith='Bench ').delete()
+            Product.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+            Category.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+        self.stdout.write('Removed previously generated rows')
+
+    def create_categories(self, count):
+        Category.objects.bulk_create([
+            Category(name=f'Bench {WORDS[i % len(WORDS)].title()} {i}', slug=f'{PREFIX}-category-{i}', icon='cpu')
+            for i in range(count)
+        ])
+        return list(Category.objects.filter(slug__startswith=f'{PREFIX}-category-'))
+
+    def create_products(self, categories, count):
+        rng = self.rng
+        for start, size in _batches(count, self.batch_size):
+            products = []
+            for n in range(start, start + size):
+                price = Decimal(rng.randint(500, 50_000)) / 100
+                discounted = rng.random() < 0.2
+                products.append(Product(
+                    name=f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} X-{n}',
+                    slug=f'{PREFIX}-{n}',
+                    sku=f'BENCH-{n:07d}',
+                    category=rng.choice(categories),
+                    price=price,
+                    original_price=(price * Decimal('1.25')).quantize(Decimal('0.01')) if discounted else None,
+                    short_description=f'Synthetic benchmark part number {n}.',
+                    specs={
+                        'weight': f'{rng.randint(20, 2000)}g',
+                        'voltage': f'{rng.choice([2, 3, 4, 6, 8, 12])}S',
+                        'kv': str(rng.randint(200, 4000)),
+                    },
+                    is_featured=rng.random() < 0.02,
+                    is_new=rng.random() < 0.05,
+                    is_bestseller=rng.random() < 0.03,
+                    stock=rng.randint(0, 200) if rng.random() < 0.5 else None,
+                ))
+            Product.objects.bulk_create(products)
+            self.progress('products', start + size, count)
+        return list(Product.objects.filter(slug__startswith=f'{PREFIX}-').order_by('pk').values_list('pk', flat=True))
+
+    def image(self, product_id, position):
+        return ProductImage(
+            product_id=product_id, image=f'products/{PREFIX}-{position % 8}.png',
+            alt_text=f'View {position}', is_primary=position == 0, order=position,
+        )
+
+    def review(self, product_id, position):
+        return Review(
+            product_id=product_id, author=self.rng.choice(AUTHORS),
+            rating=self.rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 2, 4, 6])[0],
+            content=self.rng.choice(REVIEW_TEXT),
+        )
+
+    def section(self, product_id, position):
+        return DescriptionSection(
+            product_id=product_id, title=f'Section {position + 1}', slug=f'section-{position + 1}',
+            content=f'<p>Synthetic description block {position + 1}.</p>', order=position,
+        )
+
+    def spread(self, model, product_ids, total, build):
+        """Distribute `total` rows round-robin over the products"""
+        if not product_ids:
+            return
+        name = model._meta.verbose_name_plural
+        for start, size in _batches(total, self.batch_size):
+            model.objects.bulk_create([
+                build(product_ids[n % len(product_ids)], n // len(product_ids))
+                for n in range(start, start + size)
+            ])
+            self.progress(name, start + size, total)
+
+    def create_orders(self, product_ids, count, days):
+        if not product_ids:
+            return
+        rng = self.rng
+        prices = dict(Product.objects.filter(slug__startswith=f'{PREFIX}-').values_list('pk', 'price'))
+        # Popularity follows a long tail so co-purchase data has some structure
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(product_ids))))
+        now = timezone.now()
+        for start, size in _batches(count, self.batch_size):
+            orders = Order.objects.bulk_create([
+                Order(
+                    full_name=f'Bench Customer {n}', phone_number=f'+1 555 {n % 10000:04d}',
+                    phone_key=order_search.phone_key(f'+1 555 {n % 10000:04d}'),
+                    address=f'{n} Arena Way', status=rng.choice(ORDER_STATUSES),
+                )
+                for n in range(start, start + size)
+            ])
+            items = []
+            for order in orders:
+                for product_id in set(rng.choices(product_ids, cum_weights=cum_weights, k=rng.randint(1, 4))):
+                    items.append(OrderItem(
+                        order=order, product_id=product_id, price=prices[product_id], quantity=rng.randint(1, 3),
+                    ))
+            OrderItem.objects.bulk_create(items)
+            # bulk_create skips Order.save and its signals
+            order_search.index_orders(orders, replace=False)
+            # created_at is auto_now_add, so backdate each batch afterwards
+            placed = now - timedelta(days=days * (count - start) / max(count, 1))
+            Order.objects.filter(pk__range=(orders[0].pk, orders[-1].pk)).update(created_at=placed, updated_at=placed)
+            self.progress('orders', start + size, count)
+
+    def progress(self, name, done, total):
+        if done == total or done % (self.batch_size * 10) == 0:
+            self.stdout.write(f'  {name}: {done}/{total}')
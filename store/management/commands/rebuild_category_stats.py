@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-category product counts and price bounds from the product table'
+
+    def handle(self, *args, **options):
+        count = stats.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {count} categories'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store import descriptions
+
+
+class Command(BaseCommand):
+    help = 'Re-render the stored description HTML of every product from its description sections'
+
+    def handle(self, *args, **options):
+        count = descriptions.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'Rendered descriptions for {count} products'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import similarity
+
+
+class Command(BaseCommand):
+    help = 'Recompute the "similar products" spec-similarity index for every category'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=similarity.TOP_K, help='Neighbours kept per product')
+
+    def handle(self, *args, **options):
+        if not similarity.is_available():
+            raise CommandError('NumPy is required to build the similarity index (pip install numpy)')
+        count = similarity.rebuild_all(top_k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products'))
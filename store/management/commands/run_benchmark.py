@@ -0,0 +1,295 @@
+import itertools
+import json
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from store.models import Category, Order, Product, ProductImage, Review
+
+XHR = {'X-Requested-With': 'XMLHttpRequest'}
+SAMPLE_SIZE = 500
+
+
+def route_table(sample):
+    """Route name -> function(rng) returning (path, query params, extra headers[, JSON body to POST])"""
+    def product(rng):
+        return rng.choice(sample['products'])
+
+    def category(rng):
+        return rng.choice(sample['categories'])
+
+    return {
+        'home': lambda rng: (reverse('home'), {}, {}),
+        'shop': lambda rng: (reverse('shop'), {'page': rng.randint(1, 20)}, {}),
+        'shop_category': lambda rng: (reverse('shop'), {'category': category(rng)}, {}),
+        'shop_search': lambda rng: (reverse('shop'), {'q': rng.choice(sample['words'])}, {}),
+        'shop_sorted': lambda rng: (reverse('shop'), {'sort': rng.choice(['price_low', 'price_high', 'newest'])}, {}),
+        'category': lambda rng: (reverse('category', args=[category(rng)]), {}, {}),
+        'product_detail': lambda rng: (reverse('product_detail', args=[product(rng)[1]]), {}, {}),
+        'search_suggest': lambda rng: (reverse('search_suggest'), {'q': rng.choice(sample['words'])[:3]}, {}),
+        # What the product cards send, batched or not
+        'add_cart': lambda rng: (reverse('cart_update'), {}, XHR, {
+            'operations': [{'op': 'add', 'product': product(rng)[0], 'quantity': 1}],
+        }),
+        'cart': lambda rng: (reverse('cart'), {}, {}),
+        'checkout': lambda rng: (reverse('checkout'), {}, {}),
+        'api_categories': lambda rng: (reverse('api_categories'), {}, {}),
+        'api_products': lambda rng: (reverse('api_products'), {'category': category(rng), 'limit': 20}, {}),
+        'api_product_detail': lambda rng: (reverse('api_product_detail', args=[product(rng)[1]]), {}, {}),
+    }
+
+
+def client_addresses():
+    """A fresh client address per request, so the per-IP rate limit does not throttle the benchmark"""
+    counter = itertools.count(1)
+    lock = threading.Lock()
+
+    def next_address():
+        with lock:
+            n = next(counter)
+        return f'10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}'
+    return next_address
+
+
+class InProcessTransport:
+    """Requests go straight through the Django handler via the test client"""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def request(self, path, params, headers, address, body=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client()
+        if body is not None:
+            response = client.post(
+                path, json.dumps(body), content_type='application/json', headers=headers, REMOTE_ADDR=address,
+            )
+        else:
+            response = client.get(path, params, headers=headers, REMOTE_ADDR=address)
+        return response.status_code
+
+    def close(self):
+        connection.close()
+
+
+class HTTPTransport:
+    """Requests go to a running server, e.g. gunicorn config.wsgi"""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _csrf_token(self, opener, jar, address):
+        # Any page sets the CSRF cookie; POSTs echo it back in X-CSRFToken
+        for cookie in jar:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        request = urllib.request.Request(self.base_url + '/', headers={'X-Forwarded-For': address})
+        with opener.open(request, timeout=self.timeout) as response:
+            response.read()
+        return next((cookie.value for cookie in jar if cookie.name == 'csrftoken'), '')
+
+    def request(self, path, params, headers, address, body=None):
+        opener = getattr(self.local, 'opener', None)
+        if opener is None:
+            self.local.jar = CookieJar()
+            opener = self.local.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.local.jar))
+        query = '?' + urllib.parse.urlencode(params) if params else ''
+        headers = {**headers, 'X-Forwarded-For': address}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+            headers['X-CSRFToken'] = self._csrf_token(opener, self.local.jar, address)
+        request = urllib.request.Request(self.base_url + path + query, data=data, headers=headers)
+        try:
+            with opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+    def close(self):
+        pass
+
+
+def summarise(durations, errors, wall):
+    durations = sorted(durations)
+    count = len(durations)
+    if not count:
+        return {'requests': 0, 'errors': errors}
+
+    def at(fraction):
+        return round(durations[min(int(count * fraction), count - 1)], 2)
+
+    return {
+        'requests': count,
+        'errors': errors,
+        'throughput_rps': round(count / wall, 1) if wall else None,
+        'mean_ms': round(statistics.fmean(durations), 2),
+        'p50_ms': at(0.50),
+        'p95_ms': at(0.95),
+        'p99_ms': at(0.99),
+        'max_ms': round(durations[-1], 2),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Drive the store routes with concurrent workers and write per-route throughput and latency to JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per route')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per route beforehand')
+        parser.add_argument('--routes', help='Comma-separated subset of routes')
+        parser.add_argument('--url', help='Benchmark a running server at this base URL instead of in-process')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout with --url')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', help='Earlier benchmark JSON to print deltas against')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        sample = self.sample_catalog(random.Random(options['seed']))
+        routes = route_table(sample)
+        if options['routes']:
+            wanted = [name.strip() for name in options['routes'].split(',') if name.strip()]
+            unknown = sorted(set(wanted) - set(routes))
+            if unknown:
+                raise CommandError(f"Unknown routes: {', '.join(unknown)}. Available: {', '.join(routes)}")
+            routes = {name: routes[name] for name in wanted}
+
+        if options['url']:
+            transport = HTTPTransport(options['url'], options['timeout'])
+        else:
+            transport = InProcessTransport()
+        address = client_addresses()
+        concurrency = max(options['concurrency'], 1)
+
+        results = {}
+        for name, build in routes.items():
+            results[name] = self.run_route(
+                transport, build, address, options['requests'], options['warmup'], concurrency,
+                random.Random(f"{options['seed']}:{name}"),
+            )
+            self.stdout.write(self.format_row(name, results[name]))
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'git_commit': _git_commit(),
+            'mode': 'http' if options['url'] else 'in-process',
+            'base_url': options['url'],
+            'concurrency': concurrency,
+            'requests_per_route': options['requests'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'catalog': {
+                'categories': Category.objects.count(),
+                'products': Product.objects.count(),
+                'images': ProductImage.objects.count(),
+                'reviews': Review.objects.count(),
+                'orders': Order.objects.count(),
+            },
+            'routes': results,
+        }
+        with open(options['output'], 'w') as handle:
+            json.dump(report, handle, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def sample_catalog(self, rng):
+        ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        if not ids:
+            raise CommandError('The catalogue is empty; run generate_catalog first.')
+        chosen = sorted(rng.sample(ids, min(SAMPLE_SIZE, len(ids))))
+        products = list(Product.objects.filter(pk__in=chosen).values_list('pk', 'slug', 'name'))
+        words = sorted({word.lower() for _, _, name in products for word in name.split() if len(word) > 2})
+        return {
+            'products': [(pk, slug) for pk, slug, _ in products],
+            'categories': list(Category.objects.values_list('slug', flat=True)),
+            'words': words or ['motor'],
+        }
+
+    def run_route(self, transport, build, address, total, warmup, concurrency, rng):
+        plan = [build(rng) for _ in range(warmup + total)]
+        durations = []
+        errors = 0
+        lock = threading.Lock()
+
+        def send(call):
+            path, params, headers, *body = call
+            started = time.perf_counter()
+            try:
+                status = transport.request(path, params, headers, address(), *body)
+            except Exception:
+                status = None
+            return (time.perf_counter() - started) * 1000, status
+
+        def worker(calls):
+            nonlocal errors
+            try:
+                for call in calls:
+                    elapsed, status = send(call)
+                    with lock:
+                        durations.append(elapsed)
+                        if status is None or status >= 400:
+                            errors += 1
+            finally:
+                transport.close()
+
+        for call in plan[:warmup]:
+            send(call)
+        timed = plan[warmup:]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, [timed[i::concurrency] for i in range(concurrency)]))
+        return summarise(durations, errors, time.perf_counter() - started)
+
+    def format_row(self, name, result):
+        if not result['requests']:
+            return f'{name:<20} no requests'
+        return (
+            f"{name:<20} {result['throughput_rps']:>8.1f} req/s  p50 {result['p50_ms']:>7.1f}  "
+            f"p95 {result['p95_ms']:>7.1f}  p99 {result['p99_ms']:>7.1f} ms  errors {result['errors']}"
+        )
+
+    def compare(self, path, results):
+        with open(path) as handle:
+            baseline = json.load(handle).get('routes', {})
+        self.stdout.write(f"\nAgainst {path} (negative latency / positive throughput is better):")
+        for name, result in results.items():
+            before = baseline.get(name)
+            if not before or not before.get('requests') or not result['requests']:
+                continue
+            deltas = []
+            for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+                if before[key]:
+                    deltas.append(f'{key} {(result[key] - before[key]) / before[key] * 100:+.1f}%')
+            self.stdout.write(f"{name:<20} {'  '.join(deltas)}")
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_copurchase_productneighbours_recommendationrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productneighbours',
+            name='scores',
+            field=models.JSONField(blank=True, default=list, help_text='Score per neighbour: shared orders, or spec distance'),
+        ),
+        migrations.AlterField(
+            model_name='productneighbours',
+            name='kind',
+            field=models.CharField(choices=[('bought_together', 'Frequently Bought Together'), ('similar_specs', 'Similar Specifications')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_productneighbours_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, help_text='Units on hand. Leave empty to sell without tracking stock.', null=True),
+        ),
+    ]
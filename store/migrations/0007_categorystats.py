@@ -0,0 +1,54 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q, Sum
+
+
+def build_stats(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    CategoryStats = apps.get_model('store', 'CategoryStats')
+    Product = apps.get_model('store', 'Product')
+    rows = {
+        row['category_id']: row
+        for row in Product.objects.values('category_id').order_by().annotate(
+            product_count=Count('pk'),
+            in_stock_count=Count('pk', filter=Q(stock_status='in_stock')),
+            price_total=Sum('price'),
+            min_price=Min('price'),
+            max_price=Max('price'),
+        )
+    }
+    empty = {'product_count': 0, 'in_stock_count': 0, 'price_total': 0, 'min_price': None, 'max_price': None}
+    stats = []
+    for category_id in Category.objects.values_list('pk', flat=True):
+        row = {**empty, **rows.get(category_id, {})}
+        row.pop('category_id', None)
+        stats.append(CategoryStats(category_id=category_id, **{**row, 'price_total': row['price_total'] or 0}))
+    CategoryStats.objects.bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_product_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='store.category')),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('in_stock_count', models.PositiveIntegerField(default=0)),
+                ('price_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Category stats',
+            },
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,167 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:15
+
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.db import migrations, models
+from django.template import Context, Engine
+from django.utils.text import slugify
+
+# A frozen copy of store.descriptions and templates/product_description.html as of this migration,
+# so later changes to either cannot change what it does
+
+ALLOWED_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'code', 'div', 'em', 'h3', 'h4', 'h5', 'hr', 'i', 'img', 'li', 'ol', 'p', 'pre',
+    'span', 'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'th', 'thead', 'tr', 'u', 'ul',
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'svg', 'math'}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan'},
+}
+GLOBAL_ATTRIBUTES = {'class'}
+URL_ATTRIBUTES = {'href', 'src'}
+SAFE_SCHEMES = {'', 'http', 'https', 'mailto'}
+
+TEMPLATE = """<div class="desc-layout">
+    <aside class="desc-sidebar">
+        <h4 class="sidebar-title">Contents</h4>
+        <nav class="desc-nav">
+            {% for section in sections %}
+            <a href="#desc-{{ section.anchor }}" class="desc-nav-link {% if forloop.first %}active{% endif %}">{{ section.title }}</a>
+            {% endfor %}
+        </nav>
+    </aside>
+    
+    <div class="desc-body">
+        {% for section in sections %}
+        <section id="desc-{{ section.anchor }}" class="desc-section">
+            <h3>{{ section.title }}</h3>
+            {{ section.html|safe }}
+            {% if section.image_url %}
+            <img src="{{ section.image_url }}" alt="{{ section.title }}">
+            {% endif %}
+        </section>
+        {% endfor %}
+    </div>
+</div>
+"""
+
+
+def _safe_url(value):
+    cleaned = re.sub(r'[\x00-\x20]', '', value)
+    try:
+        return urlsplit(cleaned).scheme.lower() in SAFE_SCHEMES
+    except ValueError:
+        return False
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def _attributes(self, tag, attrs):
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set()) | GLOBAL_ATTRIBUTES
+        kept = []
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES and not _safe_url(value):
+                continue
+            kept.append(f' {name}="{escape(value)}"')
+        return ''.join(kept)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+        self.parts.append(f'<{tag}{self._attributes(tag, attrs)}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and tag in self.open_tags:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping or tag not in self.open_tags:
+            return
+        while self.open_tags:
+            current = self.open_tags.pop()
+            self.parts.append(f'</{current}>')
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.parts.append(escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        return ''.join(self.parts) + ''.join(f'</{tag}>' for tag in reversed(self.open_tags))
+
+
+def sanitize(html):
+    parser = _Sanitizer()
+    parser.feed(html or '')
+    return parser.result()
+
+
+def render_sections(sections):
+    entries = []
+    anchors = set()
+    for section in sections:
+        anchor = base = slugify(section.slug or section.title) or 'section'
+        suffix = 2
+        while anchor in anchors:
+            anchor = f'{base}-{suffix}'
+            suffix += 1
+        anchors.add(anchor)
+        entries.append({
+            'title': section.title,
+            'anchor': anchor,
+            'html': sanitize(section.content),
+            'image_url': section.image.url if section.image else None,
+        })
+    if not entries:
+        return ''
+    return Engine().from_string(TEMPLATE).render(Context({'sections': entries})).strip()
+
+
+def render_descriptions(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    DescriptionSection = apps.get_model('store', 'DescriptionSection')
+    product_ids = DescriptionSection.objects.values_list('product_id', flat=True).distinct()
+    for product_id in product_ids:
+        sections = DescriptionSection.objects.filter(product_id=product_id).order_by('order', 'pk')
+        Product.objects.filter(pk=product_id).update(description_html=render_sections(sections))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_review_product_recent_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False, help_text='Rendered description sections (see store.descriptions)'),
+        ),
+        migrations.RunPython(render_descriptions, migrations.RunPython.noop),
+    ]
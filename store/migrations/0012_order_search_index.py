@@ -0,0 +1,77 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:51
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copies of store.order_search.phone_key and tokens as of this migration
+
+
+def phone_key(phone_number):
+    return ''.join(re.findall(r'\d', phone_number or '', re.ASCII))[::-1]
+
+
+def tokens(*texts):
+    words = set()
+    for text in texts:
+        folded = unicodedata.normalize('NFKD', (text or '').casefold())
+        folded = ''.join(char for char in folded if not unicodedata.combining(char))
+        words.update(word[:40] for word in re.findall(r'\w+', folded))
+    return words
+
+
+def index_orders(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderSearchToken = apps.get_model('store', 'OrderSearchToken')
+    last_pk = 0
+    while True:
+        batch = list(Order.objects.filter(pk__gt=last_pk).order_by('pk').only('phone_number', 'full_name', 'address')[:2000])
+        if not batch:
+            break
+        for order in batch:
+            order.phone_key = phone_key(order.phone_number)
+        Order.objects.bulk_update(batch, ['phone_key'])
+        OrderSearchToken.objects.bulk_create([
+            OrderSearchToken(order=order, token=token)
+            for order in batch for token in sorted(tokens(order.full_name, order.address))
+        ])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_archivedorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=40)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='phone_key',
+            field=models.CharField(blank=True, editable=False, help_text='Digits of the phone number, reversed (see store.order_search)', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='ordersearchtoken',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='store.order'),
+        ),
+        # Fill the index before creating its b-trees
+        migrations.RunPython(index_orders, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['phone_key'], name='order_phone_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordersearchtoken',
+            index=models.Index(fields=['token', 'order'], name='order_search_token_idx'),
+        ),
+    ]
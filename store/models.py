@@ -1,5 +1,9 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Case, When
 from django.urls import reverse
+from django.utils.functional import cached_property
 
 
 class Category(models.Model):
@@ -20,6 +24,29 @@ class Category(models.Model):
         return reverse('category', kwargs={'category_slug': self.slug})
 
 
+class ProductQuerySet(models.QuerySet):
+    def in_id_order(self, ids):
+        """Restrict to the given ids, keeping their order"""
+        if not ids:
+            return self.none()
+        ordering = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)])
+        return self.filter(pk__in=ids).order_by(ordering)
+
+    def bought_together_with(self, product, limit=None):
+        """Products most often ordered together with `product`"""
+        ids = ProductNeighbours.objects.filter(
+            product=product, kind=ProductNeighbours.BOUGHT_TOGETHER
+        ).values_list('neighbour_ids', flat=True).first() or []
+        return self.in_id_order(ids[:limit])
+
+    def similar_to(self, product, limit=None):
+        """Products in the same category with the closest numeric specs"""
+        ids = ProductNeighbours.objects.filter(
+            product=product, kind=ProductNeighbours.SIMILAR_SPECS
+        ).values_list('neighbour_ids', flat=True).first() or []
+        return self.in_id_order(ids[:limit])
+
+
 class Product(models.Model):
     """Main product model"""
     STOCK_STATUS_CHOICES = [
@@ -39,15 +66,19 @@ class Product(models.Model):
     
     short_description = models.TextField()
     specs = models.JSONField(default=dict, blank=True, help_text="Technical specifications as JSON")
+    description_html = models.TextField(blank=True, editable=False, help_text="Rendered description sections (see store.descriptions)")
     
     is_featured = models.BooleanField(default=False)
     is_new = models.BooleanField(default=False)
     is_bestseller = models.BooleanField(default=False)
     
     stock_status = models.CharField(max_length=20, choices=STOCK_STATUS_CHOICES, default='in_stock')
+    stock = models.PositiveIntegerField(null=True, blank=True, help_text="Units on hand. Leave empty to sell without tracking stock.")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
     
@@ -57,6 +88,12 @@ class Product(models.Model):
     def get_absolute_url(self):
         return reverse('product_detail', kwargs={'slug': self.slug})
     
+    def save(self, *args, **kwargs):
+        # Tracked stock drives the label; pre-order and discontinued are set by hand
+        if self.stock is not None and self.stock_status in ('in_stock', 'out_of_stock'):
+            self.stock_status = 'in_stock' if self.stock > 0 else 'out_of_stock'
+        return super().save(*args, **kwargs)
+    
     @property
     def has_discount(self):
         return self.original_price and self.original_price > self.price
@@ -67,9 +104,10 @@ class Product(models.Model):
             return int(((self.original_price - self.price) / self.original_price) * 100)
         return 0
     
-    @property
+    @cached_property
     def primary_image(self):
-        return self.images.filter(is_primary=True).first()
+        # Iterating images.all() reuses prefetch_related('images') when the view did it
+        return next((image for image in self.images.all() if image.is_primary), None)
     
     @property
     def rating_average(self):
@@ -126,6 +164,10 @@ class Review(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of one product's reviews, newest first
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_recent_idx'),
+        ]
     
     def __str__(self):
         return f"{self.author} - {self.product.name} ({self.rating}★)"
@@ -147,6 +189,12 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField()
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            # One line per product, so cart updates can upsert (see store.cart)
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
     def sub_total(self):
         return self.product.price * self.quantity
 
@@ -165,6 +213,7 @@ class Order(models.Model):
 
     full_name = models.CharField(max_length=100, default="")
     phone_number = models.CharField(max_length=20, default="")
+    phone_key = models.CharField(max_length=20, blank=True, editable=False, help_text="Digits of the phone number, reversed (see store.order_search)")
     address = models.CharField(max_length=255, default="")
     location = models.CharField(max_length=255, default="", blank=True) # Optional location details or coordinates
     status = models.CharField(max_length=10, choices=STATUS, default='New')
@@ -175,9 +224,21 @@ class Order(models.Model):
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['phone_key'], name='order_phone_key_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} - {self.full_name}"
+
+    def save(self, *args, **kwargs):
+        from .order_search import phone_key
+
+        self.phone_key = phone_key(self.phone_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone_number' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_key'}
+        super().save(*args, **kwargs)
     
     @property
     def total_price(self):
@@ -197,4 +258,133 @@ class OrderItem(models.Model):
     @property
     def total_price(self):
         return self.price * self.quantity
-    
\ No newline at end of file
+    
+
+class OrderSearchToken(models.Model):
+    """Lower-cased word of an order's name or address, for indexed admin search (see store.order_search)"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=40)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'order'], name='order_search_token_idx'),
+        ]
+
+    def __str__(self):
+        return self.token
+
+
+class ArchivedOrder(models.Model):
+    """Completed or cancelled order moved out of the live tables (see store.archive)"""
+    id = models.BigIntegerField(primary_key=True, help_text="The original order id")
+    full_name = models.CharField(max_length=100)
+    phone_number = models.CharField(max_length=20)
+    address = models.CharField(max_length=255)
+    location = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=Order.STATUS)
+    total = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='archived_order_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order {self.id} - {self.full_name} (archived)"
+
+
+class ArchivedOrderItem(models.Model):
+    """Line of an archived order; keeps the product's name and SKU in case it is deleted later"""
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    product_name = models.CharField(max_length=200)
+    sku = models.CharField(max_length=50)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.product_name} ({self.quantity})"
+
+    @property
+    def total_price(self):
+        return self.price * self.quantity
+
+
+class CoPurchase(models.Model):
+    """How many orders contained both `product` and `related` (stored in both directions)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='unique_copurchase_pair'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.related_id} ({self.count})"
+
+
+class ProductNeighbours(models.Model):
+    """Precomputed top-K related product ids, one row per product and kind"""
+    BOUGHT_TOGETHER = 'bought_together'
+    SIMILAR_SPECS = 'similar_specs'
+    KIND_CHOICES = [
+        (BOUGHT_TOGETHER, 'Frequently Bought Together'),
+        (SIMILAR_SPECS, 'Similar Specifications'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbours')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    neighbour_ids = models.JSONField(default=list, blank=True)
+    scores = models.JSONField(default=list, blank=True, help_text="Score per neighbour: shared orders, or spec distance")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Product neighbours'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'kind'], name='unique_product_neighbours_kind'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} - {self.get_kind_display()}"
+
+
+class CategoryStats(models.Model):
+    """Product counts and price bounds per category, kept current by signals (see store.stats)"""
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    product_count = models.PositiveIntegerField(default=0)
+    in_stock_count = models.PositiveIntegerField(default=0)
+    price_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Category stats'
+
+    def __str__(self):
+        return f"{self.category} ({self.product_count} products)"
+
+    @property
+    def avg_price(self):
+        if not self.product_count:
+            return None
+        return (Decimal(self.price_total) / self.product_count).quantize(Decimal('0.01'))
+
+
+class RecommendationRun(models.Model):
+    """Watermark of the last order folded into the co-purchase table"""
+    last_order_id = models.PositiveBigIntegerField(default=0)
+    orders_processed = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Run up to order {self.last_order_id}"
@@ -0,0 +1,94 @@
+"""
+Indexed order lookup for the admin.
+
+Every order keeps `phone_key`, the digits of its phone number reversed, and
+one `OrderSearchToken` row per lower-cased, accent-stripped word of its
+name and address. Both are maintained on save (Order.save and a post_save
+signal). `search` reads a support search term as:
+
+* an order number (``1234`` or ``#1234``): that order, if it exists;
+* a phone number (digits with spaces, ``+``, ``-``, ``.`` or brackets):
+  orders whose number ends with those digits, so ``555 010 0100`` and
+  ``010-0100`` both find ``+1 (555) 010-0100``;
+* anything else: orders with a name or address word starting with each
+  word of the term.
+
+Each case is a range scan on an index rather than a LIKE scan of the
+orders table. Prefixes are matched with ``>= prefix AND < successor``
+because SQLite only uses an index for LIKE on case-insensitive columns.
+"""
+import re
+import unicodedata
+
+from .models import OrderSearchToken
+
+MIN_PHONE_DIGITS = 4
+MAX_TOKEN_LENGTH = 40
+MAX_ORDER_NUMBER_DIGITS = 18  # fits in a signed 64-bit id
+PHONE_QUERY = re.compile(r'[\d\s+().-]+', re.ASCII)
+ORDER_NUMBER = re.compile(r'#?(\d+)', re.ASCII)
+WORD = re.compile(r'\w+')
+
+
+def phone_key(phone_number):
+    """The digits of `phone_number`, last digit first"""
+    return ''.join(re.findall(r'\d', phone_number or '', re.ASCII))[::-1]
+
+
+def tokens(*texts):
+    """Distinct lower-cased, accent-stripped words of `texts`"""
+    words = set()
+    for text in texts:
+        folded = unicodedata.normalize('NFKD', (text or '').casefold())
+        folded = ''.join(char for char in folded if not unicodedata.combining(char))
+        words.update(word[:MAX_TOKEN_LENGTH] for word in WORD.findall(folded))
+    return words
+
+
+def order_tokens(order):
+    return tokens(order.full_name, order.address)
+
+
+def index_orders(orders, replace=True):
+    """(Re)write the search tokens of `orders`; pass replace=False for orders that have none yet"""
+    orders = list(orders)
+    if replace:
+        OrderSearchToken.objects.filter(order__in=orders).delete()
+    OrderSearchToken.objects.bulk_create([
+        OrderSearchToken(order=order, token=token) for order in orders for token in sorted(order_tokens(order))
+    ])
+
+
+def _successor(prefix):
+    """The smallest string greater than every string starting with `prefix`"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _starting_with(field, prefix):
+    return {f'{field}__gte': prefix, f'{field}__lt': _successor(prefix)}
+
+
+def search(orders, term):
+    """Narrow the `orders` queryset to those matching a support search `term`"""
+    term = term.strip()
+    if not term:
+        return orders
+
+    number = ORDER_NUMBER.fullmatch(term)
+    if number and len(number[1]) <= MAX_ORDER_NUMBER_DIGITS:
+        match = orders.filter(pk=int(number[1]))
+        if match.exists():
+            return match
+
+    if PHONE_QUERY.fullmatch(term):
+        key = phone_key(term)
+        if len(key) >= MIN_PHONE_DIGITS:
+            return orders.filter(**_starting_with('phone_key', key))
+        # Too few digits to narrow millions of numbers down; try them as words
+    words = tokens(term)
+    if not words:
+        return orders.none()
+    for word in sorted(words):
+        matching = OrderSearchToken.objects.filter(**_starting_with('token', word)).values('order_id')
+        orders = orders.filter(pk__in=matching)
+    return orders
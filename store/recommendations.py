@@ -0,0 +1,126 @@
+"""
+"Frequently bought together" recommendations.
+
+Pair counts are accumulated in `CoPurchase` from `OrderItem` co-occurrence
+(archived orders included), and the top-K neighbours of every product are
+stored as a single `ProductNeighbours` row so the product page needs one
+indexed lookup.
+Each run only folds in orders created since the previous run.
+"""
+import heapq
+from collections import Counter, defaultdict
+from itertools import groupby, permutations
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import ArchivedOrder, ArchivedOrderItem, CoPurchase, Order, OrderItem, ProductNeighbours, RecommendationRun
+
+TOP_K = 10
+BATCH_SIZE = 500
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _count_pairs(last_order_id, max_order_id):
+    """Count product pairs bought in the same order within the id window"""
+    pair_counts = Counter()
+    orders = 0
+    live = (
+        OrderItem.objects
+        .filter(order_id__gt=last_order_id, order_id__lte=max_order_id)
+        .exclude(order__status='Cancelled')
+        .order_by('order_id')
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=2000)
+    )
+    # Archived orders keep their ids, so both tables merge into one id-ordered stream
+    archived = (
+        ArchivedOrderItem.objects
+        .filter(order_id__gt=last_order_id, order_id__lte=max_order_id, product__isnull=False)
+        .exclude(order__status='Cancelled')
+        .order_by('order_id')
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=2000)
+    )
+    rows = heapq.merge(live, archived, key=lambda row: row[0])
+    for _order_id, items in groupby(rows, key=lambda row: row[0]):
+        orders += 1
+        product_ids = {product_id for _, product_id in items}
+        for pair in permutations(product_ids, 2):
+            pair_counts[pair] += 1
+    return pair_counts, orders
+
+
+def _top_k(related_counts, top_k):
+    # Highest count first; older (lower id) products win ties for stable output.
+    return heapq.nlargest(top_k, related_counts.items(), key=lambda item: (item[1], -item[0]))
+
+
+def update_bought_together(full=False, top_k=TOP_K):
+    """
+    Fold new orders into the co-purchase table and refresh the neighbour
+    lists of every product they touched. Returns (orders, products) processed.
+    """
+    with transaction.atomic():
+        if full:
+            CoPurchase.objects.all().delete()
+            ProductNeighbours.objects.filter(kind=ProductNeighbours.BOUGHT_TOGETHER).delete()
+            last_order_id = 0
+        else:
+            last_run = RecommendationRun.objects.order_by('-pk').first()
+            last_order_id = last_run.last_order_id if last_run else 0
+
+        max_order_id = max(
+            Order.objects.aggregate(max_id=Max('id'))['max_id'] or 0,
+            ArchivedOrder.objects.aggregate(max_id=Max('id'))['max_id'] or 0,
+        )
+        if max_order_id <= last_order_id:
+            return 0, 0
+
+        pair_counts, orders = _count_pairs(last_order_id, max_order_id)
+        touched = sorted({product_id for product_id, _ in pair_counts})
+
+        for product_ids in _chunks(touched, BATCH_SIZE):
+            related_counts = defaultdict(dict)
+            to_update = []
+            for row in CoPurchase.objects.filter(product_id__in=product_ids):
+                added = pair_counts.pop((row.product_id, row.related_id), 0)
+                if added:
+                    row.count += added
+                    to_update.append(row)
+                related_counts[row.product_id][row.related_id] = row.count
+
+            chunk = set(product_ids)
+            to_create = []
+            for (product_id, related_id), count in list(pair_counts.items()):
+                if product_id in chunk:
+                    del pair_counts[(product_id, related_id)]
+                    to_create.append(CoPurchase(product_id=product_id, related_id=related_id, count=count))
+                    related_counts[product_id][related_id] = count
+
+            CoPurchase.objects.bulk_update(to_update, ['count'], batch_size=BATCH_SIZE)
+            CoPurchase.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+            neighbours = []
+            for product_id in product_ids:
+                best = _top_k(related_counts[product_id], top_k)
+                neighbours.append(ProductNeighbours(
+                    product_id=product_id,
+                    kind=ProductNeighbours.BOUGHT_TOGETHER,
+                    neighbour_ids=[related_id for related_id, _ in best],
+                    scores=[count for _, count in best],
+                ))
+            ProductNeighbours.objects.bulk_create(
+                neighbours,
+                update_conflicts=True,
+                unique_fields=['product', 'kind'],
+                update_fields=['neighbour_ids', 'scores', 'updated_at'],
+                batch_size=BATCH_SIZE,
+            )
+
+        RecommendationRun.objects.create(last_order_id=max_order_id, orders_processed=orders)
+    return orders, len(touched)
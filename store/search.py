@@ -0,0 +1,216 @@
+"""
+In-memory prefix index for search-as-you-type.
+
+Every product name, name word and SKU, and every category name and name
+word, becomes a `(term, kind, id)` tuple in one sorted list, so a lookup
+is a `bisect` to the first term >= the query plus a short forward scan.
+The index is built once per worker and patched in place by signals when
+a transaction that changed products or categories commits; other workers
+pick up changes through a periodic check of the product count, the
+latest `Product.updated_at` and the category rows.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+
+from django.db import DatabaseError
+from django.db.models import Count, Max
+from django.urls import reverse
+
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+# Kinds sort categories ahead of products for the same term.
+CATEGORY = 0
+PRODUCT = 1
+
+MAX_RESULTS = 8
+MAX_SCAN = 200
+REFRESH_INTERVAL = 60  # seconds between cross-worker staleness checks
+
+_WORD_RE = re.compile(r'[\w.+-]+')
+
+
+def normalize(text):
+    return ' '.join(str(text).lower().split())
+
+
+def terms_for(*values):
+    """The full normalised value and each of its words"""
+    terms = set()
+    for value in values:
+        value = normalize(value)
+        if value:
+            terms.add(value)
+            terms.update(_WORD_RE.findall(value))
+    return terms
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._entries = []
+        self._terms = {}
+        self._payloads = {}
+        self._lock = threading.RLock()
+        self.built = False
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    def build(self, products, categories):
+        """
+        Replace the index contents. `products` yields
+        (id, name, sku, slug, price) and `categories` yields (id, name, slug).
+        """
+        entries, terms, payloads = [], {}, {}
+        for pk, name, slug in categories:
+            key = (CATEGORY, pk)
+            terms[key] = terms_for(name)
+            payloads[key] = {'type': 'category', 'name': name, 'slug': slug}
+            entries.extend((term, CATEGORY, pk) for term in terms[key])
+        for pk, name, sku, slug, price in products:
+            key = (PRODUCT, pk)
+            terms[key] = terms_for(name) | {normalize(sku)}
+            payloads[key] = {'type': 'product', 'name': name, 'sku': sku, 'slug': slug, 'price': str(price)}
+            entries.extend((term, PRODUCT, pk) for term in terms[key])
+        entries.sort()
+        with self._lock:
+            self._entries, self._terms, self._payloads = entries, terms, payloads
+            self.built = True
+
+    def _remove(self, key):
+        for term in self._terms.pop(key, ()):
+            entry = (term,) + key
+            position = bisect.bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+        self._payloads.pop(key, None)
+
+    def _add(self, key, terms, payload):
+        self._terms[key] = terms
+        self._payloads[key] = payload
+        for term in terms:
+            bisect.insort(self._entries, (term,) + key)
+
+    def update_product(self, pk, name, sku, slug, price):
+        with self._lock:
+            self._remove((PRODUCT, pk))
+            self._add(
+                (PRODUCT, pk),
+                terms_for(name) | {normalize(sku)},
+                {'type': 'product', 'name': name, 'sku': sku, 'slug': slug, 'price': str(price)},
+            )
+
+    def update_category(self, pk, name, slug):
+        with self._lock:
+            self._remove((CATEGORY, pk))
+            self._add((CATEGORY, pk), terms_for(name), {'type': 'category', 'name': name, 'slug': slug})
+
+    def remove_product(self, pk):
+        with self._lock:
+            self._remove((PRODUCT, pk))
+
+    def remove_category(self, pk):
+        with self._lock:
+            self._remove((CATEGORY, pk))
+
+    def lookup(self, query, limit=MAX_RESULTS):
+        """Payloads whose name, name word or SKU starts with `query`"""
+        query = normalize(query)
+        if not query:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            entries = self._entries
+            position = bisect.bisect_left(entries, (query,))
+            end = min(len(entries), position + MAX_SCAN)
+            while position < end and len(results) < limit:
+                term, kind, pk = entries[position]
+                if not term.startswith(query):
+                    break
+                if (kind, pk) not in seen:
+                    seen.add((kind, pk))
+                    results.append(self._payloads[(kind, pk)])
+                position += 1
+        # Categories first, then products; the scan already gives term order.
+        results.sort(key=lambda payload: payload['type'] != 'category')
+        return results
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Database-backed helpers
+
+    def build_from_db(self):
+        started = time.perf_counter()
+        categories = self._categories()
+        self.build(
+            Product.objects.order_by().values_list('pk', 'name', 'sku', 'slug', 'price').iterator(chunk_size=5000),
+            categories,
+        )
+        self._snapshot = self._catalog_snapshot(categories)
+        self._checked_at = time.monotonic()
+        logger.info('Built search index: %d terms in %.0f ms', len(self), (time.perf_counter() - started) * 1000)
+
+    def _categories(self):
+        return list(Category.objects.order_by('pk').values_list('pk', 'name', 'slug'))
+
+    def _catalog_snapshot(self, categories=None):
+        snapshot = Product.objects.aggregate(count=Count('pk'), last_change=Max('updated_at'))
+        # Categories have no timestamp, but there are few of them
+        snapshot['categories'] = self._categories() if categories is None else categories
+        return snapshot
+
+    def product_count(self):
+        with self._lock:
+            return sum(1 for kind, _pk in self._terms if kind == PRODUCT)
+
+    def ensure_built(self):
+        """Build on first use, then periodically catch up with other workers' writes"""
+        try:
+            if not self.built:
+                with self._lock:
+                    if not self.built:
+                        self.build_from_db()
+                return
+            if time.monotonic() - self._checked_at < REFRESH_INTERVAL:
+                return
+            self._checked_at = time.monotonic()
+            snapshot = self._catalog_snapshot()
+            if snapshot == self._snapshot:
+                return
+            previous, self._snapshot = self._snapshot, snapshot
+            if (
+                previous['last_change'] is None
+                or snapshot['count'] < previous['count']
+                or snapshot['categories'] != previous['categories']
+            ):
+                self.build_from_db()
+                return
+            changed = Product.objects.filter(updated_at__gt=previous['last_change'])
+            for row in changed.values_list('pk', 'name', 'sku', 'slug', 'price'):
+                self.update_product(*row)
+            # A delete that a later add hides from the count leaves an extra product behind
+            if self.product_count() != snapshot['count']:
+                self.build_from_db()
+        except DatabaseError:
+            logger.exception('Search index refresh failed')
+
+
+product_index = PrefixIndex()
+
+
+def suggest(query, limit=MAX_RESULTS):
+    """Typeahead results with their URLs"""
+    product_index.ensure_built()
+    results = []
+    for payload in product_index.lookup(query, limit):
+        result = dict(payload)
+        if result['type'] == 'category':
+            result['url'] = reverse('category', kwargs={'category_slug': result.pop('slug')})
+        else:
+            result['url'] = reverse('product_detail', kwargs={'slug': result.pop('slug')})
+        results.append(result)
+    return results
@@ -0,0 +1,124 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Feature
+
+from . import descriptions, order_search, search, similarity, stats
+from .listing import bump_catalog_version
+from .models import Category, DescriptionSection, Order, Product, ProductImage, Review
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    """Keep the stored category, price, stock status and specs so post_save handlers can tell what moved"""
+    instance._previous_category_id = None
+    instance._previous_snapshot = None
+    instance._previous_specs = None
+    if raw or instance.pk is None:
+        return
+    previous = (
+        Product.objects.filter(pk=instance.pk).values_list('category_id', 'price', 'stock_status', 'specs').first()
+    )
+    if previous is not None:
+        instance._previous_category_id = previous[0]
+        instance._previous_snapshot = stats.snapshot(*previous[:3])
+        instance._previous_specs = previous[3]
+
+
+@receiver(post_save, sender=Product)
+def refresh_similar_products(sender, instance, raw=False, **kwargs):
+    if raw or not similarity.is_available():
+        return
+    product_id, previous_category_id, previous_specs = instance.pk, instance._previous_category_id, instance._previous_specs
+    transaction.on_commit(lambda: similarity.refresh_product(product_id, previous_category_id, previous_specs))
+
+
+@receiver(post_save, sender=Product)
+def update_category_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = stats.snapshot(instance.category_id, instance.price, instance.stock_status)
+    stats.product_changed(instance._previous_snapshot, current)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_category_stats(sender, instance, **kwargs):
+    stats.product_changed(stats.snapshot(instance.category_id, instance.price, instance.stock_status), None)
+
+
+@receiver(post_save, sender=Category)
+def create_category_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.rebuild_category(instance.pk)
+
+
+def _update_search_index(method, *args):
+    """Apply a change to this worker's search index once the transaction commits"""
+    def apply():
+        if search.product_index.built:
+            getattr(search.product_index, method)(*args)
+    transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=Product)
+def update_search_index_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _update_search_index('update_product', instance.pk, instance.name, instance.sku, instance.slug, instance.price)
+
+
+@receiver(post_delete, sender=Product)
+def remove_search_index_product(sender, instance, **kwargs):
+    _update_search_index('remove_product', instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def update_search_index_category(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _update_search_index('update_category', instance.pk, instance.name, instance.slug)
+
+
+@receiver(post_delete, sender=Category)
+def remove_search_index_category(sender, instance, **kwargs):
+    _update_search_index('remove_category', instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=DescriptionSection)
+@receiver([post_save, post_delete], sender=Review)
+@receiver([post_save, post_delete], sender=Feature)
+def expire_cached_listings(sender, raw=False, **kwargs):
+    """Cached listings and catalogue pages show these models; move them to a new catalogue version"""
+    if raw:
+        return
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=DescriptionSection)
+def render_product_description(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    descriptions.refresh(instance.product_id)
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=DescriptionSection)
+@receiver([post_save, post_delete], sender=Review)
+def touch_product(sender, instance, raw=False, **kwargs):
+    """Bump the parent's updated_at so caches keyed on it see the change"""
+    if raw:
+        return
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Order)
+def index_order(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Keep the order's name and address words searchable (see store.order_search)"""
+    if raw or (update_fields is not None and not {'full_name', 'address'} & set(update_fields)):
+        return
+    order_search.index_orders([instance], replace=not created)
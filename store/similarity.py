@@ -0,0 +1,191 @@
+"""
+"Similar products" index built from numeric values in `Product.specs`.
+
+Within a category every numeric spec key becomes a column, min-max scaled
+to [0, 1] (missing values take the column mean), and all pairwise
+Euclidean distances are computed in one NumPy batch. The top-K nearest
+neighbours of each product are stored as a `ProductNeighbours` row.
+Saving a product only recomputes the rows it can affect.
+"""
+import re
+
+from django.db import transaction
+
+from .models import Category, Product, ProductNeighbours
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+TOP_K = 10
+BATCH_SIZE = 500
+
+_NUMBER_RE = re.compile(r'[-+]?\d*\.?\d+')
+
+
+def is_available():
+    return np is not None
+
+
+def parse_spec_number(value):
+    """Leading number of a spec value such as '380KV' or '60V (14S LiPo)'"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER_RE.search(str(value))
+    return float(match.group()) if match else None
+
+
+def _spec_numbers(specs):
+    return {key: number for key, value in (specs or {}).items() if (number := parse_spec_number(value)) is not None}
+
+
+def _category_matrix(category_id):
+    """
+    Product ids, their normalised spec vectors and the scaling used, as
+    (spec keys, column minimums, column spans), for one category
+    """
+    rows = list(Product.objects.filter(category_id=category_id).order_by('pk').values_list('pk', 'specs'))
+    ids = np.array([pk for pk, _ in rows], dtype=np.int64)
+    parsed = [_spec_numbers(specs) for _, specs in rows]
+    keys = sorted({key for values in parsed for key in values})
+    matrix = np.full((len(rows), len(keys)), np.nan)
+    for row, values in enumerate(parsed):
+        for column, key in enumerate(keys):
+            if key in values:
+                matrix[row, column] = values[key]
+
+    low, span = np.zeros(len(keys)), np.ones(len(keys))
+    if keys and len(rows):
+        with np.errstate(all='ignore'):
+            low = np.nanmin(matrix, axis=0)
+            span = np.nanmax(matrix, axis=0) - low
+        span[span == 0] = 1
+        matrix = (matrix - low) / span
+        means = np.nanmean(matrix, axis=0)
+        missing = np.isnan(matrix)
+        matrix[missing] = np.take(means, np.nonzero(missing)[1])
+    return ids, matrix, (keys, low, span)
+
+
+def _on_bound(vector):
+    return bool((np.isclose(vector, 0) | np.isclose(vector, 1) | (vector < 0) | (vector > 1)).any())
+
+
+def _scaled(specs, scaling):
+    """`specs` scaled like the category's matrix; NaN where the product has no value, None if it had other keys"""
+    keys, low, span = scaling
+    numbers = _spec_numbers(specs)
+    if set(numbers) - set(keys):
+        return None
+    return (np.array([numbers.get(key, np.nan) for key in keys]) - low) / span
+
+
+def _distances(matrix, rows):
+    """Euclidean distances from the given row indexes to every row"""
+    subset = matrix[rows]
+    squared = (
+        np.einsum('ij,ij->i', subset, subset)[:, None]
+        + np.einsum('ij,ij->i', matrix, matrix)[None, :]
+        - 2 * subset @ matrix.T
+    )
+    distances = np.sqrt(np.clip(squared, 0, None))
+    distances[np.arange(len(rows)), rows] = np.inf
+    return distances
+
+
+def _nearest(distances, top_k):
+    """(column indexes, distances) of the top_k smallest entries per row, sorted"""
+    k = min(top_k, distances.shape[1] - 1)
+    if k <= 0:
+        return [([], []) for _ in range(distances.shape[0])]
+    candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    result = []
+    for row, columns in enumerate(candidates):
+        columns = columns[np.argsort(distances[row, columns], kind='stable')]
+        result.append((columns, distances[row, columns]))
+    return result
+
+
+def _store(ids, matrix, rows, top_k):
+    if not matrix.shape[1]:
+        top_k = 0  # no numeric specs to compare
+    neighbours = []
+    for start in range(0, len(rows), BATCH_SIZE):
+        chunk = np.asarray(rows[start:start + BATCH_SIZE])
+        for row, (columns, distances) in zip(chunk, _nearest(_distances(matrix, chunk), top_k)):
+            neighbours.append(ProductNeighbours(
+                product_id=int(ids[row]),
+                kind=ProductNeighbours.SIMILAR_SPECS,
+                neighbour_ids=[int(ids[column]) for column in columns],
+                scores=[round(float(distance), 6) for distance in distances],
+            ))
+    ProductNeighbours.objects.bulk_create(
+        neighbours,
+        update_conflicts=True,
+        unique_fields=['product', 'kind'],
+        update_fields=['neighbour_ids', 'scores', 'updated_at'],
+        batch_size=BATCH_SIZE,
+    )
+    return len(neighbours)
+
+
+def rebuild_category(category_id, top_k=TOP_K):
+    """Recompute the similar-products rows of every product in a category"""
+    ids, matrix, _scaling = _category_matrix(category_id)
+    with transaction.atomic():
+        return _store(ids, matrix, list(range(len(ids))), top_k)
+
+
+def rebuild_all(top_k=TOP_K):
+    """Recompute the similarity index for the whole catalogue"""
+    return sum(rebuild_category(pk, top_k) for pk in Category.objects.values_list('pk', flat=True))
+
+
+def refresh_product(product_id, previous_category_id=None, previous_specs=None, top_k=TOP_K):
+    """
+    Recompute the rows affected by a change to one product: its own row,
+    rows that already list it, and rows it now beats. If the product sits
+    on a column bound, or sat on one with its `previous_specs`, the
+    scaling may have moved, so the category is rebuilt instead;
+    `rebuild_similarity` corrects any remaining drift.
+    """
+    category_id = Product.objects.filter(pk=product_id).values_list('category_id', flat=True).first()
+    moved = previous_category_id is not None and previous_category_id != category_id
+    if moved:
+        rebuild_category(previous_category_id, top_k)
+    if category_id is None:
+        return 0
+
+    ids, matrix, scaling = _category_matrix(category_id)
+    position = int(np.searchsorted(ids, product_id))
+    if _on_bound(matrix[position]):
+        return rebuild_category(category_id, top_k)
+    if previous_specs is not None and not moved:
+        previous = _scaled(previous_specs, scaling)
+        # Leaving a bound shrinks that column's range for every product
+        if previous is None or _on_bound(previous[~np.isnan(previous)]):
+            return rebuild_category(category_id, top_k)
+
+    existing = {
+        pk: (neighbour_ids, scores)
+        for pk, neighbour_ids, scores in ProductNeighbours.objects.filter(
+            kind=ProductNeighbours.SIMILAR_SPECS, product__category_id=category_id
+        ).values_list('product_id', 'neighbour_ids', 'scores')
+    }
+    wanted = min(top_k, len(ids) - 1) if matrix.shape[1] else 0
+    distance_to_changed = _distances(matrix, np.array([position]))[0]
+    rows = [position]
+    for row, pk in enumerate(ids.tolist()):
+        if row == position:
+            continue
+        neighbour_ids, scores = existing.get(pk, ([], []))
+        if (
+            product_id in neighbour_ids
+            or len(neighbour_ids) < wanted
+            or (wanted and distance_to_changed[row] < scores[-1])
+        ):
+            rows.append(row)
+    return _store(ids, matrix, rows, top_k)
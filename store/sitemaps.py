@@ -0,0 +1,163 @@
+"""
+XML sitemaps for the whole catalogue.
+
+/sitemap.xml is an index of sections: one for the static pages and the
+categories, and one per block of SECTION_SIZE product ids, so no file goes
+past the protocol's 50,000 URL limit. Product sections are streamed from
+`QuerySet.iterator()` and cached under a signature of their row count and
+newest `updated_at`. The signatures come from one grouped query per
+catalogue version, so editing a product regenerates only the section that
+holds it.
+"""
+import hashlib
+from xml.sax.saxutils import escape
+
+from django.core.cache import cache
+from django.db.models import Count, F, Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_GET
+
+from .listing import catalog_version
+from .models import Category, Product
+
+SECTION_SIZE = 50000
+URLS_PER_CHUNK = 500
+SECTION_TIMEOUT = 60 * 60 * 24
+SIGNATURE_TIMEOUT = 60 * 15
+MAX_AGE = 60 * 60
+CONTENT_TYPE = 'application/xml; charset=utf-8'
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def _lastmod(value):
+    return value.replace(microsecond=0).isoformat() if value else None
+
+
+def _url(loc, lastmod=None):
+    lastmod = f'<lastmod>{lastmod}</lastmod>' if lastmod else ''
+    return f'<url><loc>{escape(loc)}</loc>{lastmod}</url>\n'
+
+
+def _base_url(request):
+    return request.build_absolute_uri('/').rstrip('/')
+
+
+def _cache_key(name, base, *parts):
+    digest = hashlib.md5(repr((base, parts)).encode(), usedforsecurity=False).hexdigest()
+    return f'sitemap:{name}:{digest}'
+
+
+def _xml_response(body):
+    response = HttpResponse(body, content_type=CONTENT_TYPE)
+    patch_cache_control(response, public=True, max_age=MAX_AGE)
+    return response
+
+
+def section_signatures():
+    """{section number: (product count, newest updated_at)}, recomputed once per catalogue version"""
+    key = f'sitemap:signatures:{catalog_version()}'
+    signatures = cache.get(key)
+    if signatures is None:
+        rows = (
+            Product.objects.order_by()
+            .annotate(section=(F('pk') - 1) / SECTION_SIZE)
+            .values('section')
+            .annotate(count=Count('pk'), lastmod=Max('updated_at'))
+            .values_list('section', 'count', 'lastmod')
+        )
+        signatures = {section: (count, lastmod) for section, count, lastmod in rows}
+        cache.set(key, signatures, SIGNATURE_TIMEOUT)
+    return signatures
+
+
+def _product_urls(base, section):
+    # reverse() once; the per-row work is string formatting
+    prefix, _, suffix = (base + reverse('product_detail', kwargs={'slug': 'slug'})).rpartition('slug')
+    products = Product.objects.filter(
+        pk__gt=section * SECTION_SIZE, pk__lte=(section + 1) * SECTION_SIZE,
+    ).order_by('pk').values_list('slug', 'updated_at')
+    yield f'{XML_HEADER}<urlset xmlns="{NAMESPACE}">\n'
+    chunk = []
+    for slug, updated_at in products.iterator(chunk_size=URLS_PER_CHUNK * 4):
+        chunk.append(_url(f'{prefix}{slug}{suffix}', _lastmod(updated_at)))
+        if len(chunk) == URLS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk) + '</urlset>\n'
+
+
+def _stream_and_cache(key, chunks):
+    """Pass chunks through to the client and cache the whole document once it is complete"""
+    parts = []
+    for part in chunks:
+        parts.append(part)
+        yield part
+    cache.set(key, ''.join(parts), SECTION_TIMEOUT)
+
+
+@require_GET
+def sitemap_index(request):
+    """Index of the page and category section plus one section per block of products"""
+    base = _base_url(request)
+    signatures = section_signatures()
+    key = _cache_key('index', base, sorted(signatures.items()))
+    body = cache.get(key)
+    if body is None:
+        newest = max((lastmod for _, lastmod in signatures.values() if lastmod), default=None)
+        entries = [(reverse('sitemap_pages'), newest)]
+        entries += [
+            (reverse('sitemap_products', args=[section]), lastmod)
+            for section, (_, lastmod) in sorted(signatures.items())
+        ]
+        lines = [f'{XML_HEADER}<sitemapindex xmlns="{NAMESPACE}">\n']
+        for path, lastmod in entries:
+            lastmod = f'<lastmod>{_lastmod(lastmod)}</lastmod>' if lastmod else ''
+            lines.append(f'<sitemap><loc>{escape(base + path)}</loc>{lastmod}</sitemap>\n')
+        lines.append('</sitemapindex>\n')
+        body = ''.join(lines)
+        cache.set(key, body, SECTION_TIMEOUT)
+    return _xml_response(body)
+
+
+@require_GET
+def sitemap_pages(request):
+    """Homepage, shop and every category, with the newest product change as lastmod"""
+    base = _base_url(request)
+    key = _cache_key('pages', base, catalog_version())
+    body = cache.get(key)
+    if body is None:
+        categories = Category.objects.annotate(lastmod=Max('products__updated_at')).values_list('slug', 'lastmod')
+        lines = [f'{XML_HEADER}<urlset xmlns="{NAMESPACE}">\n', _url(base + reverse('home')), _url(base + reverse('shop'))]
+        lines += [
+            _url(base + reverse('category', kwargs={'category_slug': slug}), _lastmod(lastmod))
+            for slug, lastmod in categories
+        ]
+        lines.append('</urlset>\n')
+        body = ''.join(lines)
+        cache.set(key, body, SECTION_TIMEOUT)
+    return _xml_response(body)
+
+
+@require_GET
+def sitemap_products(request, section):
+    """One block of up to SECTION_SIZE products, streamed on a cache miss"""
+    signature = section_signatures().get(section)
+    if signature is None:
+        raise Http404('No such sitemap section')
+    base = _base_url(request)
+    key = _cache_key('products', base, section, signature)
+    body = cache.get(key)
+    if body is not None:
+        return _xml_response(body)
+    response = StreamingHttpResponse(_stream_and_cache(key, _product_urls(base, section)), content_type=CONTENT_TYPE)
+    patch_cache_control(response, public=True, max_age=MAX_AGE)
+    return response
+
+
+@require_GET
+def robots_txt(request):
+    body = f'User-agent: *\nDisallow: /admin/\nDisallow: /cart/\nDisallow: /checkout/\n\nSitemap: {_base_url(request)}{reverse("sitemap_index")}\n'
+    return HttpResponse(body, content_type='text/plain; charset=utf-8')
@@ -0,0 +1,111 @@
+"""
+Per-category aggregates for the shop sidebar and the price slider.
+
+`CategoryStats` rows move by deltas as products change: counts and the
+price total are adjusted with F() expressions and the bounds widen with
+Least/Greatest, all in one UPDATE. Only taking away the product that held
+a bound needs a fresh MIN/MAX, and only over that one category.
+`rebuild_all` recomputes every row from the product table.
+"""
+from decimal import Decimal
+
+from django.db.models import Case, Count, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Greatest, Least
+
+from .models import Category, CategoryStats, Product
+
+EMPTY = {'product_count': 0, 'in_stock_count': 0, 'price_total': 0, 'min_price': None, 'max_price': None}
+
+
+def snapshot(category_id, price, stock_status):
+    """What the stats need to know about one product: (category_id, price, in stock)"""
+    return category_id, Decimal(str(price)), stock_status == 'in_stock'
+
+
+def product_changed(previous, current):
+    """Apply a product's move from one snapshot to another; either side may be None"""
+    if previous == current:
+        return
+    if previous is not None:
+        _remove(*previous)
+    if current is not None:
+        _add(*current)
+
+
+def products_sold_out(category_ids):
+    """Tracked stock ran out through an UPDATE that bypassed save()"""
+    for category_id in category_ids:
+        CategoryStats.objects.filter(category_id=category_id, in_stock_count__gt=0).update(
+            in_stock_count=F('in_stock_count') - 1,
+        )
+
+
+def _add(category_id, price, in_stock):
+    updated = CategoryStats.objects.filter(category_id=category_id).update(
+        product_count=F('product_count') + 1,
+        in_stock_count=F('in_stock_count') + int(in_stock),
+        price_total=F('price_total') + price,
+        min_price=Case(When(min_price__isnull=True, then=Value(price)), default=Least('min_price', Value(price))),
+        max_price=Case(When(max_price__isnull=True, then=Value(price)), default=Greatest('max_price', Value(price))),
+    )
+    if not updated:
+        rebuild_category(category_id)
+
+
+def _remove(category_id, price, in_stock):
+    updated = CategoryStats.objects.filter(category_id=category_id).update(
+        product_count=F('product_count') - 1,
+        in_stock_count=F('in_stock_count') - int(in_stock),
+        price_total=F('price_total') - price,
+    )
+    if not updated:
+        return
+    held_bound = Q(min_price__gte=price) | Q(max_price__lte=price)
+    if CategoryStats.objects.filter(held_bound, category_id=category_id).exists():
+        bounds = Product.objects.filter(category_id=category_id).aggregate(low=Min('price'), high=Max('price'))
+        CategoryStats.objects.filter(category_id=category_id).update(min_price=bounds['low'], max_price=bounds['high'])
+
+
+def _aggregates(products):
+    return products.annotate(
+        product_count=Count('pk'),
+        in_stock_count=Count('pk', filter=Q(stock_status='in_stock')),
+        price_total=Sum('price'),
+        min_price=Min('price'),
+        max_price=Max('price'),
+    ).values('category_id', 'product_count', 'in_stock_count', 'price_total', 'min_price', 'max_price')
+
+
+def _defaults(row):
+    return {
+        'product_count': row['product_count'],
+        'in_stock_count': row['in_stock_count'],
+        'price_total': row['price_total'] or 0,
+        'min_price': row['min_price'],
+        'max_price': row['max_price'],
+    }
+
+
+def rebuild_category(category_id):
+    if not Category.objects.filter(pk=category_id).exists():
+        return
+    rows = list(_aggregates(Product.objects.filter(category_id=category_id).values('category_id').order_by()))
+    row = rows[0] if rows else EMPTY
+    CategoryStats.objects.update_or_create(category_id=category_id, defaults=_defaults(row))
+
+
+def rebuild_all():
+    """Recompute every category's row with one grouped query; returns the number of categories"""
+    rows = {row['category_id']: row for row in _aggregates(Product.objects.values('category_id').order_by())}
+    category_ids = list(Category.objects.values_list('pk', flat=True))
+    for category_id in category_ids:
+        CategoryStats.objects.update_or_create(category_id=category_id, defaults=_defaults(rows.get(category_id, EMPTY)))
+    return len(category_ids)
+
+
+def price_bounds(categories):
+    """Lowest and highest price across categories fetched with select_related('stats')"""
+    stats = [getattr(category, 'stats', None) for category in categories]
+    lows = [row.min_price for row in stats if row is not None and row.min_price is not None]
+    highs = [row.max_price for row in stats if row is not None and row.max_price is not None]
+    return (min(lows) if lows else None), (max(highs) if highs else None)
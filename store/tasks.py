@@ -0,0 +1,32 @@
+from django.conf import settings
+
+from core.notifications import notify
+from core.queue import task
+
+from .models import Order, Product
+
+
+@task()
+def send_order_confirmation(order_id):
+    """Tell the customer their order was received"""
+    order = Order.objects.prefetch_related('items__product').get(pk=order_id)
+    lines = '\n'.join(
+        f'{item.quantity} x {item.product.name} @ ${item.price}' for item in order.items.all()
+    )
+    notify(
+        order.phone_number,
+        f'Order #{order.pk} received',
+        f'Hi {order.full_name}, thanks for your order!\n{lines}\nTotal: ${order.total_price}',
+    )
+
+
+@task()
+def check_low_stock(product_ids):
+    """Alert staff about tracked products that are running out"""
+    threshold = getattr(settings, 'LOW_STOCK_THRESHOLD', 3)
+    for product in Product.objects.filter(pk__in=product_ids, stock__isnull=False, stock__lte=threshold):
+        notify(
+            getattr(settings, 'STAFF_NOTIFICATION_RECIPIENT', 'staff'),
+            f'Low stock: {product.name}',
+            f'{product.stock} left of {product.name} (SKU {product.sku}).',
+        )
@@ -1,3 +1,1365 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import notifications, perf, queue, stale, warmup, writes
+from core.models import HomeSettings, RouteTiming, Task
+from core.serving import FileServer, Mount
+
+from . import (
+    archive, cart as cart_ops, descriptions, export, listing, order_search, recommendations, search, similarity, sitemaps,
+    stats,
+)
+from .inventory import OutOfStock, reserve_stock
+from .listing import bump_catalog_version
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, CartItem, Category, CategoryStats, CoPurchase, DescriptionSection, Order, OrderItem,
+    OrderSearchToken, Product, ProductImage, ProductNeighbours, Review,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def make_product(category, index, **fields):
+    defaults = {
+        'name': f'Product {index}',
+        'slug': f'product-{index}',
+        'sku': f'SKU-{index}',
+        'category': category,
+        'price': '10.00',
+        'short_description': 'Test product',
+    }
+    defaults.update(fields)
+    return Product.objects.create(**defaults)
+
+
+def seed_catalog(products_per_category, categories=3, images=3, reviews=4, sections=3, prefix='seed'):
+    """A catalogue shaped like production: every product has images, reviews and description sections"""
+    created = []
+    for c in range(categories):
+        category, _ = Category.objects.get_or_create(
+            slug=f'category-{c}', defaults={'name': f'Category {c}', 'icon': 'cpu'},
+        )
+        for index in range(products_per_category):
+            key = f'{prefix}-{c}-{index}'
+            product = make_product(
+                category, key, price=f'{10 + index}.00', is_featured=index % 2 == 0, is_new=index % 3 == 0,
+                specs={'weight': f'{100 + index}g', 'voltage': f'{index % 12}S'},
+            )
+            ProductImage.objects.bulk_create([
+                ProductImage(product=product, image='products/motor.png', alt_text=f'{key} view {i}',
+                             is_primary=i == 0, order=i)
+                for i in range(images)
+            ])
+            Review.objects.bulk_create([
+                Review(product=product, author=f'Buyer {i}', rating=1 + i % 5, content='Solid part.')
+                for i in range(reviews)
+            ])
+            DescriptionSection.objects.bulk_create([
+                DescriptionSection(product=product, title=f'Section {i}', slug=f'section-{i}',
+                                   content=f'<p>Details {i}</p>', order=i)
+                for i in range(sections)
+            ])
+            created.append(product)
+    return created
+
+
+class transaction_rollback:
+    """Undo whatever a request wrote, so each measurement starts from the same state"""
+
+    def __enter__(self):
+        self.atomic = transaction.atomic()
+        self.atomic.__enter__()
+
+    def __exit__(self, *exc_info):
+        transaction.set_rollback(True)
+        self.atomic.__exit__(*exc_info)
+
+
+def checkout_data():
+    return {'full_name': 'Test Buyer', 'phone_number': '+1 555 0100', 'address': '1 Arena Way'}
+
+
+class StockTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Motors', slug='motors', icon='cpu')
+        self.product = make_product(self.category, 1, stock=5)
+        self.other = make_product(self.category, 2, stock=1)
+
+    def test_stock_status_follows_quantity(self):
+        self.assertEqual(self.product.stock_status, 'in_stock')
+        self.product.stock = 0
+        self.product.save()
+        self.assertEqual(self.product.stock_status, 'out_of_stock')
+
+        preorder = make_product(self.category, 3, stock=0, stock_status='pre_order')
+        self.assertEqual(preorder.stock_status, 'pre_order')
+
+    def test_reserve_decrements_and_sells_out(self):
+        reserve_stock([(self.product.pk, 5)])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(self.product.stock_status, 'out_of_stock')
+
+    def test_selling_out_moves_the_catalogue_version_on_commit(self):
+        version = listing.catalog_version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            reserve_stock([(self.product.pk, 2)])
+        self.assertEqual(callbacks, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock([(self.product.pk, 3)])
+        self.assertNotEqual(listing.catalog_version(), version)
+
+    def test_untracked_stock_is_never_short(self):
+        untracked = make_product(self.category, 3)
+        reserve_stock([(untracked.pk, 1000)])
+        untracked.refresh_from_db()
+        self.assertIsNone(untracked.stock)
+        self.assertEqual(untracked.stock_status, 'in_stock')
+
+    def test_shortage_rolls_back_whole_checkout(self):
+        client = Client()
+        client.post(reverse('add_cart', args=[self.product.pk]), {'quantity': 2})
+        client.post(reverse('add_cart', args=[self.other.pk]), {'quantity': 2})
+
+        response = client.post(reverse('checkout'), checkout_data())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'only 1 of Product 2 left')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_reserve_raises_on_shortage(self):
+        with self.assertRaises(OutOfStock):
+            reserve_stock([(self.other.pk, 2)])
+
+
+@override_settings(NOTIFICATION_BACKEND='core.notifications.LocMemBackend', LOW_STOCK_THRESHOLD=2)
+class CheckoutTaskTests(TestCase):
+    def setUp(self):
+        notifications.outbox.clear()
+        category = Category.objects.create(name='Motors', slug='motors', icon='cpu')
+        self.product = make_product(category, 1, stock=3)
+
+    def test_checkout_enqueues_follow_up_work(self):
+        self.client.post(reverse('add_cart', args=[self.product.pk]), {'quantity': 2})
+        self.client.post(reverse('checkout'), checkout_data())
+
+        self.assertEqual(Task.objects.filter(status='queued').count(), 2)
+        self.assertEqual(notifications.outbox, [])
+
+        self.assertEqual(queue.run_pending(), [True, True])
+        subjects = [message['subject'] for message in notifications.outbox]
+        order = Order.objects.get()
+        self.assertIn(f'Order #{order.pk} received', subjects)
+        self.assertIn('Low stock: Product 1', subjects)
+        self.assertFalse(Task.objects.exclude(status='done').exists())
+
+    def test_failures_back_off_then_give_up(self):
+        @queue.task(name='tests.always_fails', max_attempts=2)
+        def always_fails():
+            raise RuntimeError('boom')
+
+        task_row = always_fails.enqueue()
+        self.assertEqual(queue.run_pending(), [False])
+        task_row.refresh_from_db()
+        self.assertEqual((task_row.status, task_row.attempts), ('queued', 1))
+        self.assertIn('boom', task_row.last_error)
+        self.assertEqual(queue.run_pending(), [])  # waiting out the backoff
+
+        Task.objects.filter(pk=task_row.pk).update(run_at=task_row.created_at)
+        self.assertEqual(queue.run_pending(), [False])
+        task_row.refresh_from_db()
+        self.assertEqual((task_row.status, task_row.attempts), ('failed', 2))
+
+    def test_expired_visibility_timeout_is_reclaimed(self):
+        task_row = Task.objects.create(name='store.tasks.check_low_stock', payload={'product_ids': []})
+        self.assertEqual(len(queue.claim(1, visibility_timeout=0)), 1)
+        self.assertEqual([row.pk for row in queue.claim(1)], [task_row.pk])
+        self.assertEqual(queue.claim(1), [])
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    buyers = 24
+    stock = 10
+
+    def test_simultaneous_checkouts_never_oversell(self):
+        category = Category.objects.create(name='Motors', slug='motors', icon='cpu')
+        product = make_product(category, 1, stock=self.stock)
+
+        clients = []
+        for _ in range(self.buyers):
+            client = Client()
+            client.post(reverse('add_cart', args=[product.pk]), {'quantity': 1})
+            clients.append(client)
+
+        barrier = threading.Barrier(self.buyers)
+        statuses = []
+
+        def buy(client):
+            try:
+                barrier.wait()
+                statuses.append(client.post(reverse('checkout'), checkout_data()).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(client,)) for client in clients]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        logger.info(
+            '%d concurrent checkouts in %.0f ms (%.0f checkouts/s)', self.buyers, elapsed * 1000, self.buyers / elapsed,
+        )
+
+        product.refresh_from_db()
+        self.assertEqual(len(statuses), self.buyers)
+        self.assertEqual(statuses.count(302), self.stock)  # placed, redirected home
+        self.assertEqual(statuses.count(200), self.buyers - self.stock)  # re-rendered with a shortage
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(product.stock_status, 'out_of_stock')
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), self.stock)
+        # A loose ceiling: serialised checkouts should still clear in well under a second each
+        self.assertLess(elapsed, self.buyers * 1.0)
+
+
+def use_fresh_writer(test, window=0.002, batch_size=64):
+    """A writer of the test's own, so batches are counted from zero"""
+    writer = writes.Writer(window, batch_size)
+    test.addCleanup(setattr, writes, '_writer', writes._writer)
+    writes._writer = writer
+    return writer
+
+
+@override_settings(WRITE_COALESCING=True)
+class CoalescedCheckoutTests(ConcurrentCheckoutTests):
+    """The same rush of checkouts, committed in batches by the writer thread"""
+
+    def setUp(self):
+        self.writer = use_fresh_writer(self)
+
+    def test_simultaneous_checkouts_never_oversell(self):
+        super().test_simultaneous_checkouts_never_oversell()
+        self.assertLess(self.writer.batches, self.buyers * 2)
+
+
+@override_settings(WRITE_COALESCING=True)
+class WriteCoalescingTests(TransactionTestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Motors', slug='motors', icon='cpu')
+        self.products = [make_product(category, i) for i in range(3)]
+
+    def test_concurrent_writes_share_one_transaction(self):
+        writer = use_fresh_writer(self, window=0.2)
+        futures = [
+            writer.submit(cart_ops.update, f'cart-{i}', [('add', self.products[i % 3].pk, i + 1)]) for i in range(6)
+        ]
+        results = [future.result(timeout=5) for future in futures]
+        self.assertEqual((writer.batches, writer.writes), (1, 6))
+        self.assertEqual([touched for _cart, touched in results], [[product.pk] for product in self.products] * 2)
+        self.assertEqual(sorted(CartItem.objects.values_list('quantity', flat=True)), [1, 2, 3, 4, 5, 6])
+
+    def test_a_failing_write_rolls_back_alone(self):
+        writer = use_fresh_writer(self, window=0.2)
+        good = writer.submit(cart_ops.update, 'cart-1', [('add', self.products[0].pk, 1)])
+        bad = writer.submit(cart_ops.update, 'cart-2', [('add', self.products[1].pk, 1), ('add', 999999, 1)])
+        good.result(timeout=5)
+        with self.assertRaises(cart_ops.CartError):
+            bad.result(timeout=5)
+        self.assertEqual(writer.batches, 1)
+        self.assertEqual(list(CartItem.objects.values_list('cart__cart_id', 'quantity')), [('cart-1', 1)])
+
+    def test_cart_endpoint_goes_through_the_writer(self):
+        writer = use_fresh_writer(self)
+        product = self.products[0]
+        response = self.client.post(reverse('cart_update'), json.dumps({'operations': [
+            {'op': 'add', 'product': product.pk, 'quantity': 2},
+        ]}), content_type='application/json')
+        self.assertEqual(response.json()['cart_count'], 2)
+        self.assertEqual(writer.writes, 1)
+        self.assertEqual(self.client.post(reverse('cart_update'), json.dumps({'operations': [
+            {'op': 'add', 'product': 999999},
+        ]}), content_type='application/json').status_code, 400)
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    def test_generate_catalog_and_run_benchmark(self):
+        cache.clear()
+        call_command(
+            'generate_catalog', categories=2, products=30, images=60, reviews=90, sections=1, orders=40,
+            batch_size=16, stdout=io.StringIO(),
+        )
+        self.assertEqual(Product.objects.count(), 30)
+        self.assertEqual(ProductImage.objects.count(), 60)
+        self.assertEqual(Review.objects.count(), 90)
+        self.assertFalse(Order.objects.filter(items__isnull=True).exists())
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('run_benchmark', requests=6, warmup=1, concurrency=2, output=output, stdout=io.StringIO())
+            with open(output) as handle:
+                report = json.load(handle)
+        self.assertEqual(report['catalog']['orders'], 40)
+        for route, result in report['routes'].items():
+            with self.subTest(route=route):
+                self.assertEqual(result['requests'], 6)
+                self.assertEqual(result['errors'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Motors', slug='motors', icon='cpu')
+        self.motor, self.esc, self.prop, self.frame = [make_product(category, index) for index in range(4)]
+
+    def order(self, *products, status='New'):
+        order = Order.objects.create(full_name='Ada', phone_number='555', address='1 Lane', status=status)
+        OrderItem.objects.bulk_create([OrderItem(order=order, product=product, price='10.00') for product in products])
+        return order
+
+    def neighbours(self, product):
+        return [p.pk for p in Product.objects.bought_together_with(product)]
+
+    def test_incremental_runs_fold_in_only_new_orders(self):
+        self.order(self.motor, self.esc)
+        self.order(self.motor, self.esc, self.prop)
+        self.order(self.motor, self.frame, status='Cancelled')
+        self.assertEqual(recommendations.update_bought_together(), (2, 3))
+        self.assertEqual(CoPurchase.objects.get(product=self.motor, related=self.esc).count, 2)
+        self.assertFalse(CoPurchase.objects.filter(related=self.frame).exists())
+        self.assertEqual(self.neighbours(self.motor), [self.esc.pk, self.prop.pk])
+
+        # Nothing new: nothing to do
+        self.assertEqual(recommendations.update_bought_together(), (0, 0))
+        self.order(self.motor, self.prop)
+        self.order(self.motor, self.prop)
+        self.assertEqual(recommendations.update_bought_together(), (2, 2))
+        self.assertEqual(CoPurchase.objects.get(product=self.motor, related=self.prop).count, 3)
+        self.assertEqual(CoPurchase.objects.get(product=self.motor, related=self.esc).count, 2)
+        self.assertEqual(self.neighbours(self.motor), [self.prop.pk, self.esc.pk])
+        # A full rebuild agrees with the incremental runs
+        recommendations.update_bought_together(full=True)
+        self.assertEqual(self.neighbours(self.motor), [self.prop.pk, self.esc.pk])
+        self.assertEqual(CoPurchase.objects.get(product=self.prop, related=self.motor).count, 3)
+
+    def test_product_page_tops_up_from_the_category(self):
+        self.order(self.motor, self.esc)
+        recommendations.update_bought_together()
+        related = self.client.get(self.motor.get_absolute_url()).context['related_products']
+        self.assertEqual(len(related), 3)
+        self.assertEqual(related[0], self.esc)
+        self.assertNotIn(self.motor, related)
+        self.assertEqual({product.category_id for product in related}, {self.motor.category_id})
+
+
+@skipUnless(similarity.is_available(), 'NumPy is not installed')
+class SimilarityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Motors', slug='motors', icon='cpu')
+        self.products = [
+            make_product(self.category, index, specs={'weight': f'{weight}g', 'colour': 'red'})
+            for index, weight in enumerate([0, 50, 60, 100, 200])
+        ]
+
+    def stored(self):
+        return dict(
+            ProductNeighbours.objects.filter(kind=ProductNeighbours.SIMILAR_SPECS)
+            .values_list('product_id', 'neighbour_ids')
+        ), list(ProductNeighbours.objects.order_by('product_id').values_list('product_id', 'scores'))
+
+    def test_neighbours_are_the_closest_specs_in_the_category(self):
+        other = Category.objects.create(name='Frames', slug='frames', icon='box')
+        make_product(other, 9, specs={'weight': '61g'})
+        similarity.rebuild_all()
+        ids = [product.pk for product in self.products]
+        self.assertEqual([p.pk for p in Product.objects.similar_to(self.products[1], limit=3)], [ids[2], ids[0], ids[3]])
+        self.assertEqual([p.pk for p in Product.objects.similar_to(self.products[4])], [ids[3], ids[2], ids[1], ids[0]])
+
+    def test_saving_a_product_refreshes_the_neighbours(self):
+        similarity.rebuild_all()
+        product = self.products[0]
+        product.specs = {'weight': '99g'}
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(Product.objects.similar_to(self.products[3], limit=1).get(), product)
+        self.assertEqual(Product.objects.similar_to(product, limit=1).get(), self.products[3])
+
+    def test_leaving_a_bound_rescales_the_category(self):
+        similarity.rebuild_category(self.category.pk, top_k=1)
+        moved = self.products[4]
+        Product.objects.filter(pk=moved.pk).update(specs={'weight': '55g', 'colour': 'red'})
+        similarity.refresh_product(moved.pk, self.category.pk, moved.specs, top_k=1)
+        refreshed = self.stored()
+        similarity.rebuild_category(self.category.pk, top_k=1)
+        self.assertEqual(refreshed, self.stored())
+
+
+class SearchSuggestTests(TestCase):
+    def setUp(self):
+        self.motors = Category.objects.create(name='Brushless Motors', slug='motors', icon='cpu')
+        self.motor = make_product(self.motors, 1, name='Brushless Motor 2207', sku='BM-2207')
+        self.esc = make_product(self.motors, 2, name='Speed Controller', sku='ESC-45A')
+        search.product_index.built = False
+        self.addCleanup(setattr, search.product_index, 'built', False)
+
+    def names(self, query):
+        return [result['name'] for result in search.suggest(query)]
+
+    def test_prefixes_of_names_words_and_skus(self):
+        results = search.suggest('brush')
+        self.assertEqual([result['type'] for result in results], ['category', 'product'])
+        self.assertEqual(results[0]['url'], reverse('category', args=['motors']))
+        self.assertEqual(results[1], {
+            'type': 'product', 'name': 'Brushless Motor 2207', 'sku': 'BM-2207', 'price': '10.00',
+            'url': self.motor.get_absolute_url(),
+        })
+        self.assertEqual(self.names('esc-45'), ['Speed Controller'])
+        self.assertEqual(self.names('  CONTROL '), ['Speed Controller'])
+        self.assertEqual(self.names('propeller'), [])
+        self.assertEqual(self.client.get(reverse('search_suggest'), {'q': '2207'}).json()['results'][0]['sku'], 'BM-2207')
+
+    def test_saves_and_deletes_update_the_index_on_commit(self):
+        search.suggest('warm up')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.esc.name = 'Electronic Speed Controller'
+            self.esc.save()
+            frame = make_product(self.motors, 3, name='Carbon Frame')
+            self.motor.delete()
+            self.motors.name = 'Power Systems'
+            self.motors.save()
+        self.assertEqual(self.names('electronic'), ['Electronic Speed Controller'])
+        self.assertEqual(self.names('carbon'), [frame.name])
+        self.assertEqual(self.names('brush'), [])
+        self.assertEqual(self.names('power'), ['Power Systems'])
+
+    def test_rolled_back_and_raw_saves_leave_the_index_alone(self):
+        search.suggest('warm up')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction_rollback():
+                make_product(self.motors, 3, name='Phantom Frame')
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.names('phantom'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            # What loaddata does
+            Product(
+                category=self.motors, name='Fixture Frame', slug='fixture', sku='FX-1', price='1.00',
+                created_at=timezone.now(), updated_at=timezone.now(),
+            ).save_base(raw=True)
+        self.assertEqual(self.names('fixture'), [])
+
+    def test_other_workers_changes_are_picked_up(self):
+        index = search.PrefixIndex()
+        index.build_from_db()
+        # Writes another worker made: a delete hidden by an add, and a category rename, all without signals
+        Product.objects.filter(pk=self.motor.pk).delete()
+        Product.objects.bulk_create([
+            Product(category=self.motors, name='Carbon Frame', slug='frame', sku='CF-1', price='30.00'),
+        ])
+        Category.objects.filter(pk=self.motors.pk).update(name='Power Systems')
+        index._checked_at = 0
+        index.ensure_built()
+        self.assertEqual([payload['name'] for payload in index.lookup('brush')], [])
+        self.assertEqual([payload['name'] for payload in index.lookup('carbon')], ['Carbon Frame'])
+        self.assertEqual([payload['name'] for payload in index.lookup('power')], ['Power Systems'])
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = seed_catalog(products_per_category=5, categories=2, images=1, reviews=1, sections=1)
+
+    def get(self, params=None, **headers):
+        return self.client.get(reverse('api_products'), params or {}, **headers)
+
+    def test_sparse_fields(self):
+        results = self.get({'fields': 'id,price', 'sort': 'price_low'}).json()['results']
+        self.assertEqual(results[0], {'id': self.products[0].pk, 'price': '10.00'})
+        detail = self.client.get(reverse('api_product_detail', args=[self.products[0].slug]), {'fields': 'name,review_count'})
+        self.assertEqual(detail.json(), {'name': self.products[0].name, 'review_count': 1})
+
+    def test_cursor_walks_every_product_in_order(self):
+        seen, params = [], {'sort': 'price_high', 'limit': 3, 'fields': 'id'}
+        url = f"{reverse('api_products')}?{urllib.parse.urlencode(params)}"
+        while url:
+            page = self.client.get(url).json()
+            seen += [result['id'] for result in page['results']]
+            url = page['next']
+        expected = Product.objects.order_by(*listing.SORT_ORDERS['price_high']).values_list('pk', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_unchanged_listing_answers_304(self):
+        first = self.get({'limit': 5})
+        self.assertEqual(first.status_code, 200)
+        again = self.get({'limit': 5}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        Product.objects.filter(pk=first.json()['results'][0]['id']).update(name='Renamed', updated_at=timezone.now())
+        self.assertEqual(self.get({'limit': 5}, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_category_renames_reach_cached_payloads(self):
+        product = self.products[0]
+        detail_url = reverse('api_product_detail', args=[product.slug])
+        first = self.get({'fields': 'id,category', 'sort': 'price_low', 'limit': 1})
+        self.assertEqual(self.client.get(detail_url).json()['category'], 'category-0')
+        Category.objects.filter(pk=product.category_id).update(slug='renamed')
+        again = self.get({'fields': 'id,category', 'sort': 'price_low', 'limit': 1}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['results'], [{'id': product.pk, 'category': 'renamed'}])
+        self.assertEqual(self.client.get(detail_url).json()['category'], 'renamed')
+
+    def test_bad_input_is_a_400(self):
+        for params in [
+            {'fields': 'id,password'},
+            {'limit': 'ten'},
+            {'cursor': 'nonsense'},
+            # Well-formed cursors whose values do not fit the sort fields
+            {'sort': 'price_low', 'cursor': listing.encode_cursor(['x', 1])},
+            {'sort': 'price_low', 'cursor': listing.encode_cursor(['NaN', 1])},
+            {'sort': 'newest', 'cursor': listing.encode_cursor(['yesterday', 1])},
+            {'sort': 'newest', 'cursor': listing.encode_cursor([[1], {}])},
+            {'sort': 'featured', 'cursor': listing.encode_cursor([1, True, '2026-01-01T00:00:00+00:00', 1])},
+        ]:
+            with self.subTest(params=params):
+                response = self.get(params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        self.assertEqual(self.get({'category': 'missing'}).status_code, 404)
+
+    def test_non_finite_prices_are_ignored(self):
+        for value in ('nan', 'inf', '-Infinity', 'sNaN'):
+            with self.subTest(min_price=value):
+                response = self.get({'min_price': value, 'max_price': value, 'limit': 100})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), len(self.products))
+
+
+class PerformanceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = seed_catalog(products_per_category=3, categories=1, images=1, reviews=1, sections=1)
+        self.addCleanup(setattr, perf, 'histograms', perf.histograms)
+        self.histograms = perf.histograms = perf.RouteHistograms()
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.products[0].get_absolute_url())
+        timing = dict(part.split(';', 1) for part in re.split(r',\s*(?=\w+;)', response['Server-Timing']))
+        self.assertEqual(set(timing), {'db', 'tpl', 'cache', 'total'})
+        self.assertRegex(timing['db'], rf'^dur=[\d.]+;desc="{len(queries)} queries"$')
+        self.assertRegex(timing['cache'], r'^desc="\d+ hits, [1-9]\d* misses, 0 stale"$')
+        self.assertGreater(float(timing['total'].removeprefix('dur=')), 0)
+
+    def test_requests_fold_into_histograms_per_url_name(self):
+        for _ in range(3):
+            self.client.get(reverse('shop'))
+        self.client.get(reverse('cart'))
+        self.client.get('/no-such-page/')
+        self.histograms.flush()
+        self.client.get(reverse('shop'))
+        self.histograms.flush()
+        rows = {row.url_name: row for row in RouteTiming.objects.all()}
+        self.assertEqual({name: row.count for name, row in rows.items()}, {'shop': 4, 'cart': 1, '<unresolved>': 1})
+        self.assertEqual(sum(rows['shop'].buckets), 4)
+        self.assertGreater(rows['shop'].total_ms, 0)
+
+    def test_percentiles_and_report(self):
+        histograms = perf.RouteHistograms()
+        for duration in [1] * 90 + [100] * 9 + [5000]:
+            histograms.record('shop', duration, stale_serves=1 if duration == 5000 else 0)
+        histograms.record('cart', 2)
+        histograms.flush()
+        shop = RouteTiming.objects.get(url_name='shop')
+        self.assertEqual(perf.percentile(shop.buckets, 0.5), perf.BUCKETS[perf.bisect.bisect_left(perf.BUCKETS, 1)])
+        self.assertGreaterEqual(perf.percentile(shop.buckets, 0.95), 100)
+        self.assertGreaterEqual(perf.percentile(shop.buckets, 0.999), 5000)
+
+        out = io.StringIO()
+        call_command('perf_report', '--reset', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0].split(), ['route', 'count', 'mean', 'p50', 'p95', 'p99', 'stale', '(ms)'])
+        # Slowest routes by total time first
+        self.assertEqual(lines[1].split()[:3], ['shop', '100', f'{(90 + 900 + 5000) / 100:.1f}'])
+        self.assertEqual(lines[1].split()[-1], '1')
+        self.assertEqual(lines[2].split()[:2], ['cart', '1'])
+        self.assertIn('Histograms cleared', lines[-1])
+        self.assertFalse(RouteTiming.objects.exists())
+        out = io.StringIO()
+        call_command('perf_report', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'No timings recorded yet.')
+
+
+class CategoryStatsTests(TestCase):
+    def setUp(self):
+        self.motors = Category.objects.create(name='Motors', slug='motors', icon='cpu')
+        self.frames = Category.objects.create(name='Frames', slug='frames', icon='box')
+        self.cheap = make_product(self.motors, 1, price='10.00', stock=1)
+        self.mid = make_product(self.motors, 2, price='20.00')
+        self.dear = make_product(self.motors, 3, price='90.00', stock_status='pre_order')
+
+    def assertStatsMatchRebuild(self):
+        live = {row.pk: row for row in CategoryStats.objects.all()}
+        stats.rebuild_all()
+        for row in CategoryStats.objects.all():
+            before = live[row.pk]
+            self.assertEqual(
+                (before.product_count, before.in_stock_count, before.price_total, before.min_price, before.max_price),
+                (row.product_count, row.in_stock_count, row.price_total, row.min_price, row.max_price),
+            )
+
+    def test_counts_and_bounds_follow_products(self):
+        row = CategoryStats.objects.get(category=self.motors)
+        self.assertEqual((row.product_count, row.in_stock_count), (3, 2))
+        self.assertEqual((row.min_price, row.max_price, row.avg_price), (10, 90, 40))
+        self.assertEqual(CategoryStats.objects.get(category=self.frames).product_count, 0)
+
+        self.dear.price = '50.00'
+        self.dear.save()
+        self.assertEqual(CategoryStats.objects.get(category=self.motors).max_price, 50)
+        self.assertStatsMatchRebuild()
+
+    def test_deleting_or_moving_the_bound_holder_narrows_the_range(self):
+        self.cheap.delete()
+        row = CategoryStats.objects.get(category=self.motors)
+        self.assertEqual((row.product_count, row.min_price), (2, 20))
+
+        self.dear.category = self.frames
+        self.dear.save()
+        row = CategoryStats.objects.get(category=self.motors)
+        self.assertEqual((row.product_count, row.min_price, row.max_price), (1, 20, 20))
+        row = CategoryStats.objects.get(category=self.frames)
+        self.assertEqual((row.product_count, row.min_price, row.max_price), (1, 90, 90))
+        self.assertStatsMatchRebuild()
+
+    def test_selling_out_at_checkout_updates_in_stock_count(self):
+        reserve_stock([(self.cheap.pk, 1), (self.mid.pk, 3)])
+        self.assertEqual(CategoryStats.objects.get(category=self.motors).in_stock_count, 1)
+        self.assertStatsMatchRebuild()
+
+    def test_shop_sidebar_and_slider_use_stats(self):
+        cache.clear()
+        response = self.client.get(reverse('shop'))
+        self.assertContains(response, '<span class="filter-count">3</span>', count=2)
+        self.assertContains(response, 'min="10" max="90"', count=2)
+
+
+class ProductReviewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Motors', slug='motors', icon='cpu')
+        self.product = make_product(category, 1)
+        Review.objects.bulk_create([
+            Review(product=self.product, author=f'Buyer {i}', rating=1 + i % 5, content=f'Review number {i}.')
+            for i in range(25)
+        ])
+
+    def test_detail_page_carries_only_the_summary(self):
+        response = self.client.get(self.product.get_absolute_url())
+        self.assertContains(response, '(25 Reviews)')
+        self.assertContains(response, reverse('product_reviews', args=[self.product.slug]))
+        self.assertNotContains(response, 'Review number')
+
+    def test_cursor_walks_every_review_newest_first(self):
+        url = reverse('product_reviews', args=[self.product.slug])
+        seen = []
+        while url:
+            response = self.client.get(url)
+            html = response.content.decode()
+            seen += [int(number) for number in re.findall(r'Review number (\d+)\.', html)]
+            match = re.search(r'data-next="([^"]+)"', html)
+            url = match.group(1).replace('&amp;', '&') if match else None
+        expected = list(Review.objects.filter(product=self.product).order_by('-created_at', '-pk'))
+        self.assertEqual(seen, [int(review.content.split()[-1].rstrip('.')) for review in expected])
+        self.assertEqual(len(seen), 25)
+
+    def test_bad_cursor_is_rejected(self):
+        url = reverse('product_reviews', args=[self.product.slug])
+        for values in [None, ['notadate', 1], [[1], {}], ['2026-01-01T00:00:00+00:00', '1'], [None, 1]]:
+            cursor = 'nonsense' if values is None else listing.encode_cursor(values)
+            with self.subTest(values=values):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.content, b'Invalid cursor')
+
+
+class DescriptionTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Motors', slug='motors', icon='cpu')
+        self.product = make_product(category, 1)
+
+    def test_sanitize_keeps_markup_and_drops_active_content(self):
+        html = descriptions.sanitize(
+            '<p class="lead" onclick="steal()">Fast <b>motor</b></p><script>alert(1)</script>'
+            '<a href="javascript:alert(1)">x</a><a href="/shop/">shop</a><img src="x.png" onerror="boom()"><ul><li>open'
+        )
+        self.assertEqual(
+            html,
+            '<p class="lead">Fast <b>motor</b></p><a>x</a><a href="/shop/">shop</a><img src="x.png"><ul><li>open</li></ul>',
+        )
+
+    def test_saving_sections_renders_the_description_once(self):
+        first = DescriptionSection.objects.create(
+            product=self.product, title='Overview', slug='overview', content='<p>Built tough</p>', order=0,
+        )
+        DescriptionSection.objects.create(
+            product=self.product, title='More', slug='overview', content='<p>Second</p>', order=1,
+        )
+        self.product.refresh_from_db()
+        self.assertIn('href="#desc-overview"', self.product.description_html)
+        self.assertIn('id="desc-overview-2"', self.product.description_html)
+
+        first.delete()
+        self.product.refresh_from_db()
+        self.assertNotIn('Built tough', self.product.description_html)
+
+        Product.objects.update(description_html='')
+        self.assertEqual(descriptions.rebuild_all(), 1)
+        self.product.refresh_from_db()
+        self.assertIn('<p>Second</p>', self.product.description_html)
+
+        response = self.client.get(self.product.get_absolute_url())
+        self.assertContains(response, 'id="desc-overview"')
+
+
+class ShopFragmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = seed_catalog(products_per_category=8, categories=2)
+        self.category = self.products[0].category
+
+    def fragment(self, path, params=None):
+        return self.client.get(path, params or {}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_fragment_is_grid_and_pagination_only(self):
+        response = self.fragment(reverse('category', args=[self.category.slug]), {'sort': 'price_low', 'page': 2})
+        html = response.content.decode()
+        self.assertNotIn('<html', html)
+        self.assertNotIn('main-header', html)
+        self.assertIn('product-grid', html)
+        self.assertIn('href="?sort=price_low&amp;page=1"', html)
+        self.assertEqual(response['Vary'], 'X-Requested-With')
+
+        page = self.client.get(reverse('category', args=[self.category.slug]), {'sort': 'price_low', 'page': 2})
+        self.assertIn('<html', page.content.decode())
+        self.assertIn(html, page.content.decode())
+
+    def test_fragments_are_cached_per_filter_combination(self):
+        params = {'sort': 'price_high', 'min_price': '12'}
+        first = self.fragment(reverse('shop'), params)
+        with self.assertNumQueries(0):
+            again = self.fragment(reverse('shop'), params)
+        self.assertEqual(first.content, again.content)
+        # Another page of the same filters reuses the matching ids: just its products and their images
+        with self.assertNumQueries(2):
+            self.fragment(reverse('shop'), {**params, 'page': 2})
+
+    def test_pagination_links_carry_only_filter_parameters(self):
+        first = self.fragment(reverse('shop'), {'sort': 'price_low', 'utm_source': 'mail', 'fbclid': 'abc123'})
+        html = first.content.decode()
+        self.assertIn('sort=price_low', html)
+        self.assertIn('page=2', html)
+        self.assertNotIn('utm_source', html)
+        self.assertNotIn('abc123', html)
+
+    def test_equivalent_filters_share_one_id_list(self):
+        listing.result_ids.clear()
+        self.fragment(reverse('shop'), {'min_price': '12', 'q': 'Product'})
+        with self.assertNumQueries(2):
+            self.fragment(reverse('shop'), {'min_price': '12.00', 'q': ' Product ', 'page': 2})
+        self.assertEqual(len(listing.result_ids), 1)
+
+    def test_result_ids_are_evicted_least_recently_used_first(self):
+        ids = listing.ResultIds(max_entries=2, max_ids=100, max_age=60)
+        for key in ('a', 'b', 'a', 'c'):
+            ids.get(key, 1, lambda: [1, 2, 3])
+        self.assertEqual(list(ids._entries), ['a', 'c'])
+        self.assertEqual((ids.hits, ids.misses), (1, 3))
+        # Too many ids in total also evicts, and a new catalogue version starts over
+        ids.get('d', 1, lambda: range(99))
+        self.assertEqual(list(ids._entries), ['d'])
+        ids.get('e', 2, lambda: [4])
+        self.assertEqual(list(ids._entries), ['e'])
+
+    def test_result_ids_expire_without_a_version_change(self):
+        # Other workers' saves and stock updates leave this worker's version alone
+        ids = listing.ResultIds(max_entries=2, max_ids=100, max_age=0)
+        ids.get('a', 1, lambda: [1, 2])
+        self.assertEqual(list(ids.get('a', 1, lambda: [2])), [2])
+        self.assertEqual((ids.hits, ids.misses, ids._size), (0, 2, 1))
+
+    def test_catalogue_changes_expire_cached_fragments(self):
+        params = {'sort': 'price_low'}
+        self.assertNotIn('Renamed part', self.fragment(reverse('shop'), params).content.decode())
+        product = Product.objects.get(pk=self.products[0].pk)
+        product.name = 'Renamed part'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertIn('Renamed part', self.fragment(reverse('shop'), params).content.decode())
+
+
+class FileServerTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.data = b'body { color: red; }\n' * 200
+        for name in ('site.css', 'site.0123456789ab.css'):
+            with open(os.path.join(self.root, name), 'wb') as file:
+                file.write(self.data)
+        with open(os.path.join(self.root, 'site.css.gz'), 'wb') as file:
+            file.write(gzip.compress(self.data))
+        self.server = FileServer(self.fallback, [Mount('/static/', self.root, 60, fingerprints=True)], stat_ttl=60)
+
+    def fallback(self, environ, start_response):
+        start_response('404 Not Found', [])
+        return [b'django']
+
+    def get(self, path, **headers):
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, **headers}
+        response = {}
+        body = self.server(environ, lambda status, headers: response.update(status=status, headers=dict(headers)))
+        response['body'] = b''.join(body)
+        if hasattr(body, 'close'):
+            body.close()
+        return response
+
+    def test_serves_files_with_cache_headers(self):
+        response = self.get('/static/site.css')
+        self.assertEqual(response['status'], '200 OK')
+        self.assertEqual(response['body'], self.data)
+        self.assertEqual(response['headers']['Content-Type'], 'text/css; charset=utf-8')
+        self.assertEqual(response['headers']['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(response['headers']['Vary'], 'Accept-Encoding')
+
+        fingerprinted = self.get('/static/site.0123456789ab.css')
+        self.assertEqual(fingerprinted['headers']['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_precompressed_sibling_when_accepted(self):
+        response = self.get('/static/site.css', HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(response['headers']['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response['body']), self.data)
+        self.assertNotIn('Content-Encoding', self.get('/static/site.css', HTTP_ACCEPT_ENCODING='gzip;q=0')['headers'])
+
+    def test_ranges_and_conditional_requests(self):
+        partial = self.get('/static/site.css', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(partial['status'], '206 Partial Content')
+        self.assertEqual(partial['body'], self.data[10:20])
+        self.assertEqual(partial['headers']['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(self.get('/static/site.css', HTTP_RANGE='bytes=-5')['body'], self.data[-5:])
+        self.assertEqual(self.get('/static/site.css', HTTP_RANGE=f'bytes={len(self.data)}-')['status'], '416 Range Not Satisfiable')
+
+        etag = self.get('/static/site.css')['headers']['ETag']
+        self.assertEqual(self.get('/static/site.css', HTTP_IF_NONE_MATCH=etag)['status'], '304 Not Modified')
+        stale = self.get('/static/site.css', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+        self.assertEqual(stale['status'], '200 OK')
+
+    def test_stat_results_are_cached(self):
+        self.get('/static/site.css')
+        self.get('/static/new.css')
+        os.remove(os.path.join(self.root, 'site.css.gz'))
+        with open(os.path.join(self.root, 'new.css'), 'wb') as file:
+            file.write(b'new')
+        # Both the hit and the earlier miss come from the cache until it expires
+        self.assertEqual(self.get('/static/site.css')['headers']['Vary'], 'Accept-Encoding')
+        self.server.cache.clear()
+        self.assertNotIn('Vary', self.get('/static/site.css')['headers'])
+        self.assertEqual(self.get('/static/new.css')['body'], b'new')
+
+    def test_unknown_and_escaping_paths_fall_through(self):
+        for path in ('/static/missing.css', '/static/../settings.py', '/static/', '/other/site.css'):
+            self.assertEqual(self.get(path)['body'], b'django', path)
+
+
+class CartUpdateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Motors', slug='motors', icon='cpu')
+        self.products = [make_product(self.category, i, price=f'{i + 1}.50') for i in range(3)]
+
+    def update(self, *operations):
+        return self.client.post(reverse('cart_update'), json.dumps({'operations': list(operations)}), content_type='application/json')
+
+    def quantities(self):
+        return dict(CartItem.objects.values_list('product_id', 'quantity'))
+
+    def test_batch_is_folded_and_totalled(self):
+        first, second, third = self.products
+        self.update({'op': 'add', 'product': third.pk})
+        response = self.update(
+            {'op': 'add', 'product': first.pk},
+            {'op': 'add', 'product': first.pk, 'quantity': 2},
+            {'op': 'set', 'product': second.pk, 'quantity': 5},
+            {'op': 'add', 'product': second.pk, 'quantity': -1},
+            {'op': 'remove', 'product': third.pk},
+        )
+        data = response.json()
+        self.assertEqual(self.quantities(), {first.pk: 3, second.pk: 4})
+        self.assertEqual(data['lines'], {
+            str(first.pk): {'quantity': 3, 'subtotal': '4.50'},
+            str(second.pk): {'quantity': 4, 'subtotal': '10.00'},
+            str(third.pk): {'quantity': 0, 'subtotal': '0.00'},
+        })
+        self.assertEqual((data['cart_count'], data['total']), (7, '14.50'))
+
+        self.update({'op': 'add', 'product': first.pk, 'quantity': -5})
+        self.assertEqual(self.quantities(), {second.pk: 4})
+
+    def test_invalid_batches_change_nothing(self):
+        self.update({'op': 'add', 'product': self.products[0].pk})
+        for body in (
+            {'operations': [{'op': 'add', 'product': self.products[0].pk}, {'op': 'add', 'product': 9999}]},
+            {'operations': [{'op': 'set', 'product': self.products[0].pk, 'quantity': -1}]},
+            {'operations': [{'op': 'explode', 'product': self.products[0].pk}]},
+            {'operations': []},
+        ):
+            response = self.client.post(reverse('cart_update'), json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(self.client.post(reverse('cart_update'), 'nope', content_type='application/json').status_code, 400)
+        self.assertEqual(self.quantities(), {self.products[0].pk: 1})
+
+    def test_state_changes_need_post(self):
+        for name in ('cart_update', 'add_cart', 'remove_cart', 'remove_cart_item'):
+            args = [] if name == 'cart_update' else [self.products[0].pk]
+            self.assertEqual(self.client.get(reverse(name, args=args)).status_code, 405, name)
+
+
+@override_settings(WARMUP_ON_READINESS=False)
+class WarmupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        search.product_index.built = False
+        warmup.reset()
+        self.addCleanup(warmup.reset)
+        seed_catalog(products_per_category=4, categories=2)
+
+    def test_readiness_follows_warm_up(self):
+        response = self.client.get(reverse('readiness'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'cold')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        state = warmup.warm_up()
+        self.assertEqual(state['errors'], {})
+        self.assertIn('store.warmup.cache_first_listing_pages', state['timings_ms'])
+        response = self.client.get(reverse('readiness'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'warm')
+
+    def test_warm_caches_save_queries(self):
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(reverse('home'))
+        cache.clear()
+        search.product_index.built = False
+        warmup.warm_up()
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(reverse('home'))
+        self.assertEqual(len(cold) - len(warm), 2)  # category list and homepage settings
+        with self.assertNumQueries(0):
+            self.client.get(reverse('shop'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_home_settings_cache_is_expired_on_save(self):
+        self.assertIsNone(HomeSettings.load())
+        HomeSettings.objects.create(hero_title='Fresh')
+        self.assertEqual(HomeSettings.load().hero_title, 'Fresh')
+        with self.assertNumQueries(0):
+            HomeSettings.load()
+
+
+class SitemapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = seed_catalog(products_per_category=3, categories=2, images=0, reviews=0, sections=0)
+        # Three product ids per section, so the six products span at least two
+        section_size = sitemaps.SECTION_SIZE
+        sitemaps.SECTION_SIZE = 3
+        self.addCleanup(setattr, sitemaps, 'SECTION_SIZE', section_size)
+        self.sections = sorted({(product.pk - 1) // 3 for product in self.products})
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response['Content-Type'], 'application/xml; charset=utf-8')
+        return (b''.join(response.streaming_content) if response.streaming else response.content).decode()
+
+    def test_index_lists_every_section(self):
+        index = self.get(reverse('sitemap_index'))
+        self.assertIn('http://testserver/sitemap-pages.xml', index)
+        for section in self.sections:
+            self.assertIn(f'http://testserver/sitemap-products-{section}.xml', index)
+        pages = self.get(reverse('sitemap_pages'))
+        self.assertIn(f'<loc>http://testserver{self.products[0].category.get_absolute_url()}</loc>', pages)
+
+    def test_product_sections_stream_then_serve_from_cache(self):
+        section = self.sections[0]
+        body = self.get(reverse('sitemap_products', args=[section]))
+        expected = [product for product in self.products if (product.pk - 1) // 3 == section]
+        self.assertEqual(body.count('<url>'), len(expected))
+        self.assertIn(f'http://testserver{expected[0].get_absolute_url()}', body)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(reverse('sitemap_products', args=[section])), body)
+        self.assertEqual(self.client.get(reverse('sitemap_products', args=[99])).status_code, 404)
+
+    def test_only_the_changed_section_is_regenerated(self):
+        first, last = self.sections[0], self.sections[-1]
+        for section in (first, last):
+            self.get(reverse('sitemap_products', args=[section]))
+        product = Product.objects.filter(pk__gt=last * 3).first()
+        product.slug = 'renamed-part'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        with self.assertNumQueries(1):  # the section signatures only
+            self.get(reverse('sitemap_products', args=[first]))
+        self.assertIn('/product/renamed-part/', self.get(reverse('sitemap_products', args=[last])))
+
+    def test_robots_points_at_the_index(self):
+        self.assertIn('Sitemap: http://testserver/sitemap.xml', self.client.get('/robots.txt').content.decode())
+
+
+class OrderArchiveTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Motors', slug='motors', icon='cpu')
+        self.motor, self.esc = make_product(category, 1, price='10.00'), make_product(category, 2, price='4.50')
+        long_ago = timezone.now() - timedelta(days=200)
+        self.due = [self.order('Completed', long_ago) for _ in range(3)] + [self.order('Cancelled', long_ago)]
+        self.kept = [self.order('Completed', timezone.now()), self.order('New', long_ago)]
+
+    def order(self, status, updated_at):
+        order = Order.objects.create(full_name='Ada', phone_number='555', address='1 Lane', status=status)
+        OrderItem.objects.create(order=order, product=self.motor, price='10.00', quantity=2)
+        OrderItem.objects.create(order=order, product=self.esc, price='4.50', quantity=1)
+        Order.objects.filter(pk=order.pk).update(updated_at=updated_at)
+        return order
+
+    def test_due_orders_move_in_batches(self):
+        self.assertEqual(archive.archive_orders(older_than_days=90, batch_size=3, max_batches=1), 3)
+        self.assertEqual(archive.archive_orders(older_than_days=90, batch_size=3), 1)
+        self.assertEqual(sorted(Order.objects.values_list('pk', flat=True)), sorted(order.pk for order in self.kept))
+        self.assertFalse(OrderItem.objects.filter(order_id__in=[order.pk for order in self.due]).exists())
+
+        archived = ArchivedOrder.objects.get(pk=self.due[0].pk)
+        self.assertEqual((archived.status, archived.total, archived.full_name), ('Completed', Decimal('24.50'), 'Ada'))
+        self.assertEqual(
+            sorted(archived.items.values_list('product_name', 'sku', 'quantity')),
+            [('Product 1', 'SKU-1', 2), ('Product 2', 'SKU-2', 1)],
+        )
+        self.assertEqual(ArchivedOrderItem.objects.count(), 8)
+
+    def test_recommendations_still_count_archived_orders(self):
+        archive.archive_orders(older_than_days=90)
+        recommendations.update_bought_together(full=True)
+        # Three archived completed orders and both live ones; the cancelled order is skipped
+        pair = CoPurchase.objects.get(product=self.motor, related=self.esc)
+        self.assertEqual(pair.count, 5)
+
+    def test_admin_is_read_only(self):
+        archive.archive_orders(older_than_days=90)
+        User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.login(username='admin', password='secret')
+        changelist = self.client.get(reverse('admin:store_archivedorder_changelist'), {'q': 'Ada'})
+        self.assertEqual(changelist.status_code, 200)
+        self.assertContains(changelist, '24.50')
+        detail = self.client.get(reverse('admin:store_archivedorder_change', args=[self.due[0].pk]))
+        self.assertEqual(detail.status_code, 200)
+        self.assertNotContains(detail, 'name="_save"')
+        self.assertEqual(self.client.get(reverse('admin:store_archivedorder_add')).status_code, 403)
+
+
+class OrderSearchTests(TestCase):
+    def setUp(self):
+        self.ada = Order.objects.create(full_name='Ada Lovelace', phone_number='+1 (555) 010-0100', address='12 Baker Street')
+        self.jose = Order.objects.create(full_name='José García', phone_number='555.987.6543', address='1 Calle Mayor')
+        self.bob = Order.objects.create(full_name='Bob Baker', phone_number='07700 900123', address='3 Lane')
+
+    def search(self, term):
+        return set(order_search.search(Order.objects.all(), term))
+
+    def test_phone_numbers_match_on_their_last_digits_in_any_format(self):
+        self.assertEqual(self.ada.phone_key, '00100105551')
+        self.assertEqual(self.search('555-010-0100'), {self.ada})
+        self.assertEqual(self.search('010 0100'), {self.ada})
+        self.assertEqual(self.search('(555) 987 6543'), {self.jose})
+        self.assertEqual(self.search('900123'), {self.bob})
+        self.assertEqual(self.search('4444'), set())
+
+    def test_words_match_name_and_address_prefixes_ignoring_case_and_accents(self):
+        self.assertEqual(self.search('baker'), {self.ada, self.bob})
+        self.assertEqual(self.search('BAK lane'), {self.bob})
+        self.assertEqual(self.search('jose garc'), {self.jose})
+        self.assertEqual(self.search('lovelace smith'), set())
+
+    def test_an_existing_order_number_short_circuits(self):
+        self.assertEqual(self.search(f'#{self.bob.pk}'), {self.bob})
+        self.assertEqual(self.search(str(self.jose.pk)), {self.jose})
+
+    def test_index_follows_edits(self):
+        self.ada.full_name = 'Ada King'
+        self.ada.phone_number = '020 7946 0000'
+        self.ada.save(update_fields=['full_name', 'phone_number'])
+        self.assertEqual(self.search('lovelace'), set())
+        self.assertEqual(self.search('king'), {self.ada})
+        self.assertEqual(self.search('7946 0000'), {self.ada})
+        self.ada.status = 'Accepted'
+        with self.assertNumQueries(1):
+            self.ada.save(update_fields=['status'])
+        self.ada.delete()
+        self.assertFalse(OrderSearchToken.objects.filter(order_id=self.ada.pk).exists())
+
+    def test_admin_search_uses_the_index(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.login(username='admin', password='secret')
+        with CaptureQueriesContext(connection) as queries:
+            changelist = self.client.get(reverse('admin:store_order_changelist'), {'q': 'lovelace'})
+        self.assertEqual(changelist.status_code, 200)
+        self.assertContains(changelist, 'Ada Lovelace')
+        self.assertNotContains(changelist, 'Bob Baker')
+        self.assertFalse([query for query in queries if 'LIKE' in query['sql']])
+
+
+class StaticExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = seed_catalog(products_per_category=4, categories=2, images=1, reviews=0, sections=0)
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def export(self, **options):
+        return export.export_site(self.root, **options)
+
+    def read(self, path):
+        return export.page_file(self.root, path).read_text()
+
+    def test_every_catalogue_page_is_written_without_visitor_state(self):
+        result = self.export()
+        self.assertEqual(len(result['rendered']), 1 + 1 + 2 + len(self.products))
+        product = self.products[0]
+        page = self.read(product.get_absolute_url())
+        self.assertIn(product.name, page)
+        self.assertNotIn('csrf', page)
+        self.assertIn(f'data-add-to-cart="{product.pk}"', page)
+        self.assertIn(product.category.name, self.read(product.category.get_absolute_url()))
+        self.assertTrue(export.page_file(self.root, reverse('home')).exists())
+        self.assertEqual(set(export.read_manifest(self.root)), set(result['rendered']))
+
+    def test_only_changed_pages_are_rendered_again(self):
+        self.export()
+        self.assertEqual(self.export()['rendered'], [])
+        # Four products per category; the newest of the first category is on its first page and on the homepage
+        product = self.products[3]
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImage.objects.create(product=product, image='products/motor.png', alt_text='Side', order=9)
+        rendered = self.export()['rendered']
+        self.assertIn(product.get_absolute_url(), rendered)
+        self.assertNotIn(self.products[5].get_absolute_url(), rendered)
+        self.assertLess(len(rendered), len(self.products))
+
+    def test_deleted_products_are_removed(self):
+        self.export()
+        product = self.products[-1]
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        result = self.export()
+        self.assertEqual(result['removed'], [product.get_absolute_url()])
+        self.assertFalse(export.page_file(self.root, product.get_absolute_url()).parent.exists())
+
+    def test_cart_state_sets_a_csrf_cookie(self):
+        response = self.client.get(reverse('cart_state'))
+        self.assertEqual(response.json(), {'lines': {}, 'cart_count': 0, 'total': '0.00'})
+        self.assertIn('csrftoken', response.cookies)
+        self.assertNotIn('sessionid', response.cookies)
+
+
+def wait_for_background_refreshes(timeout=5):
+    deadline = time.monotonic() + timeout
+    while stale._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class StaleReadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        stale.reset_counts()
+        self.addCleanup(wait_for_background_refreshes)
+
+    def test_current_version_is_served_from_cache(self):
+        calls = []
+        compute = lambda: calls.append(1) or len(calls)
+        self.assertEqual(stale.fetch('answer', compute, version=1), 1)
+        self.assertEqual(stale.fetch('answer', compute, version=1), 1)
+        self.assertEqual(stale.fetch('answer', compute, version=2), 2)
+        self.assertEqual(stale.counts(), {})
+
+    def test_locked_database_serves_the_last_good_value(self):
+        stale.fetch('answer', lambda: 'old', version=1)
+        attempts = []
+
+        def locked_once():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            return 'new'
+        with self.assertLogs('core.stale', 'WARNING'):
+            self.assertEqual(stale.fetch('answer', locked_once, version=2), 'old')
+        self.assertEqual(stale.counts(), {'locked': 1})
+        # The refresh carries on in the background and releases the key
+        wait_for_background_refreshes()
+        self.assertEqual(stale.fetch('answer', locked_once, version=2), 'new')
+        self.assertEqual(len(attempts), 2)
+
+    def test_slow_queries_are_cut_off_at_the_budget(self):
+        stale.fetch('answer', lambda: 'old', version=1)
+
+        def slow():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 2000000) SELECT count(*) FROM n'
+                )
+                return cursor.fetchone()[0]
+        started = time.perf_counter()
+        with self.assertLogs('core.stale', 'WARNING'):
+            self.assertEqual(stale.fetch('answer', slow, version=2, budget=0.01), 'old')
+        self.assertLess(time.perf_counter() - started, 0.2)
+        self.assertEqual(stale.counts(), {'slow': 1})
+        # Without the budget the background refresh runs the query to the end
+        wait_for_background_refreshes()
+        self.assertEqual(stale.fetch('answer', slow, version=2), 2000000)
+
+    def test_one_request_recomputes_while_the_others_get_the_old_value(self):
+        stale.fetch('answer', lambda: 'old', version=1)
+        cache.add('answer:refreshing', True)
+        with self.assertNumQueries(0):
+            self.assertEqual(stale.fetch('answer', lambda: 'new', version=2), 'old')
+        self.assertEqual(stale.counts(), {'refreshing': 1})
+
+    def test_product_page_survives_a_locked_database(self):
+        from . import views
+
+        product = seed_catalog(products_per_category=2, categories=1, reviews=0, sections=0)[0]
+        self.assertContains(self.client.get(product.get_absolute_url()), product.name)
+
+        def locked(slug):
+            raise OperationalError('database is locked')
+        for module, name, replacement in [(views, '_product_context', locked), (stale, '_refresh_in_background', lambda *args: None)]:
+            self.addCleanup(setattr, module, name, getattr(module, name))
+            setattr(module, name, replacement)
+        bump_catalog_version()
+        with self.assertLogs('core.stale', 'WARNING'):
+            response = self.client.get(product.get_absolute_url())
+        self.assertContains(response, product.name)
+        self.assertIn('1 stale', response['Server-Timing'])
+
+
+# Flushing latency histograms would add queries to whichever request hits the interval
+@override_settings(PERF_FLUSH_INTERVAL=10 ** 9)
+class QueryCountTests(TestCase):
+    """
+    Every store route runs a fixed number of queries, however big the
+    catalogue, the product's gallery or its review list gets.
+    """
+
+    def setUp(self):
+        cache.clear()  # rate limiting and cached payloads live in the cache
+        search.product_index.built = False
+        self.products = seed_catalog(products_per_category=8)
+        self.product = self.products[0]
+        self.category = self.product.category
+        for product in self.products[:3]:
+            self.client.post(reverse('add_cart', args=[product.pk]), {'quantity': 2})
+
+    def grow_catalog(self):
+        seed_catalog(products_per_category=12, images=6, reviews=10, sections=5, prefix='more')
+        ProductImage.objects.bulk_create([
+            ProductImage(product=self.product, image='products/esc.png', alt_text='extra', order=10 + i)
+            for i in range(5)
+        ])
+        Review.objects.bulk_create([
+            Review(product=self.product, author='Late buyer', rating=5, content='Still great.') for _ in range(20)
+        ])
+
+    def routes(self):
+        """(label, expected queries, request thunk)"""
+        xhr = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        shop = reverse('shop')
+        product = self.product
+        extra = self.products[5]
+        return [
+            ('home', 6, lambda: self.client.get(reverse('home'))),
+            ('shop', 5, lambda: self.client.get(shop)),
+            ('shop by category', 5, lambda: self.client.get(shop, {'category': self.category.slug})),
+            ('shop price filter', 5, lambda: self.client.get(shop, {'min_price': '11', 'max_price': '15'})),
+            ('shop search', 5, lambda: self.client.get(shop, {'q': 'Product'})),
+            ('shop sort price_low', 5, lambda: self.client.get(shop, {'sort': 'price_low'})),
+            ('shop sort price_high', 5, lambda: self.client.get(shop, {'sort': 'price_high'})),
+            ('shop sort newest', 5, lambda: self.client.get(shop, {'sort': 'newest'})),
+            ('shop page 2', 5, lambda: self.client.get(shop, {'page': 2})),
+            ('shop fragment', 3, lambda: self.client.get(shop, {'sort': 'newest', 'page': 2}, **xhr)),
+            ('category', 5, lambda: self.client.get(reverse('category', args=[self.category.slug]))),
+            ('category sorted', 5, lambda: self.client.get(
+                reverse('category', args=[self.category.slug]), {'sort': 'price_high'})),
+            ('product_detail', 8, lambda: self.client.get(product.get_absolute_url())),
+            ('product_reviews', 2, lambda: self.client.get(reverse('product_reviews', args=[product.slug]))),
+            ('cart', 4, lambda: self.client.get(reverse('cart'))),
+            # Cart writes count the SAVEPOINT and RELEASE around their transaction
+            ('add_cart', 5, lambda: self.client.post(reverse('add_cart', args=[product.pk]), {'quantity': 1})),
+            ('add_cart new line', 6, lambda: self.client.post(reverse('add_cart', args=[extra.pk]))),
+            ('add_cart xhr', 7, lambda: self.client.post(reverse('add_cart', args=[product.pk]), **xhr)),
+            ('remove_cart', 6, lambda: self.client.post(reverse('remove_cart', args=[product.pk]))),
+            ('remove_cart_item', 5, lambda: self.client.post(reverse('remove_cart_item', args=[product.pk]))),
+            ('cart_update', 9, lambda: self.client.post(reverse('cart_update'), json.dumps({'operations': [
+                {'op': 'add', 'product': product.pk, 'quantity': 3},
+                {'op': 'set', 'product': extra.pk, 'quantity': 2},
+                {'op': 'remove', 'product': self.products[1].pk},
+            ]}), content_type='application/json')),
+            ('checkout', 4, lambda: self.client.get(reverse('checkout'))),
+            ('checkout post', 17, lambda: self.client.post(reverse('checkout'), checkout_data())),
+            ('search_suggest', 3, lambda: self.client.get(reverse('search_suggest'), {'q': 'prod'})),
+            ('api_categories', 1, lambda: self.client.get(reverse('api_categories'))),
+            ('api_products', 3, lambda: self.client.get(reverse('api_products'), {'limit': 10})),
+            ('api_product_detail', 5, lambda: self.client.get(reverse('api_product_detail', args=[product.slug]))),
+        ]
+
+    def count_queries(self, send):
+        cache.clear()
+        search.product_index.built = False
+        with CaptureQueriesContext(connection) as queries:
+            response = send()
+        self.assertLess(response.status_code, 400)
+        return len(queries)
+
+    def test_query_counts(self):
+        for label, expected, send in self.routes():
+            # Each route starts from the same populated cart
+            with self.subTest(route=label), transaction_rollback():
+                self.assertEqual(self.count_queries(send), expected)
+
+    def test_query_counts_do_not_grow_with_catalog(self):
+        before = {}
+        for label, _expected, send in self.routes():
+            with transaction_rollback():
+                before[label] = self.count_queries(send)
+        self.grow_catalog()
+        for label, _expected, send in self.routes():
+            with self.subTest(route=label), transaction_rollback():
+                self.assertEqual(self.count_queries(send), before[label])
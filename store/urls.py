@@ -1,15 +1,30 @@
 from django.urls import path
 
-from . import views
+from . import api, sitemaps, views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('shop/', views.shop, name='shop'),
     path('shop/<slug:category_slug>/', views.category_products, name='category'),
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
+    path('product/<slug:slug>/reviews/', views.product_reviews, name='product_reviews'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('cart/', views.cart, name='cart'),
+    path('cart/update/', views.cart_update, name='cart_update'),
+    path('cart/state/', views.cart_state, name='cart_state'),
     path('add_cart/<int:product_id>/', views.add_cart, name='add_cart'),
     path('remove_cart/<int:product_id>/', views.remove_cart, name='remove_cart'),
     path('remove_cart_item/<int:product_id>/', views.remove_cart_item, name='remove_cart_item'),
     path('checkout/', views.checkout, name='checkout'),
+
+    # Crawlers
+    path('robots.txt', sitemaps.robots_txt, name='robots_txt'),
+    path('sitemap.xml', sitemaps.sitemap_index, name='sitemap_index'),
+    path('sitemap-pages.xml', sitemaps.sitemap_pages, name='sitemap_pages'),
+    path('sitemap-products-<int:section>.xml', sitemaps.sitemap_products, name='sitemap_products'),
+
+    # Read-only JSON API
+    path('api/categories/', api.category_list, name='api_categories'),
+    path('api/products/', api.product_list, name='api_products'),
+    path('api/products/<slug:slug>/', api.product_detail, name='api_product_detail'),
 ]
@@ -1,22 +1,50 @@
-from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
-from django.core.paginator import Paginator
-from django.db.models import Q
+import json
+import math
 
-from .models import Category, Product
+from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, QueryDict
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Avg, Count
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_GET, require_POST
+
+from core import stale, writes
+
+from . import cart as cart_ops, search
+from .inventory import OutOfStock, reserve_stock
+from .listing import (
+    FILTER_PARAMS, catalog_version, category_by_slug, category_list, decode_cursor, encode_cursor, hydrate,
+    keyset_after, listing_digest, matching_ids, sort_name,
+)
+from .models import Product, Review
+from .stats import price_bounds
+from .tasks import check_low_stock, send_order_confirmation
+
+
+def _home_products():
+    from core.models import Feature
+
+    return {
+        'featured_products': list(Product.objects.filter(is_featured=True).prefetch_related('images')[:3]),
+        'features': list(Feature.objects.all()),
+    }
 
 
 def home(request):
     """Homepage with featured products and categories"""
-    categories = Category.objects.all()
-    featured_products = Product.objects.filter(is_featured=True)[:3]
-    new_products = Product.objects.filter(is_new=True)[:6]
+    categories = category_list()
+    # The last good copy is served while the database is locked (see core.stale)
+    homepage = stale.fetch('home', _home_products, catalog_version())
     
-    from core.models import HomeSettings, Feature
+    from core.models import HomeSettings
     
     # Homepage Data
-    home_settings = HomeSettings.objects.first()
-    features = Feature.objects.all()
+    home_settings = HomeSettings.load()
     
     # Stats (use from DB or fallback)
     if home_settings:
@@ -32,215 +60,200 @@ def home(request):
     
     context = {
         'categories': categories,
-        'featured_products': featured_products,
-        'new_products': new_products,
         'stats': stats,
         'home_settings': home_settings,
-        'features': features,
+        **homepage,
     }
     return render(request, 'index.html', context)
 
 
+SHOP_PAGE_SIZE = 6
+
+
+def _shop_results(request, category):
+    """Product grid and pagination HTML for the current filters, cached per filter combination"""
+    def render_results():
+        # Every page of a filter combination is a slice of the same cached id list
+        paginator = Paginator(matching_ids(request.GET, category), SHOP_PAGE_SIZE)
+        page_obj = paginator.get_page(request.GET.get('page', 1))
+        page_obj.object_list = hydrate(page_obj.object_list)
+        # Only the filters the cache key covers; anything else would leak into every visitor's links
+        params = QueryDict(mutable=True)
+        for name in FILTER_PARAMS:
+            if name != 'page' and request.GET.get(name):
+                params[name] = request.GET[name]
+        # Rendered without the request: no context processors, nothing visitor-specific
+        return render_to_string('shop_results.html', {
+            'products': page_obj,
+            'page_range': paginator.get_elided_page_range(page_obj.number, on_each_side=2, on_ends=1),
+            'params': params,
+            'selected_category': category,
+            'current_sort': sort_name(request.GET),
+            'total_count': paginator.count,
+        })
+
+    key = f'shop:results:{listing_digest(request.path, request.GET)}'
+    return mark_safe(stale.fetch(key, render_results, catalog_version()))
+
+
+def _shop_page(request, category=None):
+    results = _shop_results(request, category)
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        # main.js swaps this into #shop-results on filter, sort and page changes
+        response = HttpResponse(results)
+        patch_cache_control(response, public=True, max_age=60)
+    else:
+        categories = category_list()
+        low, high = price_bounds(categories)
+        response = render(request, 'shop.html', {
+            'results': results,
+            'categories': categories,
+            'product_total': sum(c.stats.product_count for c in categories if hasattr(c, 'stats')),
+            'price_floor': math.floor(low) if low is not None else 0,
+            'price_ceiling': math.ceil(high) if high is not None else 0,
+            'selected_category': category,
+            'search_query': request.GET.get('q'),
+        })
+    patch_vary_headers(response, ['X-Requested-With'])
+    return response
+
+
 def shop(request):
     """Product listing with filtering and pagination"""
-    products = Product.objects.all()
-    categories = Category.objects.all()
-    
-    # Filter by category
     category_slug = request.GET.get('category')
-    selected_category = None
-    if category_slug:
-        selected_category = get_object_or_404(Category, slug=category_slug)
-        products = products.filter(category=selected_category)
-    
-    # Filter by price range
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    if min_price:
-        products = products.filter(price__gte=min_price)
-    if max_price:
-        products = products.filter(price__lte=max_price)
-    
-    # Search
-    search_query = request.GET.get('q')
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(short_description__icontains=search_query) |
-            Q(sku__icontains=search_query)
-        )
-    
-    # Sorting
-    sort = request.GET.get('sort', 'featured')
-    if sort == 'price_low':
-        products = products.order_by('price')
-    elif sort == 'price_high':
-        products = products.order_by('-price')
-    elif sort == 'newest':
-        products = products.order_by('-created_at')
-    else:  # featured
-        products = products.order_by('-is_featured', '-is_bestseller', '-created_at')
-    
-    # Pagination
-    paginator = Paginator(products, 6)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
-        'products': page_obj,
-        'categories': categories,
-        'selected_category': selected_category,
-        'search_query': search_query,
-        'current_sort': sort,
-        'total_count': paginator.count,
-    }
-    return render(request, 'shop.html', context)
+    category = category_by_slug(category_slug) if category_slug else None
+    return _shop_page(request, category)
 
 
 def category_products(request, category_slug):
     """Products filtered by category"""
-    category = get_object_or_404(Category, slug=category_slug)
-    products = Product.objects.filter(category=category)
-    categories = Category.objects.all()
-    
-    # Sorting
-    sort = request.GET.get('sort', 'featured')
-    if sort == 'price_low':
-        products = products.order_by('price')
-    elif sort == 'price_high':
-        products = products.order_by('-price')
-    elif sort == 'newest':
-        products = products.order_by('-created_at')
-    else:
-        products = products.order_by('-is_featured', '-is_bestseller', '-created_at')
-    
-    # Pagination
-    paginator = Paginator(products, 6)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
-        'products': page_obj,
-        'categories': categories,
-        'selected_category': category,
-        'current_sort': sort,
-        'total_count': paginator.count,
-    }
-    return render(request, 'shop.html', context)
+    return _shop_page(request, category_by_slug(category_slug))
 
 
-def product_detail(request, slug):
-    """Single product view with all details"""
+def _product_context(slug):
     product = get_object_or_404(
-        Product.objects.prefetch_related('images', 'description_sections', 'reviews'),
+        Product.objects.select_related('category').prefetch_related('images'),
         slug=slug
     )
+    # Only the summary here; the Reviews tab pages through product_reviews
+    rating = product.reviews.aggregate(average=Avg('rating'), count=Count('pk'))
     
-    # Related products from same category
-    related_products = Product.objects.filter(
-        category=product.category
-    ).exclude(pk=product.pk)[:3]
+    # Frequently bought together, topped up from the same category
+    related_products = list(Product.objects.bought_together_with(product, limit=3).prefetch_related('images'))
+    if len(related_products) < 3:
+        related_products += Product.objects.filter(
+            category=product.category
+        ).exclude(
+            pk__in=[product.pk] + [p.pk for p in related_products]
+        ).prefetch_related('images')[:3 - len(related_products)]
     
-    context = {
+    similar_products = list(Product.objects.similar_to(product, limit=3).prefetch_related('images'))
+    
+    return {
         'product': product,
+        'rating': rating,
         'related_products': related_products,
+        'similar_products': similar_products,
     }
+
+
+def product_detail(request, slug):
+    """Single product view with all details"""
+    context = stale.fetch(f'product:{slug}', lambda: _product_context(slug), catalog_version())
     return render(request, 'product_detail.html', context)
 
 
+REVIEWS_PAGE_SIZE = 10
+REVIEW_ORDER = ('-created_at', '-pk')
+
+
+def product_reviews(request, slug):
+    """One page of a product's reviews, newest first, loaded into the Reviews tab"""
+    product = get_object_or_404(Product.objects.only('pk', 'slug'), slug=slug)
+    reviews = product.reviews.order_by(*REVIEW_ORDER)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            reviews = reviews.filter(keyset_after(REVIEW_ORDER, decode_cursor(cursor, REVIEW_ORDER, Review)))
+        except ValueError:
+            return HttpResponseBadRequest('Invalid cursor')
+
+    page = list(reviews[:REVIEWS_PAGE_SIZE + 1])
+    next_url = None
+    if len(page) > REVIEWS_PAGE_SIZE:
+        page = page[:REVIEWS_PAGE_SIZE]
+        next_url = f'{request.path}?cursor={encode_cursor([page[-1].created_at, page[-1].pk])}'
+    return HttpResponse(render_to_string('product_reviews.html', {'reviews': page, 'next_url': next_url}))
+
+
+def search_suggest(request):
+    """Typeahead JSON over product names, SKUs and category names"""
+    query = request.GET.get('q', '')[:100]
+    return JsonResponse({'query': query, 'results': search.suggest(query)})
+
+
 def _cart_id(request):
     """Helper to get or create cart ID (session key)"""
     cart = request.session.session_key
     if not cart:
-        cart = request.session.create()
+        request.session.create()
+        cart = request.session.session_key
     return cart
 
 
-def add_cart(request, product_id):
-    """Add item to cart"""
-    from .models import Cart, CartItem
-    from django.shortcuts import redirect
+@require_POST
+def cart_update(request):
+    """Apply a JSON batch of add/set/remove operations and return the changed lines and totals"""
+    try:
+        operations = cart_ops.parse_operations(json.loads(request.body or b'null'))
+        basket, touched = writes.run(cart_ops.update, _cart_id(request), operations)
+    except ValueError as error:
+        # Malformed JSON and CartError alike
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse({'success': True, **cart_ops.summary(basket, touched)})
+
+
+@require_GET
+@never_cache
+@ensure_csrf_cookie
+def cart_state(request):
+    """Item count and total plus a CSRF cookie, for pages exported by store.export"""
+    basket = cart_ops.get_cart(request.session.session_key, create=False)
+    return JsonResponse(cart_ops.summary(basket))
 
-    product = Product.objects.get(id=product_id)
+
+def _apply_one(request, op, product_id, quantity=0):
     try:
-        cart = Cart.objects.get(cart_id=_cart_id(request))
-    except Cart.DoesNotExist:
-        cart = Cart.objects.create(
-            cart_id=_cart_id(request)
-        )
-        cart.save()
+        basket, _touched = writes.run(cart_ops.update, _cart_id(request), [(op, product_id, quantity)])
+    except cart_ops.CartError:
+        raise Http404('No such product')
+    return basket
 
+
+@require_POST
+def add_cart(request, product_id):
+    """Add item to cart (form fallback for the batched endpoint)"""
     try:
-        cart_item = CartItem.objects.get(product=product, cart=cart)
-        # If item exists, increment quantity
-        # (Assuming we might want to increment by 1 each click, or based on form input.
-        # For simple 'add to cart' often implies +1 or set to qty. 
-        # The frontend detail page has a quantity input, so we should try to get that.)
-        
-        if request.method == 'POST':
-             # If coming from a form with quantity
-             qty = int(request.POST.get('quantity', 1))
-             cart_item.quantity += qty
-        else:
-             cart_item.quantity += 1
-        
-        cart_item.save()
-    except CartItem.DoesNotExist:
-        qty = 1
-        if request.method == 'POST':
-            qty = int(request.POST.get('quantity', 1))
-            
-        cart_item = CartItem.objects.create(
-            product=product,
-            quantity=qty,
-            cart=cart
-        )
-        cart_item.save()
-    
-    cart_item.save()
-    
+        quantity = min(max(int(request.POST.get('quantity', 1)), 1), cart_ops.MAX_QUANTITY)
+    except ValueError:
+        quantity = 1
+    basket = _apply_one(request, 'add', product_id, quantity)
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        # Calculate new cart count
-        cart_count = 0
-        cart_items = CartItem.objects.filter(cart=cart, is_active=True)
-        for item in cart_items:
-            cart_count += item.quantity
-            
-        return JsonResponse({
-            'success': True,
-            'message': 'Added to cart successfully!',
-            'cart_count': cart_count,
-            'product_name': product.name
-        })
-    
+        return JsonResponse({'success': True, 'message': 'Added to cart successfully!', **cart_ops.summary(basket, [product_id])})
     return redirect('cart')
 
 
+@require_POST
 def remove_cart(request, product_id):
     """Decrement item quantity or remove if 1"""
-    from .models import Cart, CartItem
-    from django.shortcuts import redirect
-
-    cart = Cart.objects.get(cart_id=_cart_id(request))
-    product = get_object_or_404(Product, id=product_id)
-    cart_item = CartItem.objects.get(product=product, cart=cart)
-    if cart_item.quantity > 1:
-        cart_item.quantity -= 1
-        cart_item.save()
-    else:
-        cart_item.delete()
+    _apply_one(request, 'add', product_id, -1)
     return redirect('cart')
 
 
+@require_POST
 def remove_cart_item(request, product_id):
     """Remove item completely from cart"""
-    from .models import Cart, CartItem
-    from django.shortcuts import redirect
-
-    cart = Cart.objects.get(cart_id=_cart_id(request))
-    product = get_object_or_404(Product, id=product_id)
-    cart_item = CartItem.objects.get(product=product, cart=cart)
-    cart_item.delete()
+    _apply_one(request, 'remove', product_id)
     return redirect('cart')
 
 
@@ -253,7 +266,7 @@ def cart(request, total=0, quantity=0, cart_items=None):
         tax = 0
         grand_total = 0
         cart = Cart.objects.get(cart_id=_cart_id(request))
-        cart_items = CartItem.objects.filter(cart=cart, is_active=True)
+        cart_items = CartItem.objects.filter(cart=cart, is_active=True).select_related('product').prefetch_related('product__images')
         for cart_item in cart_items:
             total += (cart_item.product.price * cart_item.quantity)
             quantity += cart_item.quantity
@@ -274,9 +287,41 @@ def cart(request, total=0, quantity=0, cart_items=None):
     return render(request, 'cart.html', context)
 
 
+def _place_order(cart, cart_items, full_name, phone_number, address, location):
+    """Turn the cart into an order; raises OutOfStock before anything is written"""
+    from .models import Order, OrderItem
+
+    with transaction.atomic():
+        # Decrement stock first so a shortage fails before anything is written
+        reserve_stock([(item.product_id, item.quantity) for item in cart_items])
+
+        order = Order.objects.create(
+            full_name=full_name,
+            phone_number=phone_number,
+            address=address,
+            location=location,
+            status='New'
+        )
+
+        # Move Cart Items to Order Items
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=item.product, price=item.product.price, quantity=item.quantity)
+            for item in cart_items
+        ])
+
+        # Follow-up work runs in the task worker, committed with the order
+        send_order_confirmation.enqueue(order_id=order.pk)
+        check_low_stock.enqueue(product_ids=[item.product_id for item in cart_items])
+
+        # Clear Cart
+        cart_items.delete()
+        cart.delete()
+    return order
+
+
 def checkout(request, total=0, quantity=0, cart_items=None):
     """Checkout page and logic"""
-    from .models import Cart, CartItem, Order, OrderItem
+    from .models import Cart, CartItem
     from django.core.exceptions import ObjectDoesNotExist
     from django.shortcuts import redirect
 
@@ -284,7 +329,7 @@ def checkout(request, total=0, quantity=0, cart_items=None):
         tax = 0
         grand_total = 0
         cart = Cart.objects.get(cart_id=_cart_id(request))
-        cart_items = CartItem.objects.filter(cart=cart, is_active=True)
+        cart_items = CartItem.objects.filter(cart=cart, is_active=True).select_related('product').prefetch_related('product__images')
         for cart_item in cart_items:
             total += (cart_item.product.price * cart_item.quantity)
             quantity += cart_item.quantity
@@ -292,6 +337,7 @@ def checkout(request, total=0, quantity=0, cart_items=None):
     except ObjectDoesNotExist:
         return redirect('shop') # Empty cart, go back to shop
 
+    error = None
     if request.method == 'POST':
         # Create Order
         full_name = request.POST.get('full_name')
@@ -304,36 +350,16 @@ def checkout(request, total=0, quantity=0, cart_items=None):
              # Ideally return with error message
              pass
 
-        order = Order.objects.create(
-            full_name=full_name,
-            phone_number=phone_number,
-            address=address,
-            location=location,
-            status='New'
-        )
-        order.save()
-
-        # Move Cart Items to Order Items
-        for item in cart_items:
-            order_item = OrderItem()
-            order_item.order = order
-            order_item.product = item.product
-            order_item.price = item.product.price
-            order_item.quantity = item.quantity
-            order_item.save()
-            
-            # Reduce stock? (Not strictly implemented yet, but keeping note)
-            # product = Product.objects.get(id=item.product.id)
-            # product.stock -= item.quantity
-            # product.save()
-
-        # Clear Cart
-        cart_items.delete()
-        cart.delete()
-
-        # Redirect to a success page or back home with message
-        # For now, let's redirect to home
-        return redirect('home')
+        try:
+            writes.run(_place_order, cart, cart_items, full_name, phone_number, address, location)
+        except OutOfStock as shortage:
+            product = next(item.product for item in cart_items if item.product_id == shortage.product_id)
+            available = Product.objects.filter(pk=product.pk).values_list('stock', flat=True).first() or 0
+            error = f"Sorry, only {available} of {product.name} left in stock. Please update your cart."
+        else:
+            # Redirect to a success page or back home with message
+            # For now, let's redirect to home
+            return redirect('home')
 
     context = {
         'total': total,
@@ -341,6 +367,6 @@ def checkout(request, total=0, quantity=0, cart_items=None):
         'cart_items': cart_items,
         'tax': tax,
         'grand_total': grand_total,
+        'error': error,
     }
     return render(request, 'checkout.html', context)
-
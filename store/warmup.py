@@ -0,0 +1,53 @@
+"""
+Store warm-up steps (see core.warmup): the search index, the category
+list, the homepage settings, API payloads for the promoted products and
+the first page of the shop and of every category.
+"""
+from django.db.models import Q
+from django.http import HttpRequest, QueryDict
+from django.urls import reverse
+
+from core.models import HomeSettings
+from core.warmup import step
+
+from . import listing
+from .models import Product
+
+HOT_PRODUCTS = 50
+
+
+@step()
+def build_search_index():
+    from .search import product_index
+
+    product_index.ensure_built()
+
+
+@step()
+def cache_categories_and_home_settings():
+    listing.category_list()
+    HomeSettings.load()
+
+
+@step()
+def cache_hot_products():
+    from .api import PAYLOAD_STAMP, cached_payloads
+
+    promoted = Product.objects.filter(Q(is_featured=True) | Q(is_new=True) | Q(is_bestseller=True))
+    cached_payloads(list(promoted.values_list(*PAYLOAD_STAMP)[:HOT_PRODUCTS]))
+
+
+def _listing_request(path):
+    request = HttpRequest()
+    request.path = request.path_info = path
+    request.GET = QueryDict()
+    return request
+
+
+@step()
+def cache_first_listing_pages():
+    from .views import _shop_results
+
+    _shop_results(_listing_request(reverse('shop')), None)
+    for category in listing.category_list():
+        _shop_results(_listing_request(category.get_absolute_url()), category)